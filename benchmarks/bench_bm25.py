@@ -0,0 +1,100 @@
+"""
+BM25 index build time, size and query latency, plus a hit-rate comparison
+of vector, BM25 and hybrid (reciprocal rank fusion) retrieval.
+
+Queries are the heading breadcrumbs of a sample of indexed chunks, the
+kind of exact-term question ("Visa > Sponsorship > Dependants") that
+embeddings alone tend to miss; a query counts as a hit when a chunk of the
+same source file is in the top-k. The script exits with status 1 if the
+BM25 p99 latency is above --max-p99-ms.
+
+Usage (from the project root, after running src/ingest_md.py):
+    python benchmarks/bench_bm25.py [--top-k 3] [--samples 300] [--max-p99-ms 1.0]
+"""
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from retrieval_engine import HYBRID_CANDIDATES, RRF_K, RetrievalEngine
+
+
+def percentile(timings, fraction):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--samples", type=int, default=300, help="heading-breadcrumb queries")
+    parser.add_argument("--max-p99-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    engine = RetrievalEngine(backend="chroma", mode="vector").open()
+    collection = engine.collection
+
+    # ---------- build ----------
+    start = time.perf_counter()
+    index = BM25Index.from_collection(collection)
+    build_seconds = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bm25_index.npz"
+        index.save(path)
+        size = path.stat().st_size
+        start = time.perf_counter()
+        index = BM25Index.load(path)
+        load_ms = (time.perf_counter() - start) * 1000
+    print(f"BM25 index: {len(index)} chunks, {len(index.terms)} terms, {len(index.postings)} postings")
+    print(f"  build {build_seconds:.2f} s   load {load_ms:.1f} ms   size {size / 1024:.0f} KiB")
+
+    page = collection.get(include=["metadatas"])
+    path_of = {chunk_id: meta["source"] for chunk_id, meta in zip(page["ids"], page["metadatas"])}
+    candidates = [
+        (meta["headings"], meta["source"]) for meta in page["metadatas"] if meta.get("headings")
+    ]
+    rng = random.Random(0)
+    queries = rng.sample(candidates, min(args.samples, len(candidates)))
+
+    # ---------- latency ----------
+    timings = []
+    for query, _ in queries * 5:
+        start = time.perf_counter()
+        index.search(query, HYBRID_CANDIDATES)
+        timings.append((time.perf_counter() - start) * 1000)
+    p99 = percentile(timings, 0.99)
+    print(f"\nBM25 search, top {HYBRID_CANDIDATES}, {len(timings)} queries")
+    print(f"  p50 {statistics.median(timings):.3f} ms   p99 {p99:.3f} ms")
+
+    # ---------- hit rate ----------
+    embeddings = engine.embedding_model.encode([q for q, _ in queries]).tolist()
+    vector_rows = engine.store.query(embeddings, max(args.top_k, HYBRID_CANDIDATES))
+    hits = {"vector": 0, "bm25": 0, "hybrid": 0}
+    for (query, target), vector_hits in zip(queries, vector_rows):
+        vector_ids = [h["id"] for h in vector_hits]
+        lexical_ids = [chunk_id for chunk_id, _ in index.search(query, HYBRID_CANDIDATES)]
+        rankings = {
+            "vector": vector_ids[:args.top_k],
+            "bm25": lexical_ids[:args.top_k],
+            "hybrid": reciprocal_rank_fusion([vector_ids, lexical_ids], RRF_K)[:args.top_k],
+        }
+        for name, ids in rankings.items():
+            hits[name] += any(path_of.get(chunk_id) == target for chunk_id in ids)
+
+    print(f"\nsource-file hit rate @{args.top_k} over {len(queries)} heading queries")
+    for name, count in hits.items():
+        print(f"  {name:<7} {count / max(1, len(queries)):.3f}")
+
+    if p99 > args.max_p99_ms:
+        print(f"\nFAIL: BM25 p99 {p99:.3f} ms above {args.max_p99_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Accuracy vs. memory of the chunk store (src/chunk_store.py) for each
+vector type, against exact float32 search over the Chroma embeddings.
+
+Queries are the fixed HR questions below plus the first sentence of a
+sample of indexed chunks. For every dtype the script writes a store to a
+temporary directory and reports:
+
+- vector bytes (incl. int8 scales) and total store size on disk
+- open time (all files memory-mapped) and single-query latency
+- recall@k and top-1 agreement with the float32 ranking
+- mean and max absolute error of the cosine scores
+
+Usage (from the project root, after running src/ingest_md.py):
+    python benchmarks/bench_chunk_store.py [--top-k 3] [--samples 200] [--json report.json]
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from chunk_store import STORE_DTYPES, ChunkStore
+from retrieval_engine import RetrievalEngine
+from vector_store import NumpyVectorStore
+
+QUESTIONS = [
+    "How many vacation days do I have?",
+    "Can unused vacation days be carried over to the next year?",
+    "How long is the probation period?",
+    "Who do I contact about a visa?",
+    "What is a DRI?",
+    "How does parental leave work?",
+    "How are promotions decided?",
+]
+
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--samples", type=int, default=200, help="chunk-derived queries")
+    parser.add_argument("--json", type=Path, help="write the report to this file")
+    args = parser.parse_args()
+
+    engine = RetrievalEngine(backend="chroma").open()
+    reference = NumpyVectorStore.from_collection(engine.collection)
+    print(f"{reference.count()} chunks, float32 matrix {reference.embeddings.nbytes / 1024:.0f} KiB")
+
+    rng = random.Random(0)
+    sampled = rng.sample(reference.documents, min(args.samples, reference.count()))
+    queries = QUESTIONS + [doc.split(". ")[0][:200] for doc in sampled]
+    embeddings = np.asarray(engine.embedding_model.encode(queries), dtype=np.float32)
+    exact_indices, _ = reference.search(embeddings, args.top_k)
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    exact_scores = normalized @ reference.embeddings.T
+
+    report = {"chunks": reference.count(), "queries": len(queries), "top_k": args.top_k, "dtypes": {}}
+    print(f"\n{'dtype':<8} {'vectors KiB':>11} {'store KiB':>10} {'open ms':>8} {'query ms':>9} "
+          f"{'recall@' + str(args.top_k):>9} {'top-1':>6} {'mean err':>9} {'max err':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype in STORE_DTYPES:
+            path = Path(tmp) / dtype
+            store = ChunkStore.write(path, reference.ids, reference.documents, reference.metadatas,
+                                     reference.embeddings, dtype)
+            sizes = store.stats()["bytes"]
+            disk = sum(f.stat().st_size for f in path.iterdir())
+
+            indices, _ = store.search(embeddings, args.top_k)
+            recall = statistics.mean(
+                len(set(row) & set(exact_row)) / max(1, len(exact_row))
+                for row, exact_row in zip(indices.tolist(), exact_indices.tolist())
+            )
+            top1 = float(np.mean(indices[:, 0] == exact_indices[:, 0])) if indices.size else 1.0
+            errors = np.abs(normalized @ store.dequantize().T - exact_scores)
+
+            entry = {
+                "vector_bytes": sizes["vectors"],
+                "store_bytes": disk,
+                "open_ms": round(median_ms(lambda: ChunkStore.open(path), 20), 3),
+                "query_ms": round(median_ms(lambda: store.query([embeddings[0]], args.top_k), 100), 3),
+                f"recall@{args.top_k}": round(recall, 4),
+                "top1_agreement": round(top1, 4),
+                "mean_abs_score_error": float(errors.mean()),
+                "max_abs_score_error": float(errors.max()),
+            }
+            report["dtypes"][dtype] = entry
+            print(f"{dtype:<8} {entry['vector_bytes'] / 1024:>11.0f} {disk / 1024:>10.0f} {entry['open_ms']:>8.2f} "
+                  f"{entry['query_ms']:>9.2f} {recall:>9.4f} {top1:>6.3f} {entry['mean_abs_score_error']:>9.2e} "
+                  f"{entry['max_abs_score_error']:>8.2e}")
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+        print(f"\nreport written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Microbenchmark: ingest_md.simple_markdown_split (old) vs.
+markdown_chunker.split_markdown (new) on handbook files.
+
+The "long section" rows use one synthetic section without headings, which
+is where the old per-line sum(len(l) for l in buffer) gets expensive.
+
+Usage (from the project root):
+    python benchmarks/bench_chunker.py [file.md ...] [--repeat N]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from ingest_md import DOCS_PATH, simple_markdown_split
+from markdown_chunker import split_markdown
+
+DEFAULT_FILES = ["talent-assessment.md", "engagement.md"]
+
+
+def best_of(fn, text, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, len(result)
+
+
+def report(label, text, repeat, max_chars):
+    old_ms, old_n = best_of(lambda t: simple_markdown_split(t, max_chars=max_chars), text, repeat)
+    new_ms, new_n = best_of(lambda t: split_markdown(t, chunk_size=max_chars, overlap=0), text, repeat)
+    new_ov_ms, _ = best_of(lambda t: split_markdown(t, chunk_size=max_chars, overlap=max_chars // 8), text, repeat)
+    print(
+        f"{label:<34} {len(text):>9,} chars | old {old_ms:8.2f} ms ({old_n:>4} chunks) | "
+        f"new {new_ms:8.2f} ms ({new_n:>4} chunks) | new+overlap {new_ov_ms:8.2f} ms | "
+        f"x{old_ms / new_ms:5.2f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", default=DEFAULT_FILES, help="files relative to data/hr_policies")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for name in args.files:
+        text = (DOCS_PATH / name).read_text(encoding="utf-8")
+        report(name, text, args.repeat, 800)
+
+    corpus = "\n\n".join(p.read_text(encoding="utf-8") for p in sorted(DOCS_PATH.rglob("*.md")))
+    report("whole corpus", corpus, max(1, args.repeat // 4), 800)
+
+    # one long section made of short lines (list items)
+    section = "## Long section\n" + "\n".join(f"- item {i} of a long list" for i in range(20_000))
+    for max_chars in (800, 4000, 16000):
+        report(f"long section, max_chars={max_chars}", section, max(1, args.repeat // 4), max_chars)
+
+
+if __name__ == "__main__":
+    main()
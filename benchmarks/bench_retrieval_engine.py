@@ -0,0 +1,79 @@
+"""
+Per-request retrieval overhead: a fresh PersistentClient per request (old
+api_server.get_collection) vs. the long-lived RetrievalEngine.
+
+The query embedding is computed once up front so only the Chroma setup and
+query cost is measured.
+
+Usage (from the project root, after running src/ingest_md.py):
+    python benchmarks/bench_retrieval_engine.py [requests] [threads]
+"""
+import os
+os.environ["ANONYMIZED_TELEMETRY"] = "false"
+
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import chromadb
+from chromadb.config import Settings
+
+from retrieval_engine import CHROMA_PATH, COLLECTION_NAME, RetrievalEngine
+
+QUESTION = "How many vacation days do I have?"
+
+
+def per_request_client(query_embedding, top_k=3):
+    # what api_server did before: new client + get_or_create on every request
+    client = chromadb.PersistentClient(
+        path=str(CHROMA_PATH),
+        settings=Settings(allow_reset=True),
+    )
+    collection = client.get_or_create_collection(name=COLLECTION_NAME)
+    return collection.query(
+        query_embeddings=[query_embedding],
+        n_results=top_k,
+        include=["documents", "metadatas"],
+    )
+
+
+def run(label, fn, n_requests, n_threads):
+    timings = []
+
+    def one(_):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        list(pool.map(one, range(n_requests)))
+    wall = time.perf_counter() - wall_start
+
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(
+        f"{label:<22} mean {statistics.mean(timings):7.2f} ms   "
+        f"p50 {statistics.median(timings):7.2f} ms   p95 {p95:7.2f} ms   "
+        f"{n_requests / wall:8.1f} req/s"
+    )
+
+
+def main():
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    n_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    engine = RetrievalEngine().open()
+    query_embedding = engine.embed(QUESTION)
+    print(f"{engine.readiness()['chunks']} chunks, {n_requests} requests, {n_threads} threads\n")
+
+    run("per-request client", lambda: per_request_client(query_embedding), n_requests, n_threads)
+    run("shared engine", lambda: engine.query_embedding(query_embedding), n_requests, n_threads)
+
+
+if __name__ == "__main__":
+    main()
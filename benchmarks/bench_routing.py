@@ -0,0 +1,110 @@
+"""
+Policy-area routing: how often the router picks the right area, how much of
+the index a routed query searches, and how close routed results stay to a
+search over every area.
+
+Two query sets:
+- the heading breadcrumbs of a sample of indexed chunks; the router is
+  right when the area of that chunk is among the routed areas
+- benchmarks/questions.txt; recall@k is the share of the unrouted top-k
+  chunks that the routed search also returns
+
+Every --route-top / --margin combination is measured (route-top 0 is the
+unrouted baseline). Use it to pick AREA_ROUTE_TOP and AREA_ROUTE_MARGIN.
+
+Usage (from the project root, after running src/ingest_md.py):
+    python benchmarks/bench_routing.py [--backend quantized] [--route-top 1 2 3] [--margin 0.02 0.05 0.1]
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from retrieval_engine import VECTOR_BACKEND, RetrievalEngine
+
+QUESTION_FILE = Path(__file__).resolve().parent / "questions.txt"
+
+
+def load_questions(path: Path) -> list[str]:
+    lines = (line.strip() for line in path.read_text(encoding="utf-8").splitlines())
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def chunk_metadatas(engine) -> list[dict]:
+    collection = engine.index.collection
+    if collection is not None:
+        return collection.get(include=["metadatas"])["metadatas"]
+    store = engine.index.store  # "quantized" opens no Chroma collection
+    return [store.metadata(row) for row in range(store.count())]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default=VECTOR_BACKEND, choices=["chroma", "numpy", "quantized"])
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--route-top", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--margin", type=float, nargs="+", default=[0.02, 0.05, 0.1])
+    parser.add_argument("--samples", type=int, default=300, help="heading-breadcrumb queries")
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    args = parser.parse_args()
+
+    engine = RetrievalEngine(backend=args.backend, mode="vector", route_top=0).open()
+    router = engine.index.router
+    if router is None or len(router) < 2:
+        sys.exit("The index has fewer than two policy areas, re-run src/ingest_md.py.")
+    print(f"{len(router)} areas: " + ", ".join(f"{a} ({n})" for a, n in router.stats().items()))
+
+    candidates = [(meta["headings"], meta.get("area")) for meta in chunk_metadatas(engine) if meta.get("headings")]
+    rng = random.Random(0)
+    headings = rng.sample(candidates, min(args.samples, len(candidates)))
+    questions = load_questions(QUESTION_FILE)
+
+    heading_embeddings = engine.embedding_model.encode([q for q, _ in headings]).tolist()
+    question_embeddings = engine.embedding_model.encode(questions).tolist()
+    baseline = [[h["id"] for h in engine.query_embedding(e, args.top_k)] for e in question_embeddings]
+    counts = router.stats()
+    total = sum(counts.values())
+
+    settings = [(0, 0.0)] + [(top, margin) for top in args.route_top for margin in args.margin]
+    results = []
+    print(f"\n{'route-top':>9} {'margin':>6} {'router acc':>10} {'recall@' + str(args.top_k):>9} "
+          f"{'searched':>8} {'p50 ms':>7}")
+    for top, margin in settings:
+        engine.route_top, engine.route_margin = top, margin
+        correct = 0
+        for (_, area), embedding in zip(headings, heading_embeddings):
+            routed = router.route(embedding, top, margin) if top else None
+            correct += routed is None or area in routed
+
+        found, searched, timings = 0, 0, []
+        for embedding, expected in zip(question_embeddings, baseline):
+            areas = router.route(embedding, top, margin) if top else None
+            searched += total if areas is None else sum(counts[a] for a in areas)
+            start = time.perf_counter()
+            ids = [h["id"] for h in engine.query_embedding(embedding, args.top_k)]
+            timings.append((time.perf_counter() - start) * 1000)
+            found += len(set(ids) & set(expected))
+
+        row = {
+            "route_top": top,
+            "margin": margin,
+            "router_accuracy": round(correct / max(1, len(headings)), 3),
+            "recall": round(found / max(1, sum(len(ids) for ids in baseline)), 3),
+            "searched_fraction": round(searched / (total * len(questions)), 3),
+            "p50_ms": round(statistics.median(timings), 3),
+        }
+        results.append(row)
+        print(f"{top or 'off':>9} {margin:>6} {row['router_accuracy']:>10.3f} {row['recall']:>9.3f} "
+              f"{row['searched_fraction']:>8.3f} {row['p50_ms']:>7.3f}")
+
+    if args.json:
+        args.json.write_text(json.dumps({"backend": args.backend, "areas": counts, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Time to first token of multi-turn conversations on /chat-stream.
+
+Each conversation sends --turns questions from benchmarks/questions.txt
+(in file order, wrapping around) with one session_id, and the time to the
+first answer event of every turn is measured. The report shows turn 1,
+10 and 30 (--report) for every --history-tokens setting, as the median
+over --repeats conversations, next to the history the session held.
+--history-tokens 0 keeps every turn, like the unbounded history of the
+old terminal chat.
+
+Unless --llm-url points at a real Ollama server, the API talks to the fake
+server (src/fake_ollama.py) with a prefill cost per uncached prompt token:
+--prefill-ms-per-1k-tokens, with the prompt prefix of the last --cache-slots
+prompts cached like Ollama does (0 = no prompt cache, every turn evaluates
+its whole prompt) and prompts longer than --num-ctx tokens truncated at the
+front, which defeats the cache (4096 is Ollama's default context length).
+
+The relevance gate, the answer and embedding caches and precomputed
+answers are turned off so every turn is generated.
+
+Usage (from the project root, after running src/ingest_md.py):
+    python benchmarks/bench_sessions.py [--turns 30] [--report 1 10 30] [--history-tokens 0 1024]
+                                        [--repeats 3] [--cache-slots 4] [--num-ctx 4096]
+                                        [--llm-url http://127.0.0.1:11434]
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+SRC_DIR = ROOT / "src"
+QUESTION_FILE = Path(__file__).resolve().parent / "questions.txt"
+
+
+def load_questions(path: Path) -> list[str]:
+    lines = (line.strip() for line in path.read_text(encoding="utf-8").splitlines())
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def start(command, env):
+    return subprocess.Popen(command, env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+
+
+def stop(process):
+    if process is not None and process.poll() is None:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+
+
+async def wait_ready(base_url: str, path: str, timeout: float):
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url, timeout=2) as client:
+        while True:
+            try:
+                if (await client.get(path)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"{base_url}{path} not ready after {timeout}s")
+            await asyncio.sleep(0.2)
+
+
+async def first_token_ms(client, question: str, session_id: str) -> float:
+    start = time.perf_counter()
+    first, event = None, None
+    async with client.stream("POST", "/chat-stream", json={"question": question, "session_id": session_id}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            # answer text comes as plain data; queue/error events are named
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif not line:
+                event = None
+            elif first is None and event is None and line.startswith("data:"):
+                first = time.perf_counter()
+    return ((first or time.perf_counter()) - start) * 1000
+
+
+async def conversations(base_url: str, questions, turns: int, repeats: int, label: str):
+    """
+    Per turn: TTFT of every repeat, and the session stats after the turn.
+    """
+    ttft = [[] for _ in range(turns)]
+    sessions = [None] * turns
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        for repeat in range(repeats):
+            session_id = f"bench-{label}-{repeat}-{time.time_ns()}"
+            for turn in range(turns):
+                ttft[turn].append(await first_token_ms(client, questions[turn % len(questions)], session_id))
+                sessions[turn] = (await client.get(f"/sessions/{session_id}")).json()
+            await client.delete(f"/sessions/{session_id}")
+    return ttft, sessions
+
+
+def run(args, history_tokens: int, questions) -> dict:
+    base_url = f"http://127.0.0.1:{args.port}"
+    llm_url = args.llm_url or f"http://127.0.0.1:{args.port + 1}"
+    env = {
+        **os.environ,
+        "LLM_HOSTS": llm_url,
+        "SESSION_HISTORY_TOKENS": str(history_tokens),
+        "RELEVANCE_THRESHOLD": "0",
+        "ANSWER_CACHE_SIZE": "0",
+        "EMBED_CACHE_SIZE": "0",
+        "INDEX_WATCH_INTERVAL": "0",
+        "PRECOMPUTE_AFTER_SWAP": "0",
+        "PRECOMPUTED_ANSWERS": "0",
+    }
+    fake = server = None
+    try:
+        if args.llm_url is None:
+            fake = start([sys.executable, str(SRC_DIR / "fake_ollama.py"), "--port", str(args.port + 1),
+                          "--tokens-per-second", str(args.tokens_per_second), "--prefill-ms", str(args.prefill_ms),
+                          "--prefill-ms-per-1k-tokens", str(args.prefill_ms_per_1k_tokens),
+                          "--cache-slots", str(args.cache_slots), "--num-ctx", str(args.num_ctx),
+                          "--answer-tokens", str(args.answer_tokens)], env)
+            asyncio.run(wait_ready(llm_url, "/api/version", 60))
+        server = start([sys.executable, "-m", "uvicorn", "--app-dir", str(SRC_DIR), "api_server:app",
+                        "--port", str(args.port), "--log-level", "warning"], env)
+        asyncio.run(wait_ready(base_url, "/ready", args.timeout))
+        label = f"h{history_tokens}"
+        ttft, sessions = asyncio.run(conversations(base_url, questions, args.turns, args.repeats, label))
+    finally:
+        stop(server)
+        stop(fake)
+
+    rows = []
+    for turn in args.report:
+        if turn > args.turns:
+            continue
+        stats = sessions[turn - 1]
+        rows.append({
+            "history_tokens_limit": history_tokens,
+            "turn": turn,
+            "ttft_ms": round(statistics.median(ttft[turn - 1]), 1),
+            "history_turns": stats["history_turns"],
+            "history_tokens": stats["history_tokens"],
+            "summary_tokens": stats["summary_tokens"],
+        })
+    return {"rows": rows, "ttft_ms": [[round(ms, 1) for ms in turn] for turn in ttft]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=Path, default=QUESTION_FILE)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--report", type=int, nargs="+", default=[1, 10, 30], help="turns to report")
+    parser.add_argument("--history-tokens", type=int, nargs="+", default=[0, 1024], help="0 = unbounded history")
+    parser.add_argument("--repeats", type=int, default=3, help="conversations per setting")
+    parser.add_argument("--llm-url", help="real Ollama server instead of the fake one")
+    parser.add_argument("--prefill-ms", type=float, default=50.0)
+    parser.add_argument("--prefill-ms-per-1k-tokens", type=float, default=500.0)
+    parser.add_argument("--cache-slots", type=int, default=4, help="fake prompt cache, 0 = none")
+    parser.add_argument("--num-ctx", type=int, default=4096, help="fake context length in tokens, 0 = unlimited")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--answer-tokens", type=int, default=80)
+    parser.add_argument("--port", type=int, default=8790, help="API port (the fake Ollama uses port + 1)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds to wait for the API to be ready")
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    results = {}
+    print(f"{'history':>9} {'turn':>5} {'ttft ms':>9} {'turns kept':>10} {'hist tok':>9} {'summary tok':>11}")
+    for history_tokens in args.history_tokens:
+        result = results[history_tokens] = run(args, history_tokens, questions)
+        for row in result["rows"]:
+            print(f"{history_tokens or 'unbounded':>9} {row['turn']:>5} {row['ttft_ms']:>9.1f} "
+                  f"{row['history_turns']:>10} {row['history_tokens']:>9} {row['summary_tokens']:>11}")
+
+    if args.json:
+        config = {k: v for k, v in vars(args).items() if k not in ("json", "questions")}
+        args.json.write_text(json.dumps({"config": {**config, "questions": str(args.questions)},
+                                         "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Startup cost of the backend modules: import time (python -X importtime),
+peak memory after import, and optionally the engine warm-up.
+
+Each module is imported in a fresh interpreter. The report lists the wall
+time and peak RSS per module and the slowest top-level packages from
+-X importtime. The run fails if a module imports one of LAZY_PACKAGES
+(ollama, chromadb, ...) at module level. Save it with --json and pass an older report with
+--baseline to see the change between releases.
+
+Usage (from the project root):
+    python benchmarks/bench_startup.py [--repeat 3] [--top 8] [--warmup]
+                                       [--json startup.json] [--baseline old.json]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+MODULES = ["api_server", "retrieval_engine", "ingest_md", "rag_backend", "rag_chat_ollama", "chatbot"]
+# must only be imported on first use; importing one of them at module level fails the run
+LAZY_PACKAGES = ["ollama", "chromadb", "sentence_transformers", "torch"]
+
+# runs in the child: import the module, then report wall time and peak RSS
+IMPORT_SNIPPET = """
+import json, resource, sys, time
+sys.path.insert(0, {src!r})
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+eager = [name for name in {lazy!r} if name in sys.modules]
+print(json.dumps({{"seconds": seconds, "peak_rss_mb": peak / 1024, "eager": eager}}))
+"""
+
+WARMUP_SNIPPET = """
+import json, sys, time
+sys.path.insert(0, {src!r})
+from retrieval_engine import RetrievalEngine
+start = time.perf_counter()
+engine = RetrievalEngine().warm_up()
+warm = time.perf_counter() - start
+start = time.perf_counter()
+engine.query("How many vacation days do I have?")
+print(json.dumps({{"warmup_s": warm, "first_query_s": time.perf_counter() - start}}))
+"""
+
+
+def run_child(code: str, importtime: bool = False):
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_packages(importtime_log: str, module: str, top: int):
+    """
+    Cumulative import time (ms) per root package among the imports made by
+    module (the entries one level below it in the -X importtime tree),
+    slowest first.
+    """
+    totals = {}
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if depth != 1:
+            continue
+        root = name.split(".")[0]
+        totals[root] = totals.get(root, 0) + int(cumulative) / 1000
+    totals.pop(module, None)
+    return sorted(totals.items(), key=lambda item: -item[1])[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per module")
+    parser.add_argument("--top", type=int, default=8, help="slowest packages shown per module")
+    parser.add_argument("--modules", nargs="*", default=MODULES)
+    parser.add_argument("--warmup", action="store_true", help="also time RetrievalEngine.warm_up()")
+    parser.add_argument("--json", type=Path, help="write the report to this file")
+    parser.add_argument("--baseline", type=Path, help="earlier --json report to compare with")
+    args = parser.parse_args()
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else {}
+    report = {"python": sys.version.split()[0], "modules": {}}
+
+    for module in args.modules:
+        code = IMPORT_SNIPPET.format(src=str(SRC_DIR), module=module, lazy=LAZY_PACKAGES)
+        runs = [run_child(code)[0] for _ in range(args.repeat)]
+        _, log = run_child(code, importtime=True)
+        entry = {
+            "import_s": round(statistics.median(r["seconds"] for r in runs), 3),
+            "peak_rss_mb": round(max(r["peak_rss_mb"] for r in runs), 1),
+            "slowest": [[name, round(ms, 1)] for name, ms in slowest_packages(log, module, args.top)],
+            "eager_imports": runs[0]["eager"],
+        }
+        report["modules"][module] = entry
+
+        line = f"{module:<18} import {entry['import_s']:7.3f} s   peak RSS {entry['peak_rss_mb']:7.1f} MB"
+        old = baseline.get("modules", {}).get(module)
+        if old:
+            line += (f"   (baseline {old['import_s']:.3f} s / {old['peak_rss_mb']:.1f} MB, "
+                     f"{entry['import_s'] - old['import_s']:+.3f} s)")
+        print(line)
+        for name, ms in entry["slowest"]:
+            print(f"    {ms:9.1f} ms  {name}")
+        if entry["eager_imports"]:
+            print(f"    imports {', '.join(entry['eager_imports'])} at module level, expected on first use")
+
+    if args.warmup:
+        result, _ = run_child(WARMUP_SNIPPET.format(src=str(SRC_DIR)))
+        report["warmup"] = {key: round(value, 3) for key, value in result.items()}
+        print(f"\nengine warm-up {result['warmup_s']:.2f} s, first query after warm-up "
+              f"{result['first_query_s'] * 1000:.1f} ms")
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+        print(f"\nreport written to {args.json}")
+
+    eager = [module for module, entry in report["modules"].items() if entry["eager_imports"]]
+    if eager:
+        sys.exit(f"\nheavy packages imported eagerly by: {', '.join(eager)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+End-to-end benchmark suite: ingestion, retrieval and the /chat and
+/chat-stream endpoints, with the deterministic fake Ollama server
+(src/fake_ollama.py) in place of a model.
+
+Stages, each run in fresh processes against a temporary copy of the index:
+
+- ingest:    full ingestion of data/hr_policies (chunking, embedding and
+             upserts; the model is loaded before the clock starts) -> chunks/s
+- retrieval: every question through RetrievalEngine.query() -> p50/p95/p99
+- chat:      the API server under uvicorn; --concurrency clients replay the
+             question set --rounds times -> req/s and latency percentiles
+- stream:    the same against /chat-stream, plus time to the first data event
+
+Questions come from a replayable file (benchmarks/questions.txt by default)
+and are sent in file order. The answer and embedding caches are turned off
+so every round takes the full path (--with-caches keeps them on).
+
+The report is a flat set of metrics, written as JSON (--json) and Markdown
+(--markdown). Pass an earlier JSON report as --baseline to compare: a
+metric that got worse by more than --tolerance is a regression, and the
+script then exits with status 1.
+
+Usage (from the project root):
+    python benchmarks/bench_suite.py [--questions benchmarks/questions.txt] [--rounds 2]
+                                     [--concurrency 1 8 32] [--json report.json]
+                                     [--markdown report.md] [--baseline old.json] [--tolerance 0.1]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+SRC_DIR = ROOT / "src"
+DEFAULT_QUESTIONS = Path(__file__).resolve().parent / "questions.txt"
+# settings that must match for a baseline comparison to be meaningful
+COMPARABLE_CONFIG = ("question_file", "questions", "rounds", "tokens_per_second", "prefill_ms", "answer_tokens",
+                     "caches", "chunks")
+
+# runs in the child: full ingest into CHROMA_PATH, model loaded up front
+INGEST_SNIPPET = """
+import json, sys, time
+sys.path.insert(0, {src!r})
+import ingest_md
+ingest_md.get_embedding_model()
+start = time.perf_counter()
+stats = ingest_md.ingest(full=True, workers={workers})
+print(json.dumps({{"seconds": time.perf_counter() - start, **stats}}))
+"""
+
+# runs in the child: warm engine, then one timed query per question and round
+RETRIEVAL_SNIPPET = """
+import json, sys, time
+sys.path.insert(0, {src!r})
+from retrieval_engine import RetrievalEngine
+engine = RetrievalEngine().warm_up()
+questions = json.loads({questions!r})
+timings = []
+for _ in range({rounds}):
+    for question in questions:
+        start = time.perf_counter()
+        engine.query(question, top_k=3)
+        timings.append((time.perf_counter() - start) * 1000)
+print(json.dumps(timings))
+"""
+
+
+def load_questions(path: Path) -> list[str]:
+    lines = (line.strip() for line in path.read_text(encoding="utf-8").splitlines())
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+def percentile(values, p: float) -> float:
+    # nearest rank
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def latency_metrics(prefix: str, timings_ms, metrics: dict):
+    for p in (50, 95, 99):
+        metrics[f"{prefix}.p{p}_ms"] = round(percentile(timings_ms, p), 3)
+
+
+def run_child(code: str, env: dict):
+    result = subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"benchmark child failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# ---------- server processes ----------
+def start(command, env):
+    return subprocess.Popen(command, env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+
+
+def stop(process):
+    if process is not None and process.poll() is None:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+
+
+async def wait_ready(base_url: str, path: str, timeout: float):
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url, timeout=2) as client:
+        while True:
+            try:
+                if (await client.get(path)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"{base_url}{path} not ready after {timeout}s")
+            await asyncio.sleep(0.2)
+
+
+# ---------- load ----------
+async def replay(base_url: str, endpoint: str, questions, concurrency: int):
+    """
+    Send every question once, in order, from concurrency clients. Returns
+    (wall seconds, latencies ms, first-event ms, errors).
+    """
+    pending = iter(questions)
+    latencies, first_events, errors = [], [], 0
+
+    async def client_loop(client):
+        nonlocal errors
+        for question in pending:
+            start = time.perf_counter()
+            try:
+                if endpoint == "/chat":
+                    response = await client.post(endpoint, json={"question": question})
+                    response.raise_for_status()
+                else:
+                    async with client.stream("POST", endpoint, json={"question": question}) as response:
+                        response.raise_for_status()
+                        first, event = None, None
+                        async for line in response.aiter_lines():
+                            # answer text comes as plain data; queue/error events are named
+                            if line.startswith("event:"):
+                                event = line[len("event:"):].strip()
+                            elif not line:
+                                event = None
+                            elif first is None and event is None and line.startswith("data:"):
+                                first = time.perf_counter()
+                        first_events.append(((first or time.perf_counter()) - start) * 1000)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        return time.perf_counter() - start, latencies, first_events, errors
+
+
+def endpoint_metrics(args, env, questions, metrics: dict):
+    llm_url = f"http://127.0.0.1:{args.port + 1}"
+    base_url = f"http://127.0.0.1:{args.port}"
+    server_env = {**env, "LLM_HOSTS": llm_url, "LLM_MAX_QUEUE": "100000"}
+    fake = start([sys.executable, str(SRC_DIR / "fake_ollama.py"), "--port", str(args.port + 1),
+                  "--tokens-per-second", str(args.tokens_per_second), "--prefill-ms", str(args.prefill_ms),
+                  "--answer-tokens", str(args.answer_tokens)], server_env)
+    server = None
+    try:
+        asyncio.run(wait_ready(llm_url, "/api/version", 60))
+        server = start([sys.executable, "-m", "uvicorn", "--app-dir", str(SRC_DIR), "api_server:app",
+                        "--port", str(args.port), "--log-level", "warning"], server_env)
+        asyncio.run(wait_ready(base_url, "/ready", args.timeout))
+
+        for name, endpoint in (("chat", "/chat"), ("stream", "/chat-stream")):
+            for concurrency in args.concurrency:
+                seconds, latencies, first_events, errors = asyncio.run(
+                    replay(base_url, endpoint, questions, concurrency)
+                )
+                prefix = f"{name}.c{concurrency}"
+                metrics[f"{prefix}.rps"] = round(len(latencies) / seconds, 3)
+                latency_metrics(prefix, latencies, metrics)
+                if endpoint == "/chat-stream":
+                    latency_metrics(f"{prefix}.first_event", first_events, metrics)
+                metrics[f"{prefix}.errors"] = errors
+                print(f"  {endpoint:<12} c={concurrency:<3} {metrics[f'{prefix}.rps']:8.2f} req/s   "
+                      f"p50 {metrics[f'{prefix}.p50_ms']:8.1f} ms   p95 {metrics[f'{prefix}.p95_ms']:8.1f} ms"
+                      f"   errors {errors}")
+    finally:
+        stop(server)
+        stop(fake)
+
+
+# ---------- report ----------
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith("_per_s") or metric.endswith(".rps")
+
+
+def compare(metrics: dict, baseline: dict, tolerance: float):
+    """
+    One row per metric: (name, value, baseline value, relative change,
+    status). status is "regression", "improved" or "".
+    """
+    rows = []
+    for name, value in metrics.items():
+        old = baseline.get(name)
+        if old is None:
+            rows.append((name, value, None, None, ""))
+            continue
+        if old:
+            change = (value - old) / abs(old)
+        else:
+            change = 0.0 if value == old else math.inf
+        worse = -change if higher_is_better(name) else change
+        status = "regression" if worse > tolerance else "improved" if worse < -tolerance else ""
+        rows.append((name, value, old, change, status))
+    return rows
+
+
+def markdown(report: dict, rows) -> str:
+    config = report["config"]
+    lines = [
+        "# Benchmark report",
+        "",
+        f"- questions: {config['questions']} x {config['rounds']} rounds ({config['question_file']})",
+        f"- fake LLM: {config['answer_tokens']} tokens at {config['tokens_per_second']} tok/s, "
+        f"{config['prefill_ms']} ms prefill",
+        f"- caches: {'on' if config['caches'] else 'off'}, python {config['python']}",
+        "",
+        "| metric | value | baseline | change | |",
+        "|---|---:|---:|---:|---|",
+    ]
+    for name, value, old, change, status in rows:
+        old_text = "" if old is None else f"{old:g}"
+        change_text = "" if change is None else ("n/a" if math.isinf(change) else f"{change:+.1%}")
+        lines.append(f"| {name} | {value:g} | {old_text} | {change_text} | {status} |")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=Path, default=DEFAULT_QUESTIONS, help="one question per line")
+    parser.add_argument("--rounds", type=int, default=2, help="replays of the question set per measurement")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--stages", nargs="+", default=["ingest", "retrieval", "endpoints"],
+                        choices=["ingest", "retrieval", "endpoints"])
+    parser.add_argument("--ingest-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="fake LLM speed")
+    parser.add_argument("--prefill-ms", type=float, default=50.0, help="fake LLM delay before the first token")
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--with-caches", action="store_true", help="keep the answer and embedding caches on")
+    parser.add_argument("--port", type=int, default=8766, help="API port; the fake LLM uses port + 1")
+    parser.add_argument("--timeout", type=float, default=300.0, help="max. seconds to wait for the API")
+    parser.add_argument("--json", type=Path, help="write the report to this file")
+    parser.add_argument("--markdown", type=Path, help="write the report as a Markdown table")
+    parser.add_argument("--baseline", type=Path, help="earlier --json report to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative slowdown per metric")
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    replayed = questions * args.rounds
+    workdir = Path(tempfile.mkdtemp(prefix="hr-bench-"))
+    env = {**os.environ, "CHROMA_PATH": str(workdir / "chroma"), "ANONYMIZED_TELEMETRY": "false"}
+    for name in ("BM25_INDEX_PATH", "CHUNK_STORE_PATH", "EMBED_CACHE_PATH", "RETRIEVAL_SOCKET"):
+        env.pop(name, None)
+    if not args.with_caches:
+        env.update(ANSWER_CACHE_SIZE="0", EMBED_CACHE_SIZE="0")
+
+    metrics = {}
+    config = {
+        "question_file": args.questions.name,
+        "questions": len(questions),
+        "rounds": args.rounds,
+        "concurrency": args.concurrency,
+        "tokens_per_second": args.tokens_per_second,
+        "prefill_ms": args.prefill_ms,
+        "answer_tokens": args.answer_tokens,
+        "caches": args.with_caches,
+        "python": sys.version.split()[0],
+    }
+    try:
+        # the other stages need the index, so ingest always runs
+        print("ingest ...")
+        result = run_child(INGEST_SNIPPET.format(src=str(SRC_DIR), workers=args.ingest_workers), env)
+        config["chunks"] = result["added"]
+        if "ingest" in args.stages:
+            metrics["ingest.seconds"] = round(result["seconds"], 3)
+            metrics["ingest.chunks_per_s"] = round(result["added"] / result["seconds"], 1)
+            print(f"  {result['added']} chunks in {result['seconds']:.2f} s "
+                  f"({metrics['ingest.chunks_per_s']} chunks/s)")
+
+        if "retrieval" in args.stages:
+            print("retrieval ...")
+            code = RETRIEVAL_SNIPPET.format(src=str(SRC_DIR), questions=json.dumps(questions), rounds=args.rounds)
+            timings = run_child(code, env)
+            latency_metrics("retrieval", timings, metrics)
+            print(f"  p50 {metrics['retrieval.p50_ms']:.2f} ms   p95 {metrics['retrieval.p95_ms']:.2f} ms   "
+                  f"p99 {metrics['retrieval.p99_ms']:.2f} ms")
+
+        if "endpoints" in args.stages:
+            print("endpoints ...")
+            endpoint_metrics(args, env, replayed, metrics)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else {}
+    if baseline:
+        differing = [key for key in COMPARABLE_CONFIG if baseline.get("config", {}).get(key) != config.get(key)]
+        if differing:
+            print(f"\nwarning: the baseline was run with different settings: {', '.join(differing)}")
+    rows = compare(metrics, baseline.get("metrics", {}), args.tolerance)
+    report = {"config": config, "metrics": metrics}
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+        print(f"\nreport written to {args.json}")
+    if args.markdown:
+        args.markdown.write_text(markdown(report, rows))
+        print(f"markdown report written to {args.markdown}")
+
+    regressions = [row for row in rows if row[4] == "regression"]
+    if baseline:
+        print(f"\n{len(regressions)} regression(s) against {args.baseline} (tolerance {args.tolerance:.0%})")
+        for name, value, old, change, _ in regressions:
+            print(f"  {name}: {old:g} -> {value:g} ({'n/a' if math.isinf(change) else f'{change:+.1%}'})")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
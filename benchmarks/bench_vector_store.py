@@ -0,0 +1,104 @@
+"""
+Recall parity and latency: NumpyVectorStore (exact search) vs. Chroma's
+collection.query (HNSW).
+
+Queries are the fixed HR questions below plus the first sentence of a
+sample of indexed chunks. The NumPy store is exact, so its top-k is the
+reference; the script exits with status 1 if the two backends agree on
+less than --min-recall of the top-k IDs.
+
+Usage (from the project root, after running src/ingest_md.py):
+    python benchmarks/bench_vector_store.py [--top-k 3] [--samples 200] [--mmap-dir DIR]
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from retrieval_engine import RetrievalEngine
+from vector_store import ChromaVectorStore, NumpyVectorStore
+
+QUESTIONS = [
+    "How many vacation days do I have?",
+    "Can unused vacation days be carried over to the next year?",
+    "What happens if my birthday falls on a weekend?",
+    "How long is the probation period?",
+    "Who do I contact about a visa?",
+    "What is a DRI?",
+    "How does parental leave work?",
+    "How do I request a relocation?",
+    "What is the 360 feedback process?",
+    "How are promotions decided?",
+]
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summary(timings):
+    timings = sorted(timings)
+    p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+    return f"p50 {statistics.median(timings):8.3f} ms   p95 {p95:8.3f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--samples", type=int, default=200, help="chunk-derived queries")
+    parser.add_argument("--batch", type=int, default=32, help="queries per batched call")
+    parser.add_argument("--mmap-dir", type=Path, default=None, help="also test the memory-mapped store")
+    parser.add_argument("--min-recall", type=float, default=0.95)
+    args = parser.parse_args()
+
+    engine = RetrievalEngine(backend="chroma").open()
+    collection = engine.collection
+
+    start = time.perf_counter()
+    exact = NumpyVectorStore.from_collection(collection, mmap_dir=args.mmap_dir)
+    print(f"numpy store: {exact.count()} vectors loaded in {time.perf_counter() - start:.2f} s"
+          f"{' (memory-mapped)' if args.mmap_dir else ''}")
+    chroma = ChromaVectorStore(collection)
+
+    rng = random.Random(0)
+    sampled = rng.sample(exact.documents, min(args.samples, exact.count()))
+    queries = QUESTIONS + [doc.split(". ")[0][:200] for doc in sampled]
+    embeddings = engine.embedding_model.encode(queries).tolist()
+
+    # ---------- recall parity ----------
+    chroma_hits = chroma.query(embeddings, args.top_k)
+    exact_hits = exact.query(embeddings, args.top_k)
+    overlap = []
+    for c_row, e_row in zip(chroma_hits, exact_hits):
+        reference = {h["id"] for h in e_row}
+        overlap.append(len(reference & {h["id"] for h in c_row}) / max(1, len(reference)))
+    recall = statistics.mean(overlap)
+    print(f"recall@{args.top_k} of Chroma HNSW vs exact search over {len(queries)} queries: {recall:.4f}")
+
+    # ---------- latency ----------
+    single = embeddings[0]
+    print(f"\nsingle query, top_k={args.top_k}")
+    print(f"  chroma  {summary(timed(lambda: chroma.query([single], args.top_k), 200))}")
+    print(f"  numpy   {summary(timed(lambda: exact.query([single], args.top_k), 200))}")
+
+    batch = embeddings[:args.batch]
+    print(f"\nbatch of {len(batch)} queries")
+    print(f"  chroma  {summary(timed(lambda: chroma.query(batch, args.top_k), 50))}")
+    print(f"  numpy   {summary(timed(lambda: exact.query(batch, args.top_k), 50))}")
+
+    if recall < args.min_recall:
+        print(f"\nFAIL: recall {recall:.4f} below {args.min_recall}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
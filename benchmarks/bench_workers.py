@@ -0,0 +1,180 @@
+"""
+Memory and retrieval throughput of the API with 1, 2, 4 and 8 uvicorn
+workers, each loading its own model and index ("inprocess") vs. all
+sharing one retrieval sidecar ("sidecar", see src/retrieval_sidecar.py).
+
+For every configuration the script starts the server, waits until it is
+ready, sums the proportional set size (PSS, Linux only) of all its
+processes (including the sidecar) and runs --clients concurrent clients
+against /chat for --seconds. RELEVANCE_THRESHOLD is set above 1 so every
+question stops after retrieval: the numbers measure embedding + retrieval,
+no LLM is called. Every question is unique, so no cache is hit.
+
+Usage (from the project root, after running src/ingest_md.py):
+    python benchmarks/bench_workers.py [--workers 1 2 4 8] [--modes inprocess sidecar]
+                                       [--clients 32] [--seconds 10]
+"""
+import argparse
+import asyncio
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+SRC_DIR = ROOT / "src"
+
+
+def children(pid: int) -> list[int]:
+    """
+    pid and all its descendants.
+    """
+    parents = {}
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        parents.setdefault(int(fields[1]), []).append(int(stat.parent.name))
+    result, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        result.append(current)
+        stack.extend(parents.get(current, []))
+    return result
+
+
+def pss_mb(pids) -> float:
+    total_kb = 0
+    for pid in pids:
+        try:
+            for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+                if line.startswith("Pss:"):
+                    total_kb += int(line.split()[1])
+                    break
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+async def wait_ready(base_url: str, workers: int, timeout: float) -> float:
+    """
+    Poll /ready until enough consecutive 200s came back that every worker
+    has most likely answered. Returns the seconds it took.
+    """
+    start = time.perf_counter()
+    streak = 0
+    async with httpx.AsyncClient(base_url=base_url, timeout=2) as client:
+        while streak < 4 * workers:
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(f"server not ready after {timeout}s")
+            try:
+                ok = (await client.get("/ready")).status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            streak = streak + 1 if ok else 0
+            if not ok:
+                await asyncio.sleep(0.2)
+    return time.perf_counter() - start
+
+
+async def load(base_url: str, clients: int, seconds: float):
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+    counter = iter(range(10 ** 9))
+
+    async def worker(client):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            question = f"How does policy number {next(counter)} apply to my vacation days?"
+            start = time.perf_counter()
+            try:
+                response = await client.post("/chat", json={"question": question})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(clients)))
+    return latencies, errors
+
+
+def start(command, env):
+    return subprocess.Popen(command, env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+
+
+def stop(process):
+    if process is not None and process.poll() is None:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+
+
+def run(mode: str, workers: int, args) -> dict:
+    socket_path = ROOT / "data" / "bench_retrieval.sock"
+    env = {
+        **os.environ,
+        "RELEVANCE_THRESHOLD": "2",   # stop after retrieval, never call the LLM
+        "LLM_WARMUP": "0",
+        "LLM_HEALTH_INTERVAL": "0",
+        "ANONYMIZED_TELEMETRY": "false",
+    }
+    env.pop("RETRIEVAL_SOCKET", None)
+    sidecar = None
+    started = time.perf_counter()
+    if mode == "sidecar":
+        env["RETRIEVAL_SOCKET"] = str(socket_path)
+        sidecar = start([sys.executable, str(SRC_DIR / "retrieval_sidecar.py"), "--socket", str(socket_path)], env)
+    server = start([sys.executable, "-m", "uvicorn", "--app-dir", str(SRC_DIR), "api_server:app",
+                    "--port", str(args.port), "--workers", str(workers), "--log-level", "warning"], env)
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        asyncio.run(wait_ready(base_url, workers, args.timeout))
+        ready_s = time.perf_counter() - started
+        pids = children(server.pid) + (children(sidecar.pid) if sidecar else [])
+        memory = pss_mb(pids)
+        latencies, errors = asyncio.run(load(base_url, args.clients, args.seconds))
+    finally:
+        stop(server)
+        stop(sidecar)
+    latencies.sort()
+    return {
+        "ready_s": ready_s,
+        "pss_mb": memory,
+        "rps": len(latencies) / args.seconds,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--modes", nargs="+", default=["inprocess", "sidecar"], choices=["inprocess", "sidecar"])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=300.0, help="max. seconds to wait for readiness")
+    args = parser.parse_args()
+
+    print(f"{'mode':<10} {'workers':>7} {'ready s':>8} {'PSS MB':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>6}")
+    for mode in args.modes:
+        for workers in args.workers:
+            r = run(mode, workers, args)
+            print(f"{mode:<10} {workers:>7} {r['ready_s']:>8.1f} {r['pss_mb']:>8.0f} {r['rps']:>8.1f} "
+                  f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
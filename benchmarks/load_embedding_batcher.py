@@ -0,0 +1,93 @@
+"""
+Load test for the embedding micro-batcher.
+
+N concurrent clients each embed M distinct questions one after another,
+first with one encode([text]) call per request on the executor (what the
+API did before), then through EmbeddingBatcher. The embedding cache is
+disabled so every question really reaches the model.
+
+Usage (from the project root):
+    python benchmarks/load_embedding_batcher.py [--clients 64] [--questions 20]
+        [--window-ms 5] [--max-batch 32] [--workers 2]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from sentence_transformers import SentenceTransformer
+
+from embedding_batcher import EmbeddingBatcher
+from embedding_cache import CachedEncoder, EmbeddingCache
+from retrieval_engine import EMBEDDING_MODEL_NAME
+
+TOPICS = [
+    "vacation days", "parental leave", "probation period", "visa sponsorship",
+    "relocation budget", "promotion process", "360 feedback", "sick leave",
+    "onboarding buddy", "offboarding checklist", "learning budget", "anti-harassment policy",
+]
+
+
+def question(client: int, i: int) -> str:
+    return f"What is the policy on {TOPICS[(client + i) % len(TOPICS)]} for case {client}-{i}?"
+
+
+async def run_clients(embed, clients: int, questions: int):
+    latencies = []
+
+    async def client(c):
+        for i in range(questions):
+            start = time.perf_counter()
+            await embed(question(c, i))
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(clients)))
+    wall = time.perf_counter() - start
+    return wall, sorted(latencies)
+
+
+def report(label, wall, latencies):
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(
+        f"{label:<28} {len(latencies) / wall:8.1f} questions/s   "
+        f"p50 {statistics.median(latencies):7.1f} ms   p95 {p95:7.1f} ms"
+    )
+
+
+async def main(args):
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    encoder = CachedEncoder(model, EmbeddingCache(max_size=0))  # cache off
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+    loop = asyncio.get_running_loop()
+
+    model.encode(["warm-up"])
+    print(f"{args.clients} clients x {args.questions} questions, {args.workers} executor thread(s)\n")
+
+    async def unbatched(text):
+        return await loop.run_in_executor(executor, lambda: model.encode([text])[0].tolist())
+
+    report("one encode() per request", *await run_clients(unbatched, args.clients, args.questions))
+
+    batcher = EmbeddingBatcher(encoder, executor, args.window_ms, args.max_batch)
+    report(
+        f"batched ({args.window_ms:g} ms / {args.max_batch})",
+        *await run_clients(batcher.embed, args.clients, args.questions),
+    )
+    print(f"\nbatcher: {batcher.stats()}")
+    executor.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--questions", type=int, default=20, help="questions per client")
+    parser.add_argument("--window-ms", type=float, default=5.0)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=2)
+    asyncio.run(main(parser.parse_args()))
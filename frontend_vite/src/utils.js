@@ -9,6 +9,10 @@ export async function* parseSSEStream(stream) {
   while (true) {
     const { done, value } = await sseReader.read();
     if (done) break;
+    // the server could not answer (e.g. no language model host is available)
+    if (value.event === 'error') throw new Error(value.data);
+    // other named events (e.g. "queue" position updates) are not part of the answer text
+    if (value.event && value.event !== 'message') continue;
     yield value.data;
   }
 }
\ No newline at end of file
@@ -0,0 +1,145 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def chunk_fingerprint(chunks) -> str:
+    """
+    Fingerprint of the retrieved chunks: their IDs and their text.
+
+    A cached answer only matches when the same chunks (in the same order)
+    are retrieved again *with the same content*, so re-ingesting a changed
+    chunk automatically invalidates every answer built from it.
+    """
+    digest = hashlib.sha256()
+    for ch in chunks:
+        digest.update(str(ch["id"]).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(hashlib.sha256(ch["content"].encode("utf-8")).digest())
+    return digest.hexdigest()
+
+
+class AnswerCache:
+    """
+    Semantic cache of generated answers.
+
+    An entry is found when the new question embedding has cosine similarity
+    >= threshold with a cached question AND the retrieval returned the same
+    chunks (see chunk_fingerprint). Bounded LRU with an optional TTL.
+
+    stats() reports hits, misses, the hit ratio and the generation time that
+    hits saved (sum of the original generation latency of every hit).
+    """
+
+    def __init__(self, max_size: int = 512, threshold: float = 0.95, ttl_seconds: float = 0):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+
+        self._entries = OrderedDict()  # entry id -> entry dict
+        self._next_id = 0
+        self._matrix = None            # (n, dim) normalized question vectors, rebuilt lazily
+        self._matrix_ids = []
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, query_embedding, chunks):
+        """
+        Return the cached {"answer", "sources", ...} entry or None.
+        """
+        if self.max_size <= 0 or not chunks:
+            return None
+        fingerprint = chunk_fingerprint(chunks)
+        query = _unit(query_embedding)
+
+        with self._lock:
+            self._drop_expired()
+            if not self._entries:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                self._matrix_ids = list(self._entries)
+                self._matrix = np.stack([self._entries[i]["vector"] for i in self._matrix_ids])
+
+            similarities = self._matrix @ query
+            # best similar question whose retrieval matches
+            for pos in np.argsort(-similarities):
+                if similarities[pos] < self.threshold:
+                    break
+                entry = self._entries[self._matrix_ids[pos]]
+                if entry["fingerprint"] == fingerprint:
+                    self._entries.move_to_end(self._matrix_ids[pos])
+                    self.hits += 1
+                    self.saved_seconds += entry["generation_seconds"]
+                    return entry
+            self.misses += 1
+            return None
+
+    def store(self, query_embedding, chunks, answer: str, sources, generation_seconds: float):
+        if self.max_size <= 0 or not chunks:
+            return
+        entry = {
+            "vector": _unit(query_embedding),
+            "fingerprint": chunk_fingerprint(chunks),
+            "chunk_ids": [ch["id"] for ch in chunks],
+            "answer": answer,
+            "sources": sources,
+            "generation_seconds": generation_seconds,
+            "created_at": time.time(),
+        }
+        with self._lock:
+            self._entries[self._next_id] = entry
+            self._next_id += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def invalidate(self, chunk_ids=None):
+        """
+        Drop entries built from any of chunk_ids, or everything when None.
+        """
+        with self._lock:
+            if chunk_ids is None:
+                self._entries.clear()
+            else:
+                chunk_ids = set(chunk_ids)
+                for key in [k for k, e in self._entries.items() if chunk_ids & set(e["chunk_ids"])]:
+                    del self._entries[key]
+            self._matrix = None
+
+    def _drop_expired(self):
+        if not self.ttl_seconds:
+            return
+        cutoff = time.time() - self.ttl_seconds
+        expired = [k for k, e in self._entries.items() if e["created_at"] < cutoff]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -1,28 +1,386 @@
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 import os
 os.environ["ANONYMIZED_TELEMETRY"] = "false"
 
-from typing import List
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import List, Optional
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
 
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
-import ollama
 from pathlib import Path
 
+# allow sibling imports when started as "uvicorn src.api_server:app" from the project root
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from answer_cache import AnswerCache, chunk_fingerprint
+from chat_sessions import (
+    SESSION_ID_RE, SessionStore, extractive_summary, history_fingerprint, summary_messages,
+)
+from context_packer import pack_context
+from embedding_batcher import EmbeddingBatcher
+from embedding_cache import normalize_question
+from index_versions import IndexWatcher
+from llm_backend import LLMBackend, NoHealthyHostError
+from llm_limiter import GenerationLimiter, QueueFullError
+from metrics import REGISTRY, RequestTimer
+from precompute_answers import PrecomputedAnswers, QuestionLog
+from request_profiler import SlowRequestProfiler
+from retrieval_engine import CHROMA_PATH, get_engine
+from retrieval_sidecar import SidecarEngine
+from single_flight import SingleFlight
+from sse_stream import DisconnectWatcher, GenerationCancelled, TokenRelay, sse_event
+
 # ---------- config ----------
 BASE_DIR = Path(__file__).resolve().parent.parent
-CHROMA_PATH = BASE_DIR / "data" / "chroma"
-EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "phi3:mini")
+# Ollama hosts, comma-separated, each optionally with its own model: "http://gpu1:11434=llama3:8b,http://gpu2:11434"
+LLM_HOSTS = os.getenv("LLM_HOSTS") or os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")
+LLM_HEALTH_INTERVAL = float(os.getenv("LLM_HEALTH_INTERVAL", "10"))  # seconds between host checks, 0 = off
+# warm-up: load the model on every host at startup (0 = off), and ask Ollama to keep it loaded this long
+LLM_WARMUP = os.getenv("LLM_WARMUP", "1") != "0"
+LLM_WARMUP_TIMEOUT = float(os.getenv("LLM_WARMUP_TIMEOUT", "120"))
+LLM_KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "30m")
+
+# semantic answer cache: entries, min. cosine similarity of the questions, TTL in seconds (0 = none)
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+
+# concurrency: generations running at once (default 2 per host), requests allowed to wait, embedding/retrieval threads
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", str(2 * len(LLM_HOSTS.split(",")))))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "16"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "2"))
+# micro-batching of question embeddings across concurrent requests (window 0 = no batching)
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", "32"))
+QUEUE_EVENT_INTERVAL = 1.0  # seconds between queue-position events on /chat-stream
+
+# /chat-stream framing: token deltas are merged for up to STREAM_COALESCE_MS or until
+# STREAM_COALESCE_CHARS are collected; a heartbeat comment is sent after STREAM_HEARTBEAT_S of silence
+STREAM_COALESCE_MS = float(os.getenv("STREAM_COALESCE_MS", "30"))
+STREAM_COALESCE_CHARS = int(os.getenv("STREAM_COALESCE_CHARS", "24"))
+STREAM_HEARTBEAT_S = float(os.getenv("STREAM_HEARTBEAT_S", "15"))
+# answer length assumed before the first answer completes (for the time saved by cancellations)
+EXPECTED_ANSWER_TOKENS = int(os.getenv("EXPECTED_ANSWER_TOKENS", "256"))
+
+# context packing: max. context tokens (0 = no limit), similarity above which a passage counts as duplicate
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1024"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.85"))
+
+# relevance gating: a question whose best chunk has a cosine similarity below RELEVANCE_THRESHOLD
+# gets OFF_TOPIC_ANSWER without an LLM call (0 = off); chunks scoring more than RELEVANCE_MARGIN
+# below the best one are left out of the context (adaptive top-k, 0 = keep all)
+RELEVANCE_THRESHOLD = float(os.getenv("RELEVANCE_THRESHOLD", "0.25"))
+RELEVANCE_MARGIN = float(os.getenv("RELEVANCE_MARGIN", "0.2"))
+OFF_TOPIC_ANSWER = "I cannot answer that based on the available HR policies."
+
+# first message of every prompt, kept byte-identical so Ollama can reuse the KV cache of the prefix
+SYSTEM_PROMPT = (
+    "You are an HR assistant. Answer the question strictly based on the "
+    "provided policy context. If the answer is not in the context, say "
+    f"'{OFF_TOPIC_ANSWER}'\n\n"
+    "Always be concise and clear."
+)
+
+# shared embedding/retrieval process for multi-worker deployments (see retrieval_sidecar.py);
+# unset = each worker loads its own model and index
+RETRIEVAL_SOCKET = os.getenv("RETRIEVAL_SOCKET") or None
+
+# index hot-swap: seconds between checks of the policy folder and the published index version (0 = off),
+# and how long the folder must stay unchanged before a rebuild starts
+INDEX_WATCH_INTERVAL = float(os.getenv("INDEX_WATCH_INTERVAL", "5"))
+INDEX_WATCH_DEBOUNCE = float(os.getenv("INDEX_WATCH_DEBOUNCE", "10"))
+DOCS_PATH = Path(os.getenv("DOCS_PATH", BASE_DIR / "data" / "hr_policies"))  # the folder ingest_md.py reads
+
+# precomputed answers for frequent questions (precompute_answers.py), served before retrieval
+# (PRECOMPUTED_ANSWERS=0 turns that off); the job is rerun whenever a new index version goes live
+# (0 = never), and QUESTION_LOG_PATH (unset = off) logs incoming questions as input for it
+PRECOMPUTED_ANSWERS = os.getenv("PRECOMPUTED_ANSWERS", "1") != "0"
+PRECOMPUTE_AFTER_SWAP = os.getenv("PRECOMPUTE_AFTER_SWAP", "1") != "0"
+QUESTION_LOG_PATH = os.getenv("QUESTION_LOG_PATH") or None
+
+# multi-turn sessions (chat_sessions.py): recent turns are kept up to SESSION_HISTORY_TOKENS (0 = unbounded),
+# older ones are folded into a rolling summary of at most SESSION_SUMMARY_TOKENS
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))  # seconds a session may stay idle, 0 = forever
+SESSION_HISTORY_TOKENS = int(os.getenv("SESSION_HISTORY_TOKENS", "1024"))
+SESSION_SUMMARY_TOKENS = int(os.getenv("SESSION_SUMMARY_TOKENS", "200"))
+
+# /chat-batch: max. questions per request, and generations one batch runs at once (LLM_MAX_CONCURRENCY
+# still caps the total; keep this below LLM_MAX_QUEUE so interactive requests are not rejected)
+CHAT_BATCH_MAX = int(os.getenv("CHAT_BATCH_MAX", "500"))
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "2"))
+
+# slow-request profiling: requests slower than PROFILE_SLOW_MS are dumped with a sampled stack profile (0 = off)
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", BASE_DIR / "data" / "profiles"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+
+engine = SidecarEngine(RETRIEVAL_SOCKET) if RETRIEVAL_SOCKET else get_engine()
+answer_cache = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL)
+llm_limiter = GenerationLimiter(LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE)
+# routes generations to the least busy healthy Ollama host
+llm_backend = LLMBackend.from_spec(
+    LLM_HOSTS, LLM_MODEL_NAME, health_interval=LLM_HEALTH_INTERVAL, keep_alive=LLM_KEEP_ALIVE
+)
+# identical in-flight questions share one retrieval and one generation
+single_flight = SingleFlight()
+# answers computed offline for the published index version
+precomputed_answers = PrecomputedAnswers(CHROMA_PATH)
+question_log = QuestionLog(QUESTION_LOG_PATH) if QUESTION_LOG_PATH else None
+# conversation history of requests that send a session_id
+sessions = SessionStore(SESSION_MAX, SESSION_TTL, SESSION_HISTORY_TOKENS, SESSION_SUMMARY_TOKENS)
+summary_tasks = set()  # background summaries of folded session turns
+# rebuilds the index when the policies change and swaps new versions into the engine
+index_watcher = IndexWatcher(
+    engine, DOCS_PATH, INDEX_WATCH_INTERVAL, INDEX_WATCH_DEBOUNCE,
+    after_swap=[sys.executable, str(Path(__file__).resolve().parent / "precompute_answers.py")]
+    if PRECOMPUTE_AFTER_SWAP else None,
+    lock_path=CHROMA_PATH / "watcher.lock",  # with several workers, one watches, builds and precomputes
+)
+
+# CPU-bound embedding and the blocking Chroma query run here, never on the event loop
+embed_executor = ThreadPoolExecutor(max_workers=EMBED_WORKERS, thread_name_prefix="embed")
+embedding_batcher = None  # created by warm_up(), once the embedding model is loaded
+engine_ready = None       # future set by warm_up(): True once retrieval works, False if it failed
+warmup_status = {"state": "pending", "seconds": None, "engine_s": None, "llm": None, "error": None}
+profiler = SlowRequestProfiler(PROFILE_SLOW_MS, PROFILE_DIR, PROFILE_INTERVAL_MS) if PROFILE_SLOW_MS > 0 else None
+
+
+# ---------- metrics ----------
+SIZE_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250)
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "hr_chat_stage_seconds",
+    "Request latency per stage (embed, retrieve, context, queue, ttft, generate, total).",
+)
+REQUESTS = REGISTRY.counter("hr_chat_requests_total", "Chat requests by endpoint and outcome.")
+TOKENS_PER_SECOND = REGISTRY.histogram("hr_llm_tokens_per_second", "LLM generation speed.", RATE_BUCKETS)
+OUTPUT_TOKENS = REGISTRY.histogram("hr_llm_output_tokens", "Tokens generated per answer.", TOKEN_BUCKETS)
+PROMPT_CHARS = REGISTRY.histogram("hr_prompt_chars", "Prompt length in characters.", SIZE_BUCKETS)
+PROMPT_TOKENS = REGISTRY.histogram("hr_prompt_tokens", "Prompt length in tokens as counted by Ollama.", TOKEN_BUCKETS)
+CONTEXT_CHARS = REGISTRY.histogram("hr_context_chars", "Retrieved context size in characters.", SIZE_BUCKETS)
+CONTEXT_CHUNKS = REGISTRY.histogram("hr_context_chunks", "Chunks in the retrieved context.", (0, 1, 2, 3, 5, 8, 13))
+CONTEXT_TOKENS = REGISTRY.histogram("hr_context_tokens", "Packed context size in tokens.", TOKEN_BUCKETS)
+CONTEXT_TOKENS_SAVED = REGISTRY.histogram(
+    "hr_context_tokens_saved",
+    "Context tokens removed by merging, de-duplication and the token budget.",
+    (0, 16, 32, 64, 128, 256, 512, 1024, 2048),
+)
+
+CACHE_ENTRIES = REGISTRY.gauge("hr_cache_entries", "Entries in the embedding and answer caches.")
+CACHE_HITS = REGISTRY.gauge("hr_cache_hits", "Cache hits since start.")
+CACHE_MISSES = REGISTRY.gauge("hr_cache_misses", "Cache misses since start.")
+LLM_CANCELLED = REGISTRY.counter(
+    "hr_llm_cancelled_total",
+    "Streams whose client disconnected, by phase (queue: before generation, generate: generation aborted).",
+)
+LLM_CANCEL_SAVED_SECONDS = REGISTRY.counter(
+    "hr_llm_cancel_saved_seconds_total",
+    "Estimated generation time saved by aborting generations of disconnected clients.",
+)
+SSE_PARTS = REGISTRY.counter("hr_sse_token_parts_total", "Token deltas received from the LLM on /chat-stream.")
+SSE_FRAMES = REGISTRY.counter("hr_sse_frames_total", "SSE data frames sent on /chat-stream after coalescing.")
+LLM_ACTIVE = REGISTRY.gauge("hr_llm_active", "Generations running.")
+LLM_WAITING = REGISTRY.gauge("hr_llm_waiting", "Requests waiting for a generation slot.")
+LLM_REJECTED = REGISTRY.gauge("hr_llm_rejected", "Requests rejected with 429 since start.")
+FLIGHTS_IN_PROGRESS = REGISTRY.gauge("hr_singleflight_in_flight", "Shared generations in progress.")
+FLIGHTS_STARTED = REGISTRY.gauge("hr_singleflight_started", "Generations started since start.")
+FLIGHTS_JOINED = REGISTRY.gauge("hr_singleflight_joined", "Requests that joined a generation already in progress.")
+HOST_HEALTHY = REGISTRY.gauge("hr_llm_host_healthy", "1 if the Ollama host passed its last health check.")
+HOST_OUTSTANDING = REGISTRY.gauge("hr_llm_host_outstanding", "Requests in progress per Ollama host.")
+HOST_REQUESTS = REGISTRY.gauge("hr_llm_host_requests", "Requests sent to each Ollama host since start.")
+HOST_FAILURES = REGISTRY.gauge("hr_llm_host_failures", "Failed requests per Ollama host since start.")
+LLM_FAILOVERS = REGISTRY.gauge("hr_llm_failovers", "Requests retried on another Ollama host since start.")
+BEST_SCORE = REGISTRY.histogram(
+    "hr_retrieval_best_score",
+    "Cosine similarity of the best retrieved chunk.",
+    (0.1, 0.2, 0.25, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9),
+)
+RELEVANCE_DECISIONS = REGISTRY.counter(
+    "hr_relevance_gate_total",
+    "Relevance gate decisions (pass: sent to the LLM, skip: answered with the fallback).",
+)
+CHUNKS_DROPPED = REGISTRY.counter("hr_context_chunks_dropped_total", "Chunks dropped by adaptive top-k.")
+RELEVANCE_THRESHOLD_GAUGE = REGISTRY.gauge("hr_relevance_threshold", "Configured relevance threshold.")
+RELEVANCE_THRESHOLD_GAUGE.set(RELEVANCE_THRESHOLD)
+
+
+def collect_runtime_gauges():
+    caches = {"answer": answer_cache.stats()}
+    if engine.is_ready:
+        caches["embedding"] = engine.embedding_cache.stats()
+    for name, stats in caches.items():
+        CACHE_ENTRIES.set(stats["size"], cache=name)
+        CACHE_HITS.set(stats["hits"], cache=name)
+        CACHE_MISSES.set(stats["misses"], cache=name)
+    llm = llm_limiter.stats()
+    LLM_ACTIVE.set(llm["active"])
+    LLM_WAITING.set(llm["waiting"])
+    LLM_REJECTED.set(llm["rejected"])
+    flights = single_flight.stats()
+    FLIGHTS_IN_PROGRESS.set(flights["in_flight"])
+    FLIGHTS_STARTED.set(flights["flights_started"])
+    FLIGHTS_JOINED.set(flights["flights_joined"])
+    for host in llm_backend.hosts:
+        HOST_HEALTHY.set(int(host.healthy), host=host.url)
+        HOST_OUTSTANDING.set(host.outstanding, host=host.url)
+        HOST_REQUESTS.set(host.requests, host=host.url)
+        HOST_FAILURES.set(host.failures, host=host.url)
+    LLM_FAILOVERS.set(llm_backend.failovers)
+
+
+REGISTRY.add_collector(collect_runtime_gauges)
+
+
+def start_request(endpoint: str) -> RequestTimer:
+    if profiler is not None:
+        profiler.begin()
+    return RequestTimer(endpoint)
+
+
+def finish_request(timer: RequestTimer, outcome: str):
+    """
+    Record the stage timings and per-request values of a finished request,
+    and dump a profile if it was slow. Only the first call per request counts.
+    """
+    if timer.finished:
+        return
+    timer.finished = True
+    total = timer.elapsed()
+    for stage, seconds in timer.stages.items():
+        STAGE_SECONDS.observe(seconds, endpoint=timer.endpoint, stage=stage)
+    STAGE_SECONDS.observe(total, endpoint=timer.endpoint, stage="total")
+    REQUESTS.inc(endpoint=timer.endpoint, outcome=outcome)
+
+    for key, metric in (
+        ("prompt_chars", PROMPT_CHARS), ("prompt_tokens", PROMPT_TOKENS),
+        ("context_chars", CONTEXT_CHARS), ("context_chunks", CONTEXT_CHUNKS),
+        ("context_tokens", CONTEXT_TOKENS), ("context_tokens_saved", CONTEXT_TOKENS_SAVED),
+        ("output_tokens", OUTPUT_TOKENS), ("tokens_per_second", TOKENS_PER_SECOND),
+    ):
+        if timer.values.get(key) is not None:
+            metric.observe(timer.values[key], endpoint=timer.endpoint)
+
+    if profiler is not None:
+        path = profiler.end(timer.started_wall, total, {
+            "endpoint": timer.endpoint,
+            "outcome": outcome,
+            "stages_ms": {name: round(sec * 1000, 1) for name, sec in timer.stages.items()},
+            "values": timer.values,
+        })
+        if path:
+            print(f"Slow request ({total * 1000:.0f} ms) profiled to {path}")
+
+
+# running averages of completed generations, used to estimate what a cancellation saved
+generation_profile = {"tokens": float(EXPECTED_ANSWER_TOKENS), "tokens_per_second": 0.0}
+
+
+def record_generation(timer: RequestTimer, final, seconds: float, fallback_tokens: int, complete: bool = True):
+    """
+    Token counts and speed of one generation. Ollama reports them in the
+    final response (eval_count / eval_duration in ns); without them the
+    number of streamed parts over wall time is used.
+    """
+    final = final or {}
+    if final.get("prompt_eval_count"):
+        timer.values["prompt_tokens"] = final["prompt_eval_count"]
+    tokens = final.get("eval_count") or fallback_tokens
+    eval_seconds = (final.get("eval_duration") or 0) / 1e9 or seconds
+    timer.values["output_tokens"] = tokens
+    if tokens and eval_seconds > 0:
+        timer.values["tokens_per_second"] = round(tokens / eval_seconds, 2)
+
+    if complete and tokens:
+        rate = timer.values.get("tokens_per_second", 0.0)
+        generation_profile["tokens"] += 0.1 * (tokens - generation_profile["tokens"])
+        if rate:
+            previous = generation_profile["tokens_per_second"]
+            generation_profile["tokens_per_second"] = rate if not previous else previous + 0.1 * (rate - previous)
+
+
+def estimate_saved_seconds(tokens_done: int, seconds: float) -> float:
+    """
+    Generation time a cancellation saved: the tokens an average answer still
+    needed, at this request's speed (or the average speed early on).
+    """
+    rate = tokens_done / seconds if tokens_done >= 5 and seconds > 0 else generation_profile["tokens_per_second"]
+    if not rate:
+        return 0.0
+    return max(0.0, generation_profile["tokens"] - tokens_done) / rate
 
-embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
 
 # ---------- FastAPI setup ----------
-app = FastAPI()
+async def warm_up():
+    """
+    Startup warm-up, run in the background so /health answers right away:
+    open the retrieval engine and run a dummy encode and query (on the
+    embed executor), while the LLM is loaded on every Ollama host with a
+    keep-alive request. Chat requests wait for the engine part only;
+    /ready reports ready once both parts are done.
+    """
+    global embedding_batcher
+    start = time.perf_counter()
+    warmup_status["state"] = "running"
+    llm = asyncio.ensure_future(llm_backend.warm_up(LLM_WARMUP_TIMEOUT)) if LLM_WARMUP else None
+    try:
+        await asyncio.get_running_loop().run_in_executor(embed_executor, engine.warm_up)
+    except Exception as exc:
+        warmup_status.update(state="failed", error=repr(exc))
+        print(f"Warm-up failed: {exc!r}")
+        engine_ready.set_result(False)
+        if llm is not None:
+            llm.cancel()
+        return
+    embedding_batcher = EmbeddingBatcher(engine.encoder, embed_executor, EMBED_BATCH_WINDOW_MS, EMBED_BATCH_MAX)
+    warmup_status["engine_s"] = engine.warmup_seconds
+    engine_ready.set_result(True)
+    index_watcher.start()
+
+    if llm is not None:
+        warmup_status["llm"] = await llm
+    warmup_status.update(state="done", seconds=round(time.perf_counter() - start, 3))
+    print(f"Warm-up done in {warmup_status['seconds']:.2f}s (engine {engine.warmup_seconds:.2f}s, llm {warmup_status['llm']})")
+
+
+async def wait_for_engine():
+    """
+    Hold requests that arrive during warm-up until retrieval works.
+    """
+    if not await asyncio.shield(engine_ready):
+        raise HTTPException(status_code=503, detail="The server failed to start, see /health.")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global engine_ready
+    engine_ready = asyncio.get_running_loop().create_future()
+    llm_backend.start()
+    warmup_task = asyncio.ensure_future(warm_up())
+    yield
+    warmup_task.cancel()
+    for task in summary_tasks:
+        task.cancel()
+    await index_watcher.close()
+    await llm_backend.close()
+    engine.close()
+    if question_log is not None:
+        question_log.close()
+    embed_executor.shutdown(wait=False)
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",
@@ -42,6 +400,14 @@ app.add_middleware(
 # ---------- Models ----------
 class ChatRequest(BaseModel):
     question: str
+    area: Optional[str] = None  # policy area to search, e.g. "time-off-and-absence"; None = routed
+    session_id: Optional[str] = None  # continue this conversation (history kept server-side); None = stateless
+
+
+class ChatBatchRequest(BaseModel):
+    questions: List[str]
+    area: Optional[str] = None
+    concurrency: Optional[int] = None  # generations at once, at most CHAT_BATCH_CONCURRENCY
 
 
 class SourceInfo(BaseModel):
@@ -55,157 +421,749 @@ class ChatResponse(BaseModel):
 
 
 # ---------- helpers ----------
-def get_collection():
-    client = chromadb.PersistentClient(
-        path=str(CHROMA_PATH),
-        settings=Settings(allow_reset=True),
-    )
-    return client.get_or_create_collection(name="hr-policies")
-
-
 def embed_text(text: str) -> list[float]:
-    return embedding_model.encode([text])[0].tolist()
+    return engine.embed(text)
 
 
-def retrieve_chunks(collection, question: str, top_k: int = 3):
-    query_emb = embed_text(question)
-    results = collection.query(
-        query_embeddings=[query_emb],
-        n_results=top_k,
-        include=["documents", "metadatas"],
-    )
+def retrieve_chunks(question: str, top_k: int = 3, query_emb: list[float] = None, area: str = None):
+    if query_emb is None:
+        query_emb = embed_text(question)
+    return hits_to_chunks(engine.query_embedding(query_emb, top_k=top_k, question=question, area=area))
 
-    docs_list = results.get("documents", [])
-    metas_list = results.get("metadatas", [])
 
-    if not docs_list or not docs_list[0]:
-        return []
+def retrieve_batch(questions: list[str], top_k: int = 3, area: str = None):
+    """
+    One batched encode and one multi-query search for all questions.
+    Returns (embeddings, chunks per question).
+    """
+    embeddings = engine.encoder.encode_many(questions)
+    hit_lists = engine.query_embeddings(embeddings, top_k, questions, area)
+    return embeddings, [hits_to_chunks(hits) for hits in hit_lists]
 
-    docs = docs_list[0]
-    metas = metas_list[0] if metas_list else [{}] * len(docs)
 
+def hits_to_chunks(hits):
     chunks = []
-    for doc, meta in zip(docs, metas):
+    for hit in hits:
+        doc, meta = hit["content"], hit["metadata"]
         full_path = meta.get("source", "")
         # nice shorter path for frontend
         rel_name = Path(full_path).name if full_path else full_path
         chunks.append(
             {
+                "id": hit["id"],
                 "content": doc,
                 "path": rel_name,
                 "chunk_index": meta.get("chunk_index", -1),
+                "overlap_chars": meta.get("overlap_chars"),  # None for indexes built before it was stored
+                "score": hit.get("score"),  # cosine similarity, None for BM25-only hits
             }
         )
     return chunks
 
 
-def build_context(chunks):
-    lines = []
-    for i, ch in enumerate(chunks, start=1):
-        lines.append(
-            f"### Chunk {i}\n"
-            f"Source: {ch['path']} (chunk {ch['chunk_index']})\n\n"
-            f"{ch['content']}\n"
-        )
-    return "\n\n".join(lines)
+async def embed_and_retrieve_async(question: str, top_k: int = 3, timer: RequestTimer = None, area: str = None):
+    """
+    Embed the question through the micro-batcher, then run the Chroma query
+    on the embedding executor. Returns (query_emb, chunks).
+    """
+    timer = timer or RequestTimer("internal")
+    with timer.stage("embed"):
+        query_emb = await embedding_batcher.embed(question)
+    loop = asyncio.get_running_loop()
+    with timer.stage("retrieve"):
+        chunks = await loop.run_in_executor(embed_executor, retrieve_chunks, question, top_k, query_emb, area)
+    return query_emb, chunks
 
 
-def generate_answer_with_ollama(question: str, context: str) -> str:
-    system_prompt = (
-        "You are an HR assistant. Answer the question strictly based on the "
-        "provided policy context. If the answer is not in the context, say "
-        "'I cannot answer that based on the available HR policies.'\n\n"
-        "Always be concise and clear."
-    )
+async def retrieve_shared(question: str, top_k: int, timer: RequestTimer, area: str = None):
+    """
+    embed_and_retrieve_async, run once for concurrent requests with the
+    same normalized question and area.
+    """
+    key = (normalize_question(question), top_k, area)
+    return await single_flight.run(key, lambda: embed_and_retrieve_async(question, top_k, timer, area))
 
-    prompt = (
-        f"{system_prompt}\n\n"
-        f"Context:\n{context}\n\n"
-        f"Question: {question}\n\n"
-        "Answer:"
-    )
 
-    resp = ollama.chat(
-        model="phi3:mini",
-        messages=[{"role": "user", "content": prompt}],
-    )
-    return resp["message"]["content"]
+def precomputed_answer(req: ChatRequest, history):
+    """
+    Log the question, then return its precomputed answer entry, or None.
+    Requests that name an area or continue a conversation are always
+    answered live.
+    """
+    if question_log is not None:
+        question_log.record(req.question, req.area)
+    if not PRECOMPUTED_ANSWERS or req.area is not None or history:
+        return None
+    return precomputed_answers.lookup(req.question)
 
 
-def stream_answer_with_ollama(question: str, context: str):
+def open_session(req: ChatRequest):
     """
-    Generator that yields the answer text chunk by chunk from Ollama,
-    wrapped as proper SSE events.
+    The request's session and its history messages, or (None, []) for a
+    stateless request. A malformed session ID is rejected (400).
     """
-    system_prompt = (
-        "You are an HR assistant. Answer the question strictly based on the "
-        "provided policy context. If the answer is not in the context, say "
-        "'I cannot answer that based on the available HR policies.'\n\n"
-        "Always be concise and clear."
-    )
+    if req.session_id is None:
+        return None, []
+    if not SESSION_ID_RE.match(req.session_id):
+        raise HTTPException(status_code=400, detail="session_id must be 1-128 letters, digits or _.:-")
+    session = sessions.get(req.session_id)
+    return session, sessions.history(session)
+
+
+def remember_turn(session, question: str, answer: str):
+    """
+    Add a finished turn to the session; when its history outgrew the token
+    budget, the oldest turns are summarized in the background.
+    """
+    if session is None:
+        return
+    turns = sessions.record(session, question, answer)
+    if turns:
+        task = asyncio.ensure_future(summarize_turns(session, turns))
+        summary_tasks.add(task)
+        task.add_done_callback(summary_tasks.discard)
+
+
+async def summarize_turns(session, turns):
+    """
+    Fold turns into the session's rolling summary, written by the LLM in a
+    regular generation slot. If the LLM cannot write it (no slot, no host,
+    or any other error), the questions asked are kept instead.
+    """
+    try:
+        try:
+            async with llm_limiter.slot():
+                resp = await llm_backend.chat(
+                    messages=summary_messages(session.summary, turns, SESSION_SUMMARY_TOKENS),
+                    options={"num_predict": SESSION_SUMMARY_TOKENS},
+                )
+            summary = resp["message"]["content"]
+        except Exception as exc:
+            print(f"Session summary without the LLM ({exc.__class__.__name__}).")
+            summary = extractive_summary(session.summary, turns)
+        sessions.fold(session, turns, summary)
+    finally:
+        # cancelled before folding: let a later turn schedule the fold again
+        session.folding = False
+
+
+async def check_area(area: str):
+    """
+    Reject a policy area the current index does not have (400).
+    """
+    if area is None:
+        return
+    known = await asyncio.get_running_loop().run_in_executor(embed_executor, engine.areas)
+    if not known:
+        raise HTTPException(status_code=400, detail="The index has no policy areas yet, re-run ingest_md.py.")
+    if area not in known:
+        raise HTTPException(status_code=400, detail=f"Unknown policy area {area!r}, expected one of: {', '.join(known)}.")
+
+
+relevance_stats = {"passed": 0, "skipped": 0, "chunks_dropped": 0}
+
 
-    prompt = (
-        f"{system_prompt}\n\n"
+def select_relevant(chunks, timer: RequestTimer):
+    """
+    Relevance gate and adaptive top-k over the retrieved chunks.
+
+    Returns [] when even the best chunk is below RELEVANCE_THRESHOLD (the
+    question is off-topic), otherwise the chunks within RELEVANCE_MARGIN of
+    the best one. Chunks found only by BM25 have no similarity and are kept.
+    """
+    scores = [ch["score"] for ch in chunks if ch.get("score") is not None]
+    if not scores:
+        return chunks
+    best = max(scores)
+    timer.values["best_score"] = round(best, 4)
+    BEST_SCORE.observe(best, endpoint=timer.endpoint)
+
+    if best < RELEVANCE_THRESHOLD:
+        relevance_stats["skipped"] += 1
+        RELEVANCE_DECISIONS.inc(endpoint=timer.endpoint, decision="skip")
+        print(f"Relevance gate: skipped LLM call, best similarity {best:.3f} < {RELEVANCE_THRESHOLD}")
+        return []
+    relevance_stats["passed"] += 1
+    RELEVANCE_DECISIONS.inc(endpoint=timer.endpoint, decision="pass")
+
+    if RELEVANCE_MARGIN <= 0:
+        return chunks
+    cutoff = best - RELEVANCE_MARGIN
+    kept = [ch for ch in chunks if ch.get("score") is None or ch["score"] >= cutoff]
+    if len(kept) < len(chunks):
+        relevance_stats["chunks_dropped"] += len(chunks) - len(kept)
+        CHUNKS_DROPPED.inc(len(chunks) - len(kept), endpoint=timer.endpoint)
+    return kept
+
+
+def relevance_summary() -> dict:
+    decided = relevance_stats["passed"] + relevance_stats["skipped"]
+    return {
+        "threshold": RELEVANCE_THRESHOLD,
+        "margin": RELEVANCE_MARGIN,
+        **relevance_stats,
+        "skip_rate": round(relevance_stats["skipped"] / decided, 4) if decided else 0.0,
+    }
+
+
+def chunk_sources(chunks):
+    return [{"path": c["path"], "chunk_index": c["chunk_index"]} for c in chunks]
+
+
+def build_context(chunks):
+    """
+    Prompt context from the retrieved chunks, packed to CONTEXT_TOKEN_BUDGET
+    (see context_packer.py). Returns (context, packing report).
+    """
+    return pack_context(chunks, CONTEXT_TOKEN_BUDGET, CONTEXT_DEDUP_THRESHOLD)
+
+
+def build_prompt(question: str, context: str) -> str:
+    return (
         f"Context:\n{context}\n\n"
         f"Question: {question}\n\n"
         "Answer:"
     )
 
-    stream = ollama.chat(
-        model="phi3:mini",
-        messages=[{"role": "user", "content": prompt}],
-        stream=True,
+
+def build_messages(question: str, context: str, history=()) -> list[dict]:
+    """
+    System prompt, session history, then the question with its context.
+    The history keeps earlier questions without their context, so on the
+    next turn this last message is replaced by the bare question. Two
+    consecutive turns share everything before the previous question (the
+    history grows by appending), and Ollama reuses its KV cache for that
+    prefix. It re-evaluates the previous question and answer and the new
+    message.
+    """
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        *history,
+        {"role": "user", "content": build_prompt(question, context)},
+    ]
+
+
+def build_timed_context(chunks, timer: RequestTimer) -> str:
+    with timer.stage("context"):
+        context, report = build_context(chunks)
+    timer.values["context_chars"] = len(context)
+    timer.values["context_chunks"] = len(chunks)
+    timer.values["context_tokens"] = report["tokens_after"]
+    timer.values["context_tokens_saved"] = report["tokens_saved"]
+    return context
+
+
+async def generate_answer_with_ollama(question: str, context: str, timer: RequestTimer = None,
+                                      history=()) -> str:
+    messages = build_messages(question, context, history)
+    start = time.perf_counter()
+    resp = await llm_backend.chat(messages=messages)
+    answer = resp["message"]["content"]
+    if timer is not None:
+        seconds = time.perf_counter() - start
+        timer.add("generate", seconds)
+        # no stream, so the time to first token is Ollama's own load + prompt evaluation time
+        prefill_ns = (resp.get("load_duration") or 0) + (resp.get("prompt_eval_duration") or 0)
+        if prefill_ns:
+            timer.add("ttft", prefill_ns / 1e9)
+        timer.values["prompt_chars"] = sum(len(m["content"]) for m in messages)
+        record_generation(timer, resp, seconds, len(answer.split()))
+    return answer
+
+
+async def iter_answer_tokens(question: str, context: str, timer: RequestTimer = None, history=()):
+    """
+    Async generator that yields the raw answer text chunk by chunk from Ollama.
+    """
+    messages = build_messages(question, context, history)
+    start = time.perf_counter()
+    stream = await llm_backend.chat(messages=messages, stream=True)
+
+    parts, final, complete = 0, None, False
+    try:
+        async for chunk in stream:
+            if chunk.get("done"):
+                final = chunk
+            part = chunk["message"]["content"]
+            if not part:
+                continue
+            if parts == 0 and timer is not None:
+                timer.add("ttft", time.perf_counter() - start)
+            parts += 1
+            yield part
+        complete = True
+    finally:
+        # closing the stream closes the HTTP response, which makes Ollama stop generating
+        aclose = getattr(stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+        if timer is not None:
+            seconds = time.perf_counter() - start
+            timer.add("generate", seconds)
+            timer.values["prompt_chars"] = sum(len(m["content"]) for m in messages)
+            record_generation(timer, final, seconds, parts, complete)
+
+
+async def generate_parts(question: str, context: str, query_emb, chunks, timer: RequestTimer, history=()):
+    """
+    The generation behind a shared Flight: yields the answer parts and
+    stores the complete answer in the answer cache (unless it depends on a
+    conversation history).
+    """
+    parts = []
+    start = time.perf_counter()
+    async for part in iter_answer_tokens(question, context, timer, history):
+        parts.append(part)
+        yield part
+    if not history:
+        answer_cache.store(query_emb, chunks, "".join(parts), chunk_sources(chunks), time.perf_counter() - start)
+
+
+def join_or_start_flight(question: str, query_emb, chunks, timer: RequestTimer, history=()):
+    """
+    Join the generation already running for this normalized question,
+    retrieval result and session history, or queue a new one. Returns
+    (flight, shared). Raises QueueFullError when a new generation cannot
+    be queued.
+    """
+    key = (normalize_question(question), chunk_fingerprint(chunks), history_fingerprint(history))
+    flight = single_flight.get(key)
+    if flight is not None:
+        return flight, True
+    context = build_timed_context(chunks, timer)
+    ticket = llm_limiter.enqueue()
+    parts = generate_parts(question, context, query_emb, chunks, timer, history)
+    return single_flight.start(key, ticket, parts), False
+
+
+def record_flight_cancelled(flight):
+    """
+    Metrics for a generation cancelled because its last subscriber left.
+    """
+    if flight.generation_started is None:
+        LLM_CANCELLED.inc(endpoint="chat_stream", phase="queue")
+        return
+    LLM_CANCELLED.inc(endpoint="chat_stream", phase="generate")
+    seconds = time.perf_counter() - flight.generation_started
+    LLM_CANCEL_SAVED_SECONDS.inc(estimate_saved_seconds(len(flight.parts), seconds), endpoint="chat_stream")
+
+
+def replay_answer(answer: str):
+    """
+    Replay a finished (cached) answer as SSE events, word by word, so the
+    frontend renders it the same way as a live stream.
+    """
+    words = answer.split(" ")
+    for i, word in enumerate(words):
+        yield sse_event(word if i == len(words) - 1 else word + " ")
+
+
+async def answer_batch_item(index: int, question: str, query_emb, chunks, semaphore: asyncio.Semaphore) -> dict:
+    """
+    One question of answer_batch(), from its retrieved chunks on.
+    """
+    timer = start_request("chat_batch")
+    outcome = "error"
+    item = {"index": index, "question": question}
+    waited = 0.0  # behind other questions of the batch, not counted in "seconds"
+    try:
+        if not question.strip():
+            item["error"] = "Empty question."
+            return item
+        if not chunks:
+            outcome = "no_chunks"
+            item.update(answer="No HR policies are indexed yet. Please contact the administrator.", sources=[])
+            return item
+        chunks = select_relevant(chunks, timer)
+        if not chunks:
+            outcome = "off_topic"
+            item.update(answer=OFF_TOPIC_ANSWER, sources=[])
+            return item
+        item["sources"] = chunk_sources(chunks)
+
+        cached = answer_cache.lookup(query_emb, chunks)
+        if cached is not None:
+            outcome = "answer_cache"
+            item["answer"] = cached["answer"]
+            return item
+
+        start = time.perf_counter()
+        async with semaphore:
+            waited = time.perf_counter() - start
+            flight, shared = join_or_start_flight(question, query_emb, chunks, timer)
+            try:
+                queued = time.perf_counter()
+                await asyncio.wait({flight.ticket.granted})
+                timer.add("queue", time.perf_counter() - queued)
+                item["answer"] = await flight.result()
+            finally:
+                flight.leave()
+        outcome = "shared" if shared else "llm"
+        return item
+    except asyncio.CancelledError:
+        outcome = "disconnected"
+        raise
+    except QueueFullError as exc:
+        outcome = "rejected"
+        item["error"] = f"Too many questions in progress ({exc})."
+    except NoHealthyHostError as exc:
+        outcome = "llm_unavailable"
+        item["error"] = f"No language model host is available ({exc})."
+    except Exception as exc:
+        item["error"] = f"{exc.__class__.__name__}: {exc}"
+    finally:
+        item["outcome"] = outcome
+        item["seconds"] = round(timer.elapsed() - waited, 3)
+        finish_request(timer, outcome)
+    item.pop("sources", None)
+    return item
+
+
+async def answer_batch(questions: list[str], area: str = None, concurrency: int = CHAT_BATCH_CONCURRENCY,
+                       top_k: int = 3):
+    """
+    Answer many questions the way /chat does, for bulk evaluation and
+    internal tools. Async generator of one dict per question, in completion
+    order: {"index", "question", "outcome", "answer", "sources", "seconds"},
+    with "error" instead of "answer" and "sources" when that question
+    failed. Retrieval is one batched encode and one multi-query search for
+    all questions; at most concurrency generations run at once. A repeated
+    (normalized) question is answered once and then yielded again with
+    outcome "duplicate" and "duplicate_of" the index it copies. Precomputed
+    answers are not used, so an evaluation measures the live pipeline.
+    Closing the generator early cancels the unanswered questions.
+    """
+    if engine_ready is not None:
+        await wait_for_engine()
+    loop = asyncio.get_running_loop()
+    try:
+        embeddings, chunk_lists = await loop.run_in_executor(embed_executor, retrieve_batch, questions, top_k, area)
+    except Exception as exc:
+        for index, question in enumerate(questions):
+            yield {"index": index, "question": question, "outcome": "error", "error": f"Retrieval failed ({exc!r})."}
+        return
+
+    # a repeated question is answered once and the result copied to the others
+    duplicates = {}  # index of the first occurrence -> indexes of the repeats
+    first_index = {}
+    for index, question in enumerate(questions):
+        first = first_index.setdefault(normalize_question(question), index)
+        if first != index:
+            duplicates.setdefault(first, []).append(index)
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    tasks = [
+        asyncio.ensure_future(answer_batch_item(index, question, embedding, chunks, semaphore))
+        for index, (question, embedding, chunks) in enumerate(zip(questions, embeddings, chunk_lists))
+        if first_index[normalize_question(question)] == index
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            item = await next_done
+            yield item
+            for index in duplicates.get(item["index"], ()):
+                yield {**item, "index": index, "question": questions[index], "outcome": "duplicate",
+                       "duplicate_of": item["index"], "seconds": 0.0}
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def queue_full_error(exc: QueueFullError) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=f"Too many questions in progress, please retry shortly ({exc}).",
+        headers={"Retry-After": "2"},
     )
 
-    for chunk in stream:
-        part = chunk["message"]["content"]
-        if not part:
-            continue
-        # SSE format: each "event" is prefixed by 'data: ' and ends with double newline
-        yield f"data: {part}\n\n"
+
+# ---------- health checks ----------
+@app.get("/health")
+def health():
+    return {
+        **engine.health(),
+        "llm": llm_limiter.stats(),
+        "embedding_batcher": embedding_batcher.stats() if embedding_batcher else None,
+        "single_flight": single_flight.stats(),
+        "llm_hosts": llm_backend.stats(),
+        "warmup": warmup_status,
+        "relevance": relevance_summary(),
+        "index_watcher": index_watcher.stats(),
+        "precomputed_answers": precomputed_answers.stats(),
+        "sessions": sessions.stats(),
+    }
+
+
+@app.get("/ready")
+def ready():
+    if warmup_status["state"] != "done":
+        return JSONResponse(
+            {"ready": False, "reason": f"warm-up {warmup_status['state']}", "chunks": 0, "warmup": warmup_status},
+            status_code=503,
+        )
+    status = engine.readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/metrics")
+def metrics():
+    """
+    Prometheus scrape endpoint.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache-stats")
+def cache_stats():
+    return {
+        "embedding_cache": engine.embedding_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "precomputed_answers": precomputed_answers.stats(),
+    }
+
+
+# ---------- sessions ----------
+@app.get("/sessions/{session_id}")
+def session_info(session_id: str):
+    session = sessions.get(session_id, create=False)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session.")
+    return session.stats()
+
+
+@app.delete("/sessions/{session_id}")
+def end_session(session_id: str):
+    """
+    Forget a conversation; the next request with this ID starts a new one.
+    """
+    return {"deleted": sessions.delete(session_id)}
 
 
 # ---------- plain JSON endpoint ----------
 @app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
-    collection = get_collection()
-    chunks = retrieve_chunks(collection, req.question, top_k=3)
-
-    if not chunks:
-        return ChatResponse(
-            answer="No HR policies are indexed yet. Please contact the administrator.",
-            sources=[],
-        )
+async def chat(req: ChatRequest, response: Response):
+    timer = start_request("chat")
+    outcome = "error"
+    try:
+        session, history = open_session(req)
+        precomputed = precomputed_answer(req, history)
+        if precomputed is not None:
+            outcome = "precomputed"
+            remember_turn(session, req.question, precomputed["answer"])
+            sources = [SourceInfo(**src) for src in precomputed["sources"]]
+            return ChatResponse(answer=precomputed["answer"], sources=sources)
 
-    context = build_context(chunks)
-    answer = generate_answer_with_ollama(req.question, context)
+        await wait_for_engine()
+        await check_area(req.area)
+        query = sessions.retrieval_query(session, req.question) if session is not None else req.question
+        query_emb, chunks = await retrieve_shared(query, 3, timer, req.area)
 
-    sources = [
-        SourceInfo(path=c["path"], chunk_index=c["chunk_index"]) for c in chunks
-    ]
+        if not chunks:
+            outcome = "no_chunks"
+            return ChatResponse(
+                answer="No HR policies are indexed yet. Please contact the administrator.",
+                sources=[],
+            )
+
+        chunks = select_relevant(chunks, timer)
+        if not chunks:
+            outcome = "off_topic"
+            remember_turn(session, req.question, OFF_TOPIC_ANSWER)
+            return ChatResponse(answer=OFF_TOPIC_ANSWER, sources=[])
+
+        sources = [SourceInfo(**src) for src in chunk_sources(chunks)]
+
+        # near-duplicate question over the same chunks: skip the LLM
+        cached = answer_cache.lookup(query_emb, chunks) if not history else None
+        if cached is not None:
+            outcome = "answer_cache"
+            remember_turn(session, req.question, cached["answer"])
+            return ChatResponse(answer=cached["answer"], sources=sources)
 
-    return ChatResponse(answer=answer, sources=sources)
+        try:
+            flight, shared = join_or_start_flight(req.question, query_emb, chunks, timer, history)
+        except QueueFullError as exc:
+            outcome = "rejected"
+            raise queue_full_error(exc)
+        try:
+            queued = time.perf_counter()
+            await asyncio.wait({flight.ticket.granted})
+            timer.add("queue", time.perf_counter() - queued)
+            answer = await flight.result()
+        except NoHealthyHostError as exc:
+            outcome = "llm_unavailable"
+            raise HTTPException(status_code=503, detail=f"No language model host is available ({exc}).")
+        finally:
+            flight.leave()
+
+        outcome = "shared" if shared else "llm"
+        remember_turn(session, req.question, answer)
+        return ChatResponse(answer=answer, sources=sources)
+    finally:
+        response.headers["Server-Timing"] = timer.server_timing()
+        finish_request(timer, outcome)
 
 
 # ---------- streaming endpoint for Vite frontend ----------
 @app.post("/chat-stream")
-def chat_stream(req: ChatRequest):
+async def chat_stream(req: ChatRequest, request: Request):
     """
     Streaming endpoint: sends the answer as SSE text chunks.
     Frontend will use parseSSEStream(stream) to consume this.
+
+    While the request waits for a generation slot, 'queue' events with
+    {"position": n} are sent. If the queue is full the request is rejected
+    with 429 before streaming starts.
+
+    Small token deltas are merged into fewer SSE frames, and ': ping'
+    heartbeat comments are sent while nothing else is. When the client
+    disconnects, the Ollama generation is aborted (once no other request
+    shares it).
+
+    Identical questions in flight share one generation: a request that
+    joins late first gets the tokens produced so far, then the live stream.
+
+    Off-topic questions (see select_relevant) get the fallback answer
+    right away, without an LLM call. Questions with a precomputed answer
+    (see precompute_answers.py) are replayed without embedding or retrieval.
+
+    With a session_id the turn is answered with the session's history and
+    added to it once the answer is complete (see chat_sessions.py).
+
+    The Server-Timing header only covers the stages before the stream
+    starts (embed, retrieve, context); ttft and generate go to /metrics.
     """
-    collection = get_collection()
-    chunks = retrieve_chunks(collection, req.question, top_k=3)
+    timer = start_request("chat_stream")
+    try:
+        session, history = open_session(req)
+        precomputed = precomputed_answer(req, history)
+        if precomputed is not None:
+            headers = {"Server-Timing": timer.server_timing()}
+            remember_turn(session, req.question, precomputed["answer"])
+            finish_request(timer, "precomputed")
+            return StreamingResponse(replay_answer(precomputed["answer"]), media_type="text/event-stream",
+                                     headers=headers)
+
+        await wait_for_engine()
+        await check_area(req.area)
+        query = sessions.retrieval_query(session, req.question) if session is not None else req.question
+        query_emb, chunks = await retrieve_shared(query, 3, timer, req.area)
+
+        if not chunks:
+            def fallback():
+                # still SSE format
+                yield "data: No HR policies are indexed yet. Please contact the administrator.\n\n"
+            headers = {"Server-Timing": timer.server_timing()}
+            finish_request(timer, "no_chunks")
+            return StreamingResponse(fallback(), media_type="text/event-stream", headers=headers)
 
-    if not chunks:
-        def fallback():
-            # still SSE format
-            yield "data: No HR policies are indexed yet. Please contact the administrator.\n\n"
-        return StreamingResponse(fallback(), media_type="text/event-stream")
+        chunks = select_relevant(chunks, timer)
+        if not chunks:
+            headers = {"Server-Timing": timer.server_timing()}
+            remember_turn(session, req.question, OFF_TOPIC_ANSWER)
+            finish_request(timer, "off_topic")
+            return StreamingResponse(iter([sse_event(OFF_TOPIC_ANSWER)]), media_type="text/event-stream",
+                                     headers=headers)
 
-    context = build_context(chunks)
+        cached = answer_cache.lookup(query_emb, chunks) if not history else None
+        if cached is not None:
+            headers = {"Server-Timing": timer.server_timing()}
+            remember_turn(session, req.question, cached["answer"])
+            finish_request(timer, "answer_cache")
+            return StreamingResponse(replay_answer(cached["answer"]), media_type="text/event-stream", headers=headers)
 
+        flight, shared = join_or_start_flight(req.question, query_emb, chunks, timer, history)
+    except QueueFullError as exc:
+        finish_request(timer, "rejected")
+        raise queue_full_error(exc)
+    except Exception:
+        # everything before the stream starts: the request is finished here or not at all
+        finish_request(timer, "error")
+        raise
+    headers = {"Server-Timing": timer.server_timing(include_total=False)}
+    left = False
+
+    def leave_flight():
+        nonlocal left
+        if not left:
+            left = True
+            if flight.leave():
+                record_flight_cancelled(flight)
+
+    async def stream_flight():
+        outcome = "disconnected"
+        watcher = DisconnectWatcher(request.receive)
+        relay = None
+        try:
+            # tell the client where it is in the queue until a slot frees up
+            queued = time.perf_counter()
+            while not flight.ticket.granted.done():
+                yield sse_event(json.dumps({"position": flight.ticket.position()}), event="queue")
+                await asyncio.wait(
+                    {flight.ticket.granted, watcher.task},
+                    timeout=QUEUE_EVENT_INTERVAL,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if watcher.disconnected:
+                    return
+            timer.add("queue", time.perf_counter() - queued)
+
+            relay = TokenRelay(flight.stream(), watcher, STREAM_COALESCE_MS, STREAM_COALESCE_CHARS, STREAM_HEARTBEAT_S)
+            async for frame in relay.frames():
+                yield frame
+            if relay.completed:
+                outcome = "shared" if shared else "llm"
+                remember_turn(session, req.question, "".join(flight.parts))
+        except NoHealthyHostError as exc:
+            outcome = "llm_unavailable"
+            yield sse_event(f"No language model host is available ({exc}).", event="error")
+        except GenerationCancelled as exc:
+            outcome = "error"
+            yield sse_event(str(exc), event="error")
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            watcher.close()
+            leave_flight()  # the last subscriber leaving cancels the generation
+            if relay is not None:
+                SSE_PARTS.inc(len(relay.parts))
+                SSE_FRAMES.inc(relay.frames_sent)
+            finish_request(timer, outcome)
+
+    def release():
+        leave_flight()
+        finish_request(timer, "disconnected")
+
+    # the background task also leaves the flight if the stream never started
     return StreamingResponse(
-        stream_answer_with_ollama(req.question, context),
+        stream_flight(),
         media_type="text/event-stream",
-    )
\ No newline at end of file
+        headers=headers,
+        background=BackgroundTask(release),
+    )
+
+
+# ---------- batch endpoint for bulk evaluation and internal tools ----------
+@app.post("/chat-batch")
+async def chat_batch(req: ChatBatchRequest):
+    """
+    Many questions in one request, answered as by /chat (see answer_batch).
+    Streams one JSON line per question (NDJSON) as soon as it is answered,
+    so lines arrive in completion order; "index" is the position in
+    "questions". A failed question gets an "error" field and does not fail
+    the batch.
+    """
+    if not req.questions:
+        raise HTTPException(status_code=400, detail="questions must not be empty.")
+    if len(req.questions) > CHAT_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {CHAT_BATCH_MAX} questions per batch.")
+    await wait_for_engine()
+    await check_area(req.area)
+    concurrency = min(req.concurrency or CHAT_BATCH_CONCURRENCY, CHAT_BATCH_CONCURRENCY)
+
+    async def lines():
+        async for item in answer_batch(req.questions, req.area, concurrency):
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
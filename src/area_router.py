@@ -0,0 +1,115 @@
+from pathlib import Path
+
+import numpy as np
+
+AREA_KEY = "area"  # chunk metadata field written by ingest_md.py
+FORMAT_VERSION = 1
+
+
+def _unit_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+class AreaRouter:
+    """
+    Nearest-centroid router over the policy areas of the index.
+
+    Every area (top-level folder of the policy documents, see
+    ingest_md.policy_area) is represented by the normalized mean of its
+    chunk embeddings. route() scores a question embedding against the
+    centroids and returns the best areas, so the search only has to look
+    at those partitions. Arrays, saved in one .npz file:
+
+    - areas:      area names (newline-joined UTF-8 blob)
+    - centroids:  (n_areas, dim) float32, rows normalized
+    - counts:     chunks per area
+    """
+
+    def __init__(self, areas, centroids, counts):
+        self.areas = list(areas)
+        self.centroids = centroids
+        self.counts = counts
+
+    def __len__(self):
+        return len(self.areas)
+
+    # ---------- construction ----------
+    @classmethod
+    def build(cls, areas, embeddings):
+        """
+        areas[i] is the area of the chunk with embedding embeddings[i].
+        """
+        names = sorted(set(areas))
+        if not names:
+            return cls([], np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.int64))
+        vectors = _unit_rows(np.asarray(embeddings, dtype=np.float32))
+        numbers = {name: i for i, name in enumerate(names)}
+        codes = np.array([numbers[area] for area in areas], dtype=np.int64)
+        sums = np.zeros((len(names), vectors.shape[1]), dtype=np.float32)
+        np.add.at(sums, codes, vectors)
+        return cls(names, _unit_rows(sums), np.bincount(codes, minlength=len(names)))
+
+    @classmethod
+    def from_collection(cls, collection, page_size: int = 1000):
+        """
+        Build the router over every chunk in the Chroma collection. Chunks
+        without an area (ingested before areas were recorded) are ignored.
+        """
+        areas, vectors = [], []
+        total = collection.count()
+        for offset in range(0, total, page_size):
+            page = collection.get(limit=page_size, offset=offset, include=["embeddings", "metadatas"])
+            for meta, embedding in zip(page["metadatas"], page["embeddings"]):
+                area = (meta or {}).get(AREA_KEY)
+                if area is not None:
+                    areas.append(area)
+                    vectors.append(embedding)
+        return cls.build(areas, np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1))
+
+    # ---------- persistence ----------
+    def save(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.stem + ".tmp.npz")
+        np.savez(
+            tmp_path,
+            version=np.array([FORMAT_VERSION]),
+            areas=np.frombuffer("\n".join(self.areas).encode("utf-8"), dtype=np.uint8),
+            centroids=self.centroids,
+            counts=self.counts,
+        )
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path):
+        with np.load(Path(path)) as data:
+            if int(data["version"][0]) != FORMAT_VERSION:
+                raise ValueError(f"{path} has an unsupported area router format, re-run ingest_md.py")
+            names = data["areas"].tobytes().decode("utf-8")
+            return cls(names.split("\n") if names else [], data["centroids"], data["counts"])
+
+    # ---------- routing ----------
+    def scores(self, query_embedding) -> dict:
+        """
+        Cosine similarity of the query to every area centroid.
+        """
+        query = _unit_rows(np.atleast_2d(np.asarray(query_embedding, dtype=np.float32)))[0]
+        return dict(zip(self.areas, (self.centroids @ query).tolist()))
+
+    def route(self, query_embedding, max_areas: int = 2, margin: float = 0.05):
+        """
+        The areas to search for this query, best first: the nearest one plus
+        up to max_areas - 1 more whose similarity is within margin of it.
+        Returns None (search everything) when there is nothing to choose from.
+        """
+        if len(self.areas) < 2 or max_areas <= 0:
+            return None
+        scores = self.scores(query_embedding)
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        best = scores[ranked[0]]
+        return [area for area in ranked[:max_areas] if scores[area] >= best - margin]
+
+    def stats(self) -> dict:
+        return dict(zip(self.areas, map(int, self.counts)))
@@ -0,0 +1,199 @@
+import re
+from pathlib import Path
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i if in is it its me my "
+    "of on or our should that the their there this to was we what when where which who "
+    "will with you your".split()
+)
+FORMAT_VERSION = 1
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lower-cased word tokens without stopwords. No stemming: exact HR terms
+    such as "pto", "dri" or "visa" are what the lexical index is for.
+    """
+    return [t for t in TOKEN_RE.findall(text.casefold()) if t not in STOPWORDS]
+
+
+def _pack_strings(strings) -> np.ndarray:
+    # one UTF-8 blob instead of a fixed-width unicode array (4 bytes x longest string per entry)
+    return np.frombuffer("\n".join(strings).encode("utf-8"), dtype=np.uint8)
+
+
+def _unpack_strings(blob: np.ndarray) -> list[str]:
+    text = blob.tobytes().decode("utf-8")
+    return text.split("\n") if text else []
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the ingested chunks, stored as a compact inverted index.
+
+    The BM25 weight of every (term, chunk) posting is computed at build
+    time, so a query is only a few slice additions into one score vector
+    plus argpartition. Arrays:
+
+    - terms:     sorted vocabulary
+    - offsets:   postings of terms[i] are postings[offsets[i]:offsets[i + 1]]
+    - postings:  chunk numbers (uint32)
+    - weights:   precomputed BM25 weights (float16)
+    - ids:       chunk IDs, in chunk-number order
+    - areas:     policy area names; area_codes[chunk number] indexes into them
+
+    ids, terms and areas are saved as newline-joined UTF-8 blobs in one .npz
+    file. Indexes saved before areas were recorded load with areas None.
+    """
+
+    def __init__(self, ids, terms, offsets, postings, weights, areas=None, area_codes=None):
+        self.ids = list(ids)
+        self.terms = list(terms)
+        self.offsets = offsets
+        self.postings = postings
+        self.weights = weights
+        self.areas = list(areas) if areas is not None else None
+        self.area_codes = area_codes
+        self._term_index = {term: i for i, term in enumerate(self.terms)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ---------- construction ----------
+    @classmethod
+    def build(cls, ids, texts, k1: float = 1.2, b: float = 0.75, areas=None):
+        docs = [tokenize(text) for text in texts]
+        n = len(docs)
+        lengths = np.array([len(d) for d in docs], dtype=np.float32)
+        avg_length = float(lengths.mean()) if n else 0.0
+
+        # term -> {chunk number: term frequency}
+        frequencies = {}
+        for doc_number, tokens in enumerate(docs):
+            for token in tokens:
+                counts = frequencies.setdefault(token, {})
+                counts[doc_number] = counts.get(doc_number, 0) + 1
+
+        terms = sorted(frequencies)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        postings, weights = [], []
+        for i, term in enumerate(terms):
+            counts = frequencies[term]
+            doc_numbers = np.fromiter(counts.keys(), dtype=np.uint32, count=len(counts))
+            tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+            idf = np.log(1 + (n - len(counts) + 0.5) / (len(counts) + 0.5))
+            norm = k1 * (1 - b + b * lengths[doc_numbers] / avg_length)
+            postings.append(doc_numbers)
+            weights.append(idf * tf * (k1 + 1) / (tf + norm))
+            offsets[i + 1] = offsets[i] + len(counts)
+
+        area_names = area_codes = None
+        if areas is not None:
+            area_names = sorted(set(areas))
+            numbers = {area: i for i, area in enumerate(area_names)}
+            area_codes = np.array([numbers[area] for area in areas], dtype=np.uint16)
+
+        return cls(
+            ids,
+            terms,
+            offsets,
+            np.concatenate(postings) if postings else np.zeros(0, dtype=np.uint32),
+            np.concatenate(weights).astype(np.float16) if weights else np.zeros(0, dtype=np.float16),
+            area_names,
+            area_codes,
+        )
+
+    @classmethod
+    def from_collection(cls, collection, page_size: int = 1000):
+        """
+        Build the index over every chunk in the Chroma collection; the heading
+        breadcrumb is indexed together with the chunk text, and the policy
+        area of every chunk is recorded for area-filtered searches.
+        """
+        ids, texts, areas = [], [], []
+        total = collection.count()
+        for offset in range(0, total, page_size):
+            page = collection.get(limit=page_size, offset=offset, include=["documents", "metadatas"])
+            for chunk_id, doc, meta in zip(page["ids"], page["documents"], page["metadatas"]):
+                ids.append(chunk_id)
+                texts.append(f"{(meta or {}).get('headings', '')}\n{doc}")
+                areas.append(str((meta or {}).get("area", "")))
+        return cls.build(ids, texts, areas=areas)
+
+    # ---------- persistence ----------
+    def save(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.stem + ".tmp.npz")
+        np.savez(
+            tmp_path,
+            version=np.array([FORMAT_VERSION]),
+            ids=_pack_strings(self.ids),
+            terms=_pack_strings(self.terms),
+            offsets=self.offsets,
+            postings=self.postings,
+            weights=self.weights,
+            areas=_pack_strings(self.areas or []),
+            area_codes=self.area_codes if self.area_codes is not None else np.zeros(0, dtype=np.uint16),
+        )
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path):
+        with np.load(Path(path)) as data:
+            if int(data["version"][0]) != FORMAT_VERSION:
+                raise ValueError(f"{path} has an unsupported BM25 index format, re-run ingest_md.py")
+            has_areas = "area_codes" in data.files and len(data["area_codes"]) > 0
+            return cls(
+                _unpack_strings(data["ids"]),
+                _unpack_strings(data["terms"]),
+                data["offsets"],
+                data["postings"],
+                data["weights"],
+                _unpack_strings(data["areas"]) if has_areas else None,
+                data["area_codes"] if has_areas else None,
+            )
+
+    # ---------- queries ----------
+    def search(self, query: str, top_k: int = 10, areas=None):
+        """
+        Return [(chunk_id, score), ...] for the top_k chunks, best first.
+        Chunks without any query term are never returned. With areas, only
+        chunks of those areas are returned (ignored by indexes without areas).
+        """
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        matched = False
+        for term in set(tokenize(query)):
+            i = self._term_index.get(term)
+            if i is None:
+                continue
+            start, end = self.offsets[i], self.offsets[i + 1]
+            scores[self.postings[start:end]] += self.weights[start:end]
+            matched = True
+        if not matched:
+            return []
+        if areas is not None and self.area_codes is not None:
+            wanted = [i for i, area in enumerate(self.areas) if area in areas]
+            scores[~np.isin(self.area_codes, wanted)] = 0
+        if not scores.any():
+            return []
+
+        k = min(top_k, int(np.count_nonzero(scores)))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top])][:k]
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60):
+    """
+    Fuse several ranked ID lists: score(id) = sum of 1 / (k + rank).
+    Returns the IDs ordered by fused score.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,209 @@
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+
+from context_packer import get_token_counter
+
+SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_.:-]{1,128}$")
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation below between an employee and an HR assistant in at most {words} words. "
+    "Keep the topics, policies, names, numbers and dates that were discussed; leave out greetings."
+)
+
+
+class ChatSession:
+    """
+    One conversation: a rolling summary of the folded (oldest) turns and the
+    turns after it, each {"question", "answer", "tokens"}.
+    """
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.summary = ""
+        self.summarized_turns = 0
+        self.turns = []
+        self.folding = False  # a summary of the oldest turns is being written
+        self.created_at = time.time()
+        self.used_at = time.monotonic()
+
+    @property
+    def history_tokens(self) -> int:
+        return sum(turn["tokens"] for turn in self.turns)
+
+    def stats(self) -> dict:
+        return {
+            "session_id": self.id,
+            "turns": self.summarized_turns + len(self.turns),
+            "history_turns": len(self.turns),
+            "history_tokens": self.history_tokens,
+            "summarized_turns": self.summarized_turns,
+            "summary_tokens": get_token_counter().count(self.summary) if self.summary else 0,
+            "folding": self.folding,
+        }
+
+
+class SessionStore:
+    """
+    Server-side conversation state for /chat and /chat-stream.
+
+    history() returns the messages that go between the system prompt and
+    the new question: the rolling summary (if any), then the recent turns
+    as plain user/assistant pairs without their retrieved context. Turns
+    are only ever appended, and the summary only changes when turns are
+    folded into it, so consecutive prompts of a session share a
+    byte-identical prefix up to the previous question (whose prompt also
+    held its context) that Ollama can keep in its KV cache.
+
+    record() adds a finished turn. When the recent turns exceed
+    history_tokens, it returns the oldest ones to fold: enough that about
+    half the budget is left, so the prefix breaks once every few turns
+    rather than on every turn. The caller summarizes them (usually with
+    the LLM, in the background) and calls fold(). history_tokens 0 keeps
+    every turn.
+
+    Bounded LRU of max_sessions sessions, idle ones expire after
+    ttl_seconds (0 = never). Must be used from one thread (the event loop).
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: float = 3600, history_tokens: int = 1024,
+                 summary_tokens: int = 200):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self._sessions = OrderedDict()  # session id -> ChatSession
+        self.created = 0
+        self.expired = 0
+        self.folds = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, session_id: str, create: bool = True):
+        """
+        The session with this ID, or a new one (None if create is False).
+        """
+        self._drop_expired()
+        session = self._sessions.get(session_id)
+        if session is None:
+            if not create:
+                return None
+            session = self._sessions[session_id] = ChatSession(session_id)
+            self.created += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session_id)
+        session.used_at = time.monotonic()
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def history(self, session: ChatSession) -> list[dict]:
+        messages = []
+        if session.summary:
+            messages.append({"role": "system", "content": SUMMARY_PREFIX + session.summary})
+        for turn in session.turns:
+            messages.append({"role": "user", "content": turn["question"]})
+            messages.append({"role": "assistant", "content": turn["answer"]})
+        return messages
+
+    def retrieval_query(self, session: ChatSession, question: str) -> str:
+        """
+        Text to retrieve chunks for. A follow-up ("and for contractors?")
+        says little on its own, so the previous question is prepended.
+        """
+        if not session.turns:
+            return question
+        return f"{session.turns[-1]['question']} {question}"
+
+    def record(self, session: ChatSession, question: str, answer: str):
+        """
+        Append a finished turn. Returns the turns to fold into the summary,
+        or None.
+        """
+        counter = get_token_counter()
+        session.turns.append({
+            "question": question,
+            "answer": answer,
+            "tokens": counter.count(question) + counter.count(answer),
+        })
+        if not self.history_tokens or session.folding or session.history_tokens <= self.history_tokens:
+            return None
+        keep, count = session.history_tokens, 0
+        # always keep the newest turn, the follow-up most likely refers to it
+        while count < len(session.turns) - 1 and keep > self.history_tokens // 2:
+            keep -= session.turns[count]["tokens"]
+            count += 1
+        if not count:
+            return None
+        session.folding = True
+        return session.turns[:count]
+
+    def fold(self, session: ChatSession, turns: list[dict], summary: str):
+        """
+        Replace turns (as returned by record()) with the new summary.
+        """
+        session.summary = get_token_counter().truncate(summary.strip(), self.summary_tokens)
+        del session.turns[:len(turns)]
+        session.summarized_turns += len(turns)
+        session.folding = False
+        self.folds += 1
+
+    def _drop_expired(self):
+        if not self.ttl_seconds:
+            return
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.used_at >= cutoff:
+                break
+            self._sessions.popitem(last=False)
+            self.expired += 1
+
+    def stats(self) -> dict:
+        self._drop_expired()
+        return {
+            "sessions": len(self._sessions),
+            "created": self.created,
+            "expired": self.expired,
+            "folds": self.folds,
+            "history_tokens": self.history_tokens,
+            "summary_tokens": self.summary_tokens,
+        }
+
+
+def history_fingerprint(messages) -> str:
+    """
+    Fingerprint of history messages, so identical questions only share a
+    generation when their conversations match too.
+    """
+    return hashlib.sha256(json.dumps(messages, ensure_ascii=False).encode("utf-8")).hexdigest() if messages else ""
+
+
+def summary_messages(previous_summary: str, turns, max_tokens: int) -> list[dict]:
+    """
+    Chat messages that ask the LLM for a new rolling summary: the previous
+    summary followed by the turns being folded into it.
+    """
+    lines = [f"Earlier summary: {previous_summary}"] if previous_summary else []
+    for turn in turns:
+        lines.append(f"Employee: {turn['question']}")
+        lines.append(f"HR assistant: {turn['answer']}")
+    instructions = SUMMARY_INSTRUCTIONS.format(words=max(20, max_tokens * 3 // 4))
+    return [{"role": "system", "content": instructions}, {"role": "user", "content": "\n".join(lines)}]
+
+
+def extractive_summary(previous_summary: str, turns) -> str:
+    """
+    Summary without the LLM (used when it is unavailable): the questions
+    that were asked, followed by the previous summary, so that trimming it
+    to the token budget drops the oldest part.
+    """
+    asked = "; ".join(turn["question"].strip().rstrip("?") for turn in turns)
+    if not previous_summary:
+        return f"The employee asked: {asked}."
+    return f"The employee asked: {asked}. Before that: {previous_summary}"
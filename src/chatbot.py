@@ -1,10 +1,32 @@
-import ollama
+from chat_sessions import SessionStore, extractive_summary, summary_messages
 
 MODEL_NAME = "phi3:mini"  # change this if you use another model
-history = []  # keep chat history so the model has context
+HISTORY_TOKENS = 1024     # recent turns sent with every message; older ones are folded into a summary
+SUMMARY_TOKENS = 200
+
+# keep chat history so the model has context, bounded so prompts stop growing
+sessions = SessionStore(max_sessions=1, ttl_seconds=0, history_tokens=HISTORY_TOKENS, summary_tokens=SUMMARY_TOKENS)
+history = sessions.get("terminal")
+
+
+def summarize(turns) -> str:
+    import ollama
+
+    try:
+        response = ollama.chat(
+            model=MODEL_NAME,
+            messages=summary_messages(history.summary, turns, SUMMARY_TOKENS),
+            options={"num_predict": SUMMARY_TOKENS},
+        )
+        return response["message"]["content"]
+    except Exception:
+        return extractive_summary(history.summary, turns)
 
 
 def main():
+    # imported here rather than at the top, so importing this module stays cheap
+    import ollama
+
     print("Local LLm chat (Ollama). Type 'exit' or 'quit' to stop.\n")
 
     while True:
@@ -17,22 +39,24 @@ def main():
             print("Bot: Have a nice day!")
             break
 
-        # 1) Add user message to history
-        history.append({"role": "user", "content": user_input})
+        # 1) Summary and recent turns, then the new message
+        messages = sessions.history(history) + [{"role": "user", "content": user_input}]
 
         # 2) Call Ollama chat
         response = ollama.chat(
             model=MODEL_NAME,
-            messages=history,
+            messages=messages,
         )
 
         # depending on the ollama client, response is a dict
         bot_text = response["message"]["content"]
         print(f"Bot: {bot_text}\n")
 
-        # 3) Add bot answer to history
-        history.append({"role": "assistant", "content": bot_text})
+        # 3) Add the turn to history, summarizing the oldest turns once it is over budget
+        turns = sessions.record(history, user_input, bot_text)
+        if turns:
+            sessions.fold(history, turns, summarize(turns))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,309 @@
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from area_router import AREA_KEY
+
+FORMAT_VERSION = 1
+STORE_DTYPES = ("float32", "float16", "int8")
+SEARCH_BLOCK_ROWS = 8192  # rows dequantized at a time while scoring
+_MISSING = np.iinfo(np.uint32).max  # metadata code of a key the chunk does not have
+
+
+class StringTable:
+    """
+    Strings packed into one UTF-8 blob plus an offsets array; string i is
+    blob[offsets[i]:offsets[i + 1]]. Both arrays may be memory-mapped, so
+    a string is only decoded when it is read.
+    """
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    @staticmethod
+    def pack(strings):
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+    def save(self, path: Path, name: str):
+        np.save(path / f"{name}.npy", self.blob)
+        np.save(path / f"{name}.offsets.npy", self.offsets)
+
+    @classmethod
+    def load(cls, path: Path, name: str, mmap_mode="r"):
+        return cls(np.load(path / f"{name}.npy", mmap_mode=mmap_mode),
+                   np.load(path / f"{name}.offsets.npy", mmap_mode=mmap_mode))
+
+    @property
+    def nbytes(self) -> int:
+        return self.blob.nbytes + self.offsets.nbytes
+
+
+class ChunkStore:
+    """
+    Read-only chunk store written by ingest_md.py next to the Chroma index,
+    with everything a query needs: vectors, texts and metadata.
+
+    The store is a directory of .npy files that are opened memory-mapped,
+    so opening it takes milliseconds and several processes share one copy
+    through the page cache:
+
+    - store.json:          format version, dtype, count, dim, metadata keys
+    - vectors.npy:         (n, dim) L2-normalized vectors as float32, float16,
+                           or int8 with a per-row scale (scales.npy)
+    - ids / texts:         StringTable (UTF-8 blob + offsets) per field
+    - meta_codes.npy:      (n, n_keys) uint32 codes into meta_values
+    - meta_values:         StringTable of the distinct JSON-encoded metadata
+                           values; repeated values (source file) are stored once
+
+    Rows are ordered by policy area, so each area is one contiguous block
+    of rows. Search is exact: the query is scored against every row (or
+    only the blocks of the requested areas), dequantizing SEARCH_BLOCK_ROWS
+    rows at a time. Same query()/get() contract as the stores in
+    vector_store.py.
+    """
+
+    name = "quantized"
+
+    def __init__(self, path: Path, header: dict, vectors, scales, ids: StringTable, texts: StringTable,
+                 meta_codes, meta_values: StringTable):
+        self.path = Path(path)
+        self.dtype = header["dtype"]
+        self.metadata_keys = header["metadata_keys"]
+        self.vectors = vectors
+        self.scales = scales
+        self.ids = ids
+        self.texts = texts
+        self.meta_codes = meta_codes
+        self.meta_values = meta_values
+        self._positions = None  # id -> row, built on the first get()
+        self._area_ranges = None  # area -> [(start, stop), ...], built on the first filtered search
+
+    # ---------- construction ----------
+    @staticmethod
+    def quantize(embeddings, dtype: str):
+        """
+        Normalize the rows and convert them to dtype. Returns (vectors,
+        scales); scales is None unless dtype is int8 (symmetric per-row
+        scaling, row = vectors[i] * scales[i]).
+        """
+        if dtype not in STORE_DTYPES:
+            raise ValueError(f"Unknown chunk store dtype: {dtype!r} (expected one of {', '.join(STORE_DTYPES)})")
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = matrix / norms
+        if dtype != "int8":
+            return matrix.astype(dtype), None
+        scales = np.abs(matrix).max(axis=1) / 127
+        scales[scales == 0] = 1.0
+        vectors = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+        return vectors, scales.astype(np.float32)
+
+    @classmethod
+    def write(cls, path: Path, ids, documents, metadatas, embeddings, dtype: str = "float16"):
+        """
+        Write a store to path and return it opened. The files are written to
+        a temporary directory that then replaces path, so readers never see
+        a half-written store (processes that still map the old files keep
+        reading them until they reopen).
+        """
+        path = Path(path)
+        metadatas = [m or {} for m in metadatas]
+        # group the rows of each area (stable, so the order within an area is kept)
+        order = sorted(range(len(ids)), key=lambda i: str(metadatas[i].get(AREA_KEY, "")))
+        ids = [ids[i] for i in order]
+        documents = [documents[i] for i in order]
+        metadatas = [metadatas[i] for i in order]
+        vectors, scales = cls.quantize(np.asarray(embeddings)[order] if order else embeddings, dtype)
+        keys = sorted({key for meta in metadatas for key in meta})
+
+        values, codes = {}, np.full((len(metadatas), len(keys)), _MISSING, dtype=np.uint32)
+        for row, meta in enumerate(metadatas):
+            for col, key in enumerate(keys):
+                if key in meta:
+                    encoded = json.dumps(meta[key], ensure_ascii=False)
+                    codes[row, col] = values.setdefault(encoded, len(values))
+
+        tmp_path = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir(parents=True)
+        np.save(tmp_path / "vectors.npy", vectors)
+        if scales is not None:
+            np.save(tmp_path / "scales.npy", scales)
+        np.save(tmp_path / "meta_codes.npy", codes)
+        StringTable(*StringTable.pack(ids)).save(tmp_path, "ids")
+        StringTable(*StringTable.pack(documents)).save(tmp_path, "texts")
+        StringTable(*StringTable.pack(values)).save(tmp_path, "meta_values")
+        header = {
+            "version": FORMAT_VERSION,
+            "dtype": dtype,
+            "count": len(ids),
+            "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+            "metadata_keys": keys,
+        }
+        (tmp_path / "store.json").write_text(json.dumps(header, indent=2), encoding="utf-8")
+
+        old_path = path.with_name(path.name + ".old")
+        shutil.rmtree(old_path, ignore_errors=True)
+        if path.exists():
+            path.rename(old_path)
+        tmp_path.rename(path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        return cls.open(path)
+
+    @classmethod
+    def from_collection(cls, collection, path: Path, dtype: str = "float16", page_size: int = 1000):
+        """
+        Export every chunk of the Chroma collection into a store at path.
+        """
+        ids, documents, metadatas, vectors = [], [], [], []
+        total = collection.count()
+        for offset in range(0, total, page_size):
+            page = collection.get(limit=page_size, offset=offset,
+                                  include=["embeddings", "documents", "metadatas"])
+            ids.extend(page["ids"])
+            documents.extend(page["documents"])
+            metadatas.extend(page["metadatas"])
+            vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+        embeddings = np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+        return cls.write(path, ids, documents, metadatas, embeddings, dtype)
+
+    @classmethod
+    def open(cls, path: Path):
+        path = Path(path)
+        if not (path / "store.json").exists():
+            raise FileNotFoundError(f"No chunk store at {path} (run ingest_md.py)")
+        header = json.loads((path / "store.json").read_text(encoding="utf-8"))
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Chunk store {path} has format {header.get('version')}, expected {FORMAT_VERSION}")
+        scales = np.load(path / "scales.npy", mmap_mode="r") if header["dtype"] == "int8" else None
+        return cls(
+            path,
+            header,
+            np.load(path / "vectors.npy", mmap_mode="r"),
+            scales,
+            StringTable.load(path, "ids"),
+            StringTable.load(path, "texts"),
+            np.load(path / "meta_codes.npy", mmap_mode="r"),
+            StringTable.load(path, "meta_values"),
+        )
+
+    # ---------- reading ----------
+    def count(self) -> int:
+        return len(self.ids)
+
+    def metadata(self, row: int) -> dict:
+        return {
+            key: json.loads(self.meta_values[code])
+            for key, code in zip(self.metadata_keys, self.meta_codes[row].tolist())
+            if code != _MISSING
+        }
+
+    def hit(self, row: int, score=None) -> dict:
+        return {"id": self.ids[row], "content": self.texts[row], "metadata": self.metadata(row), "score": score}
+
+    def dequantize(self, start: int = 0, stop: int = None):
+        """
+        Rows start:stop as float32.
+        """
+        block = np.asarray(self.vectors[start:stop], dtype=np.float32)
+        if self.scales is not None:
+            block *= self.scales[start:stop, None]
+        return block
+
+    def stats(self) -> dict:
+        return {
+            "path": str(self.path),
+            "dtype": self.dtype,
+            "count": self.count(),
+            "dim": int(self.vectors.shape[1]) if self.vectors.ndim == 2 else 0,
+            "bytes": {
+                "vectors": self.vectors.nbytes + (self.scales.nbytes if self.scales is not None else 0),
+                "ids": self.ids.nbytes,
+                "texts": self.texts.nbytes,
+                "metadata": self.meta_codes.nbytes + self.meta_values.nbytes,
+            },
+        }
+
+    # ---------- queries ----------
+    def ranges_in(self, areas):
+        """
+        (start, stop) row ranges of the chunks in the given areas; one range
+        per area for stores written in area order.
+        """
+        if self._area_ranges is None:
+            ranges = {}
+            if AREA_KEY in self.metadata_keys and self.count():
+                codes = np.asarray(self.meta_codes[:, self.metadata_keys.index(AREA_KEY)])
+                edges = np.flatnonzero(np.diff(codes)) + 1
+                for start, stop in zip(np.r_[0, edges].tolist(), np.r_[edges, len(codes)].tolist()):
+                    if codes[start] != _MISSING:
+                        area = json.loads(self.meta_values[int(codes[start])])
+                        ranges.setdefault(area, []).append((start, stop))
+            self._area_ranges = ranges
+        return sorted(r for area in set(areas) for r in self._area_ranges.get(area, []))
+
+    def search(self, query_embeddings, top_k: int = 3, areas=None):
+        """
+        Return (indices, scores), both of shape (n_queries, k), best first.
+        scores are cosine similarities against the quantized vectors. With
+        areas, only the rows of those areas are scored.
+        """
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries = queries / norms
+
+        ranges = [(0, self.count())] if areas is None else self.ranges_in(areas)
+        n = sum(stop - start for start, stop in ranges)
+        k = min(top_k, n)
+        if k == 0:
+            empty = np.zeros((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+
+        scores = np.empty((len(queries), n), dtype=np.float32)
+        rows = np.empty(n, dtype=np.int64)  # score column -> row number
+        column = 0
+        for range_start, range_stop in ranges:
+            for start in range(range_start, range_stop, SEARCH_BLOCK_ROWS):
+                stop = min(start + SEARCH_BLOCK_ROWS, range_stop)
+                scores[:, column:column + stop - start] = queries @ self.dequantize(start, stop).T
+                rows[column:column + stop - start] = np.arange(start, stop)
+                column += stop - start
+        if k < n:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(n), (len(queries), n))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return rows[np.take_along_axis(top, order, axis=1)], np.take_along_axis(top_scores, order, axis=1)
+
+    def query(self, query_embeddings, top_k: int = 3, areas=None):
+        """
+        Same contract as ChromaVectorStore.query().
+        """
+        indices, scores = self.search(query_embeddings, top_k, areas)
+        return [
+            [self.hit(i, round(score, 6)) for i, score in zip(row, score_row)]
+            for row, score_row in zip(indices.tolist(), scores.tolist())
+        ]
+
+    def get(self, ids):
+        """
+        Same contract as ChromaVectorStore.get().
+        """
+        if self._positions is None:
+            self._positions = {self.ids[i]: i for i in range(self.count())}
+        return [self.hit(i) for i in (self._positions.get(doc_id) for doc_id in ids) if i is not None]
@@ -0,0 +1,204 @@
+import re
+
+from markdown_chunker import get_token_encoding
+
+WORD_RE = re.compile(r"\w+")
+CHARS_PER_TOKEN = 4       # estimate used when the tiktoken encoding cannot be loaded
+MIN_TRIMMED_TOKENS = 48   # a trimmed passage shorter than this is dropped instead
+MAX_OVERLAP_CHARS = 2000  # longest chunk overlap searched for when merging neighbours
+MIN_OVERLAP_CHARS = 20    # shorter matches are coincidences (a "|", a fence), not carried overlap
+
+
+class TokenCounter:
+    """
+    Counts and truncates text in cl100k_base tokens (tiktoken). phi3 uses
+    its own tokenizer, so the counts are an estimate of the prompt size, but
+    a stable one. If the encoding is not available (tiktoken downloads it
+    on first use), falls back to len(text) / 4.
+    """
+
+    def __init__(self):
+        try:
+            self.encoding = get_token_encoding()
+        except Exception as exc:
+            print(f"tiktoken encoding unavailable ({exc.__class__.__name__}), estimating tokens from characters.")
+            self.encoding = None
+
+    def count(self, text: str) -> int:
+        if self.encoding is None:
+            return -(-len(text) // CHARS_PER_TOKEN)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        if self.encoding is None:
+            cut = text[:max_tokens * CHARS_PER_TOKEN]
+        else:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            if len(tokens) <= max_tokens:
+                return text
+            cut = self.encoding.decode(tokens[:max_tokens])
+        if len(cut) >= len(text):
+            return text
+        # end on a whole word
+        return cut[:cut.rfind(" ")].rstrip() if " " in cut else cut
+
+
+_counter = None
+
+
+def get_token_counter() -> TokenCounter:
+    global _counter
+    if _counter is None:
+        _counter = TokenCounter()
+    return _counter
+
+
+def _strip_overlap(previous: str, text: str, overlap_chars: int = None) -> str:
+    """
+    Remove the start of text that repeats the end of previous (the overlap
+    the chunker carries between neighbouring chunks). overlap_chars is the
+    length the chunker recorded; chunks indexed without it fall back to the
+    longest match of at least MIN_OVERLAP_CHARS that starts and ends on a
+    word boundary.
+    """
+    if overlap_chars is not None:
+        if overlap_chars and previous.endswith(text[:overlap_chars]):
+            return text[overlap_chars:].lstrip()
+        return text
+    limit = min(len(previous), len(text), MAX_OVERLAP_CHARS)
+    for size in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+        if not previous.endswith(text[:size]):
+            continue
+        starts_on_word = size == len(previous) or previous[-size - 1].isspace()
+        ends_on_word = size == len(text) or text[size].isspace()
+        if starts_on_word and ends_on_word:
+            return text[size:].lstrip()
+    return text
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = WORD_RE.findall(text.casefold())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _similarity(a: set, b: set) -> float:
+    """
+    Overlap coefficient of two shingle sets: 1.0 when the smaller passage is
+    fully contained in the larger one.
+    """
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def merge_adjacent(chunks):
+    """
+    Merge chunks of the same file with consecutive chunk_index into one
+    passage, dropping the overlapping text between them. A passage takes the
+    rank of its best chunk. Returns [{"path", "chunk_indexes", "content"}].
+    """
+    by_path = {}
+    for rank, ch in enumerate(chunks):
+        by_path.setdefault(ch["path"], []).append((rank, ch))
+
+    passages = []
+    for items in by_path.values():
+        items.sort(key=lambda item: item[1]["chunk_index"])
+        current = None
+        for rank, ch in items:
+            index = ch["chunk_index"]
+            if current is not None and index >= 0 and index == current["chunk_indexes"][-1] + 1:
+                text = _strip_overlap(current["content"], ch["content"], ch.get("overlap_chars"))
+                current["content"] += "\n\n" + text
+                current["chunk_indexes"].append(index)
+                current["rank"] = min(current["rank"], rank)
+                continue
+            current = {"path": ch["path"], "chunk_indexes": [index], "content": ch["content"], "rank": rank}
+            passages.append(current)
+
+    passages.sort(key=lambda p: p["rank"])
+    return passages
+
+
+def drop_near_duplicates(passages, threshold: float = 0.85):
+    """
+    Drop passages whose text is (almost) contained in a better ranked one,
+    e.g. the same paragraph copied into two policy files.
+    """
+    kept, kept_shingles = [], []
+    for passage in passages:
+        shingles = _shingles(passage["content"])
+        if any(_similarity(shingles, other) >= threshold for other in kept_shingles):
+            continue
+        kept.append(passage)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def format_passage(number: int, passage) -> str:
+    indexes = passage["chunk_indexes"]
+    label = f"chunk {indexes[0]}" if len(indexes) == 1 else f"chunks {indexes[0]}-{indexes[-1]}"
+    return f"### Chunk {number}\nSource: {passage['path']} ({label})\n\n{passage['content']}\n"
+
+
+def pack_context(chunks, token_budget: int = 1024, dedupe_threshold: float = 0.85):
+    """
+    Build the prompt context from retrieved chunks (best first):
+
+    1. merge neighbouring chunks of the same file, without their overlap
+    2. drop near-duplicate passages (dedupe_threshold, 0 = off)
+    3. add passages in rank order until token_budget is reached, trimming
+       the last one to fit (token_budget 0 = no limit)
+
+    Returns (context, report); report has tokens_before (the plain
+    concatenation of all chunks), tokens_after, tokens_saved, passages,
+    merged, duplicates_dropped, trimmed and over_budget_dropped.
+    """
+    counter = get_token_counter()
+    raw = [
+        format_passage(i, {"path": ch["path"], "chunk_indexes": [ch["chunk_index"]], "content": ch["content"]})
+        for i, ch in enumerate(chunks, start=1)
+    ]
+    tokens_before = counter.count("\n\n".join(raw))
+
+    passages = merge_adjacent(chunks)
+    merged = len(chunks) - len(passages)
+    if dedupe_threshold > 0:
+        unique = drop_near_duplicates(passages, dedupe_threshold)
+    else:
+        unique = passages
+    duplicates = len(passages) - len(unique)
+
+    parts, used, trimmed = [], 0, 0
+    separator = counter.count("\n\n")
+    for passage in unique:
+        text = format_passage(len(parts) + 1, passage)
+        tokens = counter.count(text) + (separator if parts else 0)
+        if token_budget <= 0 or used + tokens <= token_budget:
+            parts.append(text)
+            used += tokens
+            continue
+        # over budget: keep the head of this passage if a useful part fits, then stop
+        header = format_passage(len(parts) + 1, {**passage, "content": ""})
+        room = token_budget - used - counter.count(header) - (separator if parts else 0)
+        if room >= MIN_TRIMMED_TOKENS:
+            parts.append(format_passage(len(parts) + 1, {**passage, "content": counter.truncate(passage["content"], room)}))
+            trimmed = 1
+        break
+
+    context = "\n\n".join(parts)
+    tokens_after = counter.count(context)
+    return context, {
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": max(0, tokens_before - tokens_after),
+        "passages": len(parts),
+        "merged": merged,
+        "duplicates_dropped": duplicates,
+        "trimmed": trimmed,
+        "over_budget_dropped": len(unique) - len(parts),
+    }
@@ -0,0 +1,81 @@
+import asyncio
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batches query embeddings across concurrent requests.
+
+    Questions that arrive within window_ms of each other (or until
+    max_batch are waiting) are encoded together in one encode() call on
+    the executor, and each vector is routed back to the request waiting
+    for it. Cache hits are answered immediately without waiting for a batch.
+
+    encoder is a CachedEncoder (see embedding_cache.py). All methods must be
+    called from the event loop thread.
+    """
+
+    def __init__(self, encoder, executor, window_ms: float = 5.0, max_batch: int = 32):
+        self.encoder = encoder
+        self.executor = executor
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+
+        self._pending = []      # [(text, future)]
+        self._timer = None
+        self._tasks = set()     # strong references to running encode tasks
+        self.batches = 0
+        self.batched_items = 0
+
+    async def embed(self, text: str) -> list[float]:
+        vector = self.encoder.lookup(text)
+        if vector is not None:
+            return vector
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch or self.window <= 0:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        if self._pending:
+            # more than one batch was waiting: schedule the rest right away
+            self._timer = asyncio.get_running_loop().call_soon(self._flush)
+
+        self.batches += 1
+        self.batched_items += len(batch)
+        task = asyncio.ensure_future(self._encode(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _encode(self, batch):
+        loop = asyncio.get_running_loop()
+        texts = [text for text, _ in batch]
+        try:
+            vectors = await loop.run_in_executor(self.executor, self.encoder.encode_misses, texts)
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():  # the request may have been cancelled meanwhile
+                future.set_result(vector)
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "avg_batch_size": round(self.batched_items / self.batches, 2) if self.batches else 0.0,
+        }
@@ -0,0 +1,163 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    """
+    Cache key for a question: case-folded, whitespace collapsed, trailing
+    punctuation removed. "How many  vacation days?" and
+    "how many vacation days" map to the same key.
+    """
+    return _WHITESPACE_RE.sub(" ", text.casefold()).strip().rstrip("?!. ").strip()
+
+
+class EmbeddingCache:
+    """
+    Bounded, thread-safe LRU cache of query embeddings.
+
+    - max_size: maximum number of entries, the least recently used is evicted
+    - ttl_seconds: entries older than this are treated as missing (0 = no TTL)
+    - path: optional JSON file; load() / save() persist the cache across restarts
+    Hit, miss and eviction counters are available through stats().
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 0, path: Path = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.path = Path(path) if path else None
+
+        self._entries = OrderedDict()  # key -> (created_at, vector)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and now - created_at > self.ttl_seconds
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry[0], time.time()):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, vector: list[float]):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.time(), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    # ---------- persistence ----------
+    def load(self, model_name: str):
+        """
+        Load entries from self.path. Entries written for another embedding
+        model or already past the TTL are ignored.
+        """
+        if self.path is None or not self.path.exists():
+            return 0
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            print(f"Embedding cache {self.path} is unreadable, starting empty.")
+            return 0
+        if data.get("model") != model_name:
+            return 0
+
+        now = time.time()
+        with self._lock:
+            for key, created_at, vector in data.get("entries", []):
+                if not self._expired(created_at, now):
+                    self._entries[key] = (created_at, vector)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return len(self._entries)
+
+    def save(self, model_name: str):
+        if self.path is None:
+            return
+        with self._lock:
+            entries = [[key, created_at, vector] for key, (created_at, vector) in self._entries.items()]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"model": model_name, "entries": entries}), encoding="utf-8")
+        tmp_path.replace(self.path)
+
+
+class CachedEncoder:
+    """
+    Wraps SentenceTransformer.encode with an EmbeddingCache.
+
+    The normalized question is what gets encoded, so every question that
+    maps to the same cache key gets exactly the same vector.
+    """
+
+    def __init__(self, model, cache: EmbeddingCache):
+        self.model = model
+        self.cache = cache
+
+    def encode_one(self, text: str) -> list[float]:
+        return self.encode_many([text])[0]
+
+    def lookup(self, text: str):
+        """
+        Cached vector for text, or None (counted as a miss).
+        """
+        return self.cache.get(normalize_question(text))
+
+    def encode_misses(self, texts: list[str]) -> list[list[float]]:
+        """
+        Encode texts that missed the cache in one batched encode() call and
+        store the results. Duplicates (after normalization) are encoded once.
+        """
+        keys = [normalize_question(t) for t in texts]
+        unique = list(dict.fromkeys(keys))
+        encoded = dict(zip(unique, self.model.encode(unique).tolist())) if unique else {}
+        for key, vec in encoded.items():
+            self.cache.put(key, vec)
+        return [encoded[key] for key in keys]
+
+    def encode_many(self, texts: list[str]) -> list[list[float]]:
+        """
+        Encode several questions; only cache misses reach the model, in one
+        batched encode() call.
+        """
+        vectors = [self.lookup(t) for t in texts]
+        missing = [i for i, vec in enumerate(vectors) if vec is None]
+        if missing:
+            for i, vec in zip(missing, self.encode_misses([texts[i] for i in missing])):
+                vectors[i] = vec
+        return vectors
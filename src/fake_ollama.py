@@ -0,0 +1,168 @@
+"""
+Minimal fake Ollama server for tests and load experiments.
+
+Implements the parts of the Ollama HTTP API the chatbot uses (/api/chat,
+streaming and not, /api/generate, /api/tags and /api/version). Answers are
+canned text emitted at a fixed token rate after a prefill delay, so the
+backend can be load-tested without a GPU or a model download.
+
+The prefill delay is --prefill-ms plus --prefill-ms-per-1k-tokens for every
+1000 prompt tokens (len / 4) that are not shared with one of the last
+--cache-slots prompts (0 = no cache). That mimics Ollama, which keeps the KV cache of
+recent prompts and only evaluates the part after the longest common
+prefix; prompt_eval_count likewise only counts the evaluated tokens. A
+prompt longer than --num-ctx tokens is cut at the front, as Ollama
+truncates it, which shifts the prefix and so defeats the cache.
+
+Usage (from the project root):
+    python src/fake_ollama.py [--port 11435] [--tokens-per-second 30] [--prefill-ms 200]
+                              [--prefill-ms-per-1k-tokens 0] [--cache-slots 4] [--num-ctx 0]
+                              [--answer-tokens 120] [--model phi3:mini] [--error-rate 0]
+
+Point the API at it with LLM_HOSTS=http://127.0.0.1:11435 (comma-separate
+several instances to test load balancing and failover).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANSWER_WORDS = (
+    "According to the HR policies, team members should follow the documented process "
+    "and contact their manager or People Business Partner when in doubt. The relevant "
+    "section explains eligibility, how to submit a request and the expected timeline."
+).split()
+
+
+def create_app(models=("phi3:mini",), tokens_per_second: float = 30.0, prefill_ms: float = 200.0,
+               answer_tokens: int = 120, error_rate: float = 0.0, prefill_ms_per_1k: float = 0.0,
+               cache_slots: int = 4, num_ctx: int = 0) -> FastAPI:
+    app = FastAPI()
+    app.state.requests = 0
+    recent_prompts = deque(maxlen=cache_slots)  # maxlen 0 = no prompt cache
+
+    def now() -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    def tokens():
+        for i in range(answer_tokens):
+            word = ANSWER_WORDS[i % len(ANSWER_WORDS)]
+            yield word if i == 0 else " " + word
+
+    def prefill(prompt: str):
+        """
+        (seconds, evaluated tokens) for a prompt, given the cached ones.
+        """
+        if num_ctx and len(prompt) > num_ctx * 4:
+            prompt = prompt[-num_ctx * 4:]
+        reused = max((len(os.path.commonprefix([prompt, cached])) for cached in recent_prompts), default=0)
+        recent_prompts.append(prompt)
+        evaluated = max(1, (len(prompt) - reused) // 4)
+        return (prefill_ms + prefill_ms_per_1k * evaluated / 1000) / 1000, evaluated
+
+    def final_stats(prefill_seconds: float, evaluated: int, seconds: float) -> dict:
+        return {
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((prefill_seconds + seconds) * 1e9),
+            "load_duration": 0,
+            "prompt_eval_count": evaluated,
+            "prompt_eval_duration": int(prefill_seconds * 1e9),
+            "eval_count": answer_tokens,
+            "eval_duration": int(seconds * 1e9),
+        }
+
+    def check(body):
+        if body.get("model") not in models:
+            return JSONResponse({"error": f"model '{body.get('model')}' not found"}, status_code=404)
+        if error_rate and random.random() < error_rate:
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+        return None
+
+    async def generate(body, prompt: str, wrap):
+        """
+        Yields NDJSON lines; wrap(text) builds the per-token payload.
+        """
+        model = body["model"]
+        prefill_seconds, evaluated = prefill(prompt)
+        await asyncio.sleep(prefill_seconds)
+        start = time.perf_counter()
+        for text in tokens():
+            if tokens_per_second > 0:
+                await asyncio.sleep(1 / tokens_per_second)
+            yield json.dumps({"model": model, "created_at": now(), **wrap(text), "done": False}) + "\n"
+        yield json.dumps({"model": model, "created_at": now(), **wrap(""),
+                          **final_stats(prefill_seconds, evaluated, time.perf_counter() - start)}) + "\n"
+
+    async def respond(body, prompt: str, wrap):
+        app.state.requests += 1
+        if not prompt:
+            # Ollama loads the model (keep-alive) and returns right away for an empty request
+            return JSONResponse({"model": body["model"], "created_at": now(), **wrap(""), "done": True,
+                                 "done_reason": "load"})
+        if body.get("stream", True):
+            return StreamingResponse(generate(body, prompt, wrap), media_type="application/x-ndjson")
+        lines = [json.loads(line) async for line in generate(body, prompt, wrap)]
+        text = "".join(line["message"]["content"] if "message" in line else line["response"] for line in lines[:-1])
+        return JSONResponse({**lines[-1], **wrap(text)})
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        error = check(body)
+        if error is not None:
+            return error
+        # roughly what a chat template renders
+        prompt = "".join(f"<|{m.get('role')}|>{m.get('content', '')}<|end|>" for m in body.get("messages") or [])
+        return await respond(body, prompt, lambda text: {"message": {"role": "assistant", "content": text}})
+
+    @app.post("/api/generate")
+    async def generate_endpoint(request: Request):
+        body = await request.json()
+        error = check(body)
+        if error is not None:
+            return error
+        return await respond(body, body.get("prompt") or "", lambda text: {"response": text})
+
+    @app.get("/api/tags")
+    def tags():
+        return {"models": [{"name": m, "model": m, "size": 0, "digest": "", "details": {}} for m in models]}
+
+    @app.get("/api/version")
+    def version():
+        return {"version": "0.0.0-fake", "requests": app.state.requests}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--model", action="append", help="model name to serve (repeatable, default phi3:mini)")
+    parser.add_argument("--tokens-per-second", type=float, default=30.0, help="0 = as fast as possible")
+    parser.add_argument("--prefill-ms", type=float, default=200.0, help="delay before the first token")
+    parser.add_argument("--prefill-ms-per-1k-tokens", type=float, default=0.0,
+                        help="extra delay per 1000 prompt tokens that are not cached")
+    parser.add_argument("--cache-slots", type=int, default=4, help="recent prompts whose prefix is cached, 0 = none")
+    parser.add_argument("--num-ctx", type=int, default=0, help="context length in tokens, 0 = unlimited")
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with HTTP 500")
+    args = parser.parse_args()
+
+    app = create_app(tuple(args.model or ["phi3:mini"]), args.tokens_per_second, args.prefill_ms,
+                     args.answer_tokens, args.error_rate, args.prefill_ms_per_1k_tokens, args.cache_slots,
+                     args.num_ctx)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+import asyncio
+import fcntl
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+POINTER_NAME = "current_index.json"  # which version readers use, replaced atomically
+VERSIONS_DIR = "versions"            # per-version manifest, BM25 index and chunk store
+
+
+# ---------- layout ----------
+def version_dir(chroma_path: Path, number: int) -> Path:
+    return Path(chroma_path) / VERSIONS_DIR / f"v{number:04d}"
+
+
+def collection_name(base: str, number: int) -> str:
+    return f"{base}-v{number}"
+
+
+def version_paths(chroma_path: Path, number: int) -> dict:
+    """
+    Files that belong to one index version.
+    """
+    directory = version_dir(chroma_path, number)
+    return {
+        "dir": directory,
+        "manifest": directory / "ingest_manifest.json",
+        "lexical": directory / "bm25_index.npz",
+        "store": directory / "chunk_store",
+        "router": directory / "area_router.npz",
+        "answers": directory / "precomputed_answers.json",
+    }
+
+
+def list_versions(chroma_path: Path) -> list[int]:
+    root = Path(chroma_path) / VERSIONS_DIR
+    if not root.exists():
+        return []
+    return sorted(int(p.name[1:]) for p in root.iterdir() if p.is_dir() and p.name[1:].isdigit())
+
+
+def next_version(chroma_path: Path) -> int:
+    current = read_current(chroma_path)
+    return max(list_versions(chroma_path) + [current["version"] if current else 0]) + 1
+
+
+# ---------- pointer ----------
+def read_current(chroma_path: Path):
+    """
+    The published version as {"version", "collection", "created_at", "stats"},
+    or None if the index was never built with versions.
+    """
+    path = Path(chroma_path) / POINTER_NAME
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def pointer_stamp(chroma_path: Path):
+    """
+    Cheap change check for the pointer file: (mtime_ns, size), or None.
+    """
+    try:
+        stat = (Path(chroma_path) / POINTER_NAME).stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def publish(chroma_path: Path, number: int, collection: str, stats: dict = None) -> dict:
+    """
+    Make version number the current one. The pointer is written to a
+    temporary file and renamed over the old one, so readers see either the
+    old or the new version, never a partial file.
+    """
+    info = {
+        "version": number,
+        "collection": collection,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "stats": stats or {},
+    }
+    path = Path(chroma_path) / POINTER_NAME
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(info, indent=2), encoding="utf-8")
+    os.replace(tmp_path, path)
+    return info
+
+
+def garbage_collect(client, chroma_path: Path, base: str, keep: int) -> list[int]:
+    """
+    Delete the collections and files of all but the newest keep versions.
+    The current version is never deleted. Readers that have not reloaded
+    yet keep working as long as their version is among the kept ones.
+    """
+    current = read_current(chroma_path)
+    versions = list_versions(chroma_path)
+    kept = set(versions[-max(1, keep):])
+    if current:
+        kept.add(current["version"])
+    removed = []
+    for number in versions:
+        if number in kept:
+            continue
+        try:
+            client.delete_collection(collection_name(base, number))
+        except Exception as exc:
+            print(f"Could not delete collection {collection_name(base, number)}: {exc}")
+        shutil.rmtree(version_dir(chroma_path, number), ignore_errors=True)
+        removed.append(number)
+    return removed
+
+
+# ---------- watcher ----------
+def docs_fingerprint(docs_path: Path):
+    """
+    (relative path, mtime_ns, size) of every Markdown file; changes when a
+    file is added, removed or written.
+    """
+    docs_path = Path(docs_path)
+    if not docs_path.exists():
+        return ()
+    entries = []
+    for path in sorted(docs_path.rglob("*.md")):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue  # removed while scanning
+        entries.append((str(path.relative_to(docs_path)), stat.st_mtime_ns, stat.st_size))
+    return tuple(entries)
+
+
+class IndexWatcher:
+    """
+    Rebuilds the index when the policy documents change and swaps the new
+    version into the running engine.
+
+    Every interval seconds the watcher asks the engine to reload (another
+    process may have published a version) and fingerprints docs_path.
+    Once the documents have changed and then stayed unchanged for debounce
+    seconds, it runs "ingest_md.py" in a subprocess. Builds do not block
+    queries: the subprocess writes a new versioned collection while the
+    engine keeps serving the current one, and the engine swaps after the
+    build has published it. Concurrent builds (the API and a manual run) are
+    serialized by a lock file in ingest_md.py.
+
+    after_swap is an optional command (precompute_answers.py in the API)
+    started in the background whenever a new version went live, and once
+    at start. A run still going when the next version arrives is stopped,
+    since its results belong to the old version.
+
+    With lock_path, only the process holding that file lock (the leader,
+    one of several API workers) watches docs_path, builds and runs
+    after_swap; the others only reload. The lock is tried on every check,
+    so another worker takes over when the leader exits.
+    """
+
+    def __init__(self, engine, docs_path: Path, interval: float = 5.0, debounce: float = 10.0, command=None,
+                 after_swap=None, lock_path: Path = None):
+        self.engine = engine
+        self.docs_path = Path(docs_path)
+        self.interval = interval
+        self.debounce = debounce
+        self.command = command or [sys.executable, str(Path(__file__).resolve().parent / "ingest_md.py")]
+        self.after_swap = after_swap
+        self.lock_path = Path(lock_path) if lock_path else None
+        self._lock_file = None
+        self.builds = 0
+        self.failed_builds = 0
+        self.building = False
+        self.last_build = None
+        self.jobs = 0
+        self.last_job = None
+        self._fingerprint = None
+        self._changed_at = None
+        self._task = None
+        self._job_task = None
+        self._job_process = None
+
+    @property
+    def leader(self) -> bool:
+        return self.lock_path is None or self._lock_file is not None
+
+    def _take_lead(self) -> bool:
+        """
+        Try to become the leader. Returns True only when this call took the
+        lock (subprocesses do not inherit it: asyncio closes their fds).
+        """
+        if self.leader:
+            return False
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.lock_path, "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    async def check(self):
+        loop = asyncio.get_running_loop()
+        if await loop.run_in_executor(None, self.engine.reload) and self.leader:
+            self.start_after_swap()
+        if self._take_lead():
+            self.start_after_swap()  # the previous leader may have exited during its run
+        if not self.leader:
+            return
+
+        fingerprint = await loop.run_in_executor(None, docs_fingerprint, self.docs_path)
+        if self._fingerprint is None:
+            self._fingerprint = fingerprint
+            return
+        if fingerprint != self._fingerprint:
+            self._fingerprint = fingerprint
+            self._changed_at = time.monotonic()
+            return
+        if self._changed_at is not None and time.monotonic() - self._changed_at >= self.debounce:
+            self._changed_at = None
+            await self.build()
+
+    async def build(self):
+        self.building = True
+        start = time.perf_counter()
+        try:
+            process = await asyncio.create_subprocess_exec(*self.command)
+            returncode = await process.wait()
+        finally:
+            self.building = False
+        self.builds += 1
+        self.failed_builds += returncode != 0
+        self.last_build = {
+            "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "seconds": round(time.perf_counter() - start, 3),
+            "returncode": returncode,
+        }
+        if returncode == 0:
+            if await asyncio.get_running_loop().run_in_executor(None, self.engine.reload):
+                self.start_after_swap()
+        else:
+            print(f"Index rebuild failed with exit code {returncode}, still serving the previous version.")
+
+    def start_after_swap(self):
+        if not self.after_swap:
+            return
+        self._stop_job()
+        self._job_task = asyncio.ensure_future(self._run_job())
+
+    async def _run_job(self):
+        start = time.perf_counter()
+        self._job_process = await asyncio.create_subprocess_exec(*self.after_swap)
+        returncode = await self._job_process.wait()
+        self._job_process = None
+        self.jobs += 1
+        self.last_job = {
+            "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "seconds": round(time.perf_counter() - start, 3),
+            "returncode": returncode,
+        }
+
+    def _stop_job(self):
+        if self._job_process is not None and self._job_process.returncode is None:
+            self._job_process.terminate()
+        if self._job_task is not None:
+            self._job_task.cancel()
+        self._job_task = self._job_process = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.check()
+            except Exception as exc:
+                print(f"Index watcher error: {exc.__class__.__name__}: {exc}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.ensure_future(self._loop())
+        self._take_lead()
+        if self.leader:
+            self.start_after_swap()  # the current version may have been published while the API was down
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._stop_job()
+        if self._lock_file is not None:
+            self._lock_file.close()  # releases the lock, another worker takes over
+            self._lock_file = None
+
+    def stats(self) -> dict:
+        return {
+            "watching": str(self.docs_path) if self._task is not None and self.leader else None,
+            "leader": self.leader,
+            "interval_s": self.interval,
+            "debounce_s": self.debounce,
+            "building": self.building,
+            "pending_change": self._changed_at is not None,
+            "builds": self.builds,
+            "failed_builds": self.failed_builds,
+            "last_build": self.last_build,
+            "after_swap_running": self._job_process is not None,
+            "after_swap_runs": self.jobs,
+            "last_after_swap": self.last_job,
+        }
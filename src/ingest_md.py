@@ -1,20 +1,65 @@
 import os
 os.environ["ANONYMIZED_TELEMETRY"] = "false"
+import argparse
+import fcntl
+import hashlib
+import json
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from pathlib import Path
 
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
+# chromadb and sentence_transformers are imported where they are used, so
+# --help and the chunking worker processes start without loading torch
+from area_router import AreaRouter
+from bm25_index import BM25Index
+from chunk_store import STORE_DTYPES, ChunkStore
+import index_versions
+from markdown_chunker import split_markdown
 
 
 # === Paths ===
 BASE_DIR = Path(__file__).resolve().parent.parent  # e.g., /ws25_26_apip_do1_grp02
-DOCS_PATH = BASE_DIR / "data" / "hr_policies"     # folder where your .md files are
-CHROMA_PATH = BASE_DIR / "data" / "chroma"        # persistent vector storage
+DOCS_PATH = Path(os.getenv("DOCS_PATH", BASE_DIR / "data" / "hr_policies"))  # folder where your .md files are
+CHROMA_PATH = Path(os.getenv("CHROMA_PATH", BASE_DIR / "data" / "chroma"))  # persistent vector storage
+MANIFEST_PATH = CHROMA_PATH / "ingest_manifest.json"  # content hashes of the last run
+MANIFEST_VERSION = 1
+METADATA_VERSION = 3  # bump when chunk metadata changes; every file is re-chunked once
+ROOT_AREA = "general"  # policy area of files directly in DOCS_PATH
+COLLECTION_NAME = "hr-policies"  # versioned builds use "hr-policies-v<N>"
+BUILD_LOCK_PATH = CHROMA_PATH / "build.lock"  # one versioned build at a time
+INDEX_VERSIONS_KEEP = int(os.getenv("INDEX_VERSIONS_KEEP", "3"))  # versions kept on disk, incl. the current one
+BM25_INDEX_PATH = CHROMA_PATH / "bm25_index.npz"  # lexical index, rebuilt after every change
+AREA_ROUTER_PATH = CHROMA_PATH / "area_router.npz"  # policy area centroids, rebuilt after every change
+# memory-mapped export of vectors, texts and metadata (see chunk_store.py), rebuilt after every change
+CHUNK_STORE_PATH = Path(os.getenv("CHUNK_STORE_PATH", CHROMA_PATH / "chunk_store"))
+CHUNK_STORE_DTYPE = os.getenv("CHUNK_STORE_DTYPE", "float16")  # "float32", "float16", "int8" or "none"
+
+# === Chunking (overridable on the command line) ===
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "800"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "100"))
+CHUNK_UNIT = os.getenv("CHUNK_UNIT", "chars")  # "chars" or "tokens"
+
+# === Pipeline sizes (overridable on the command line) ===
+EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "64"))     # chunks per encode() call
+UPSERT_BATCH_SIZE = int(os.getenv("INGEST_UPSERT_BATCH_SIZE", "256"))  # chunks per collection.upsert()
+WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))  # chunking processes
 
 # === Embedding Model (local, no OpenAI) ===
 EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
-embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+_embedding_model = None
+
+
+def get_embedding_model():
+    """
+    Load the embedding model on first use, so chunking worker processes
+    (which import this module) never load it.
+    """
+    global _embedding_model
+    if _embedding_model is None:
+        from sentence_transformers import SentenceTransformer
+        _embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return _embedding_model
 
 
 def load_markdown_files(docs_path: Path):
@@ -38,7 +83,7 @@ def load_markdown_files(docs_path: Path):
 
         # Use a project-relative path so the frontend does not see full absolute paths
         rel_path = path.relative_to(BASE_DIR)  # e.g. "hr_rag_chatbot/data/hr_policies/..."
-        metadata = {"source": path.name}
+        metadata = {"source": path.name, "area": policy_area(doc_id)}
         documents.append((doc_id, text, metadata))
 
     return documents
@@ -50,6 +95,9 @@ def simple_markdown_split(text: str, max_chars: int = 800):
     - Splits by headings or blank lines
     - Groups lines up to max_chars per chunk
     This is lightweight and works well for handbooks.
+
+    Superseded by markdown_chunker.split_markdown; kept as the baseline for
+    benchmarks/bench_chunker.py.
     """
     lines = text.splitlines()
     chunks = []
@@ -81,66 +129,508 @@ def simple_markdown_split(text: str, max_chars: int = 800):
     return chunks
 
 
-def get_chroma_collection():
-    """
-    Creates or loads a persistent ChromaDB collection for HR policies.
-    """
+def get_chroma_client():
+    import chromadb
+    from chromadb.config import Settings
+
     CHROMA_PATH.mkdir(parents=True, exist_ok=True)
 
-    client = chromadb.PersistentClient(
+    return chromadb.PersistentClient(
         path=str(CHROMA_PATH),
         settings=Settings(allow_reset=True)
     )
 
+
+def get_chroma_collection(name: str = COLLECTION_NAME, client=None):
+    """
+    Creates or loads a persistent ChromaDB collection for HR policies.
+    """
+    client = client or get_chroma_client()
+
     collection = client.get_or_create_collection(
-        name="hr-policies",
+        name=name,
         metadata={"description": "GitLab Handbook HR section (markdown chunks)"}
     )
 
     return collection
 
 
-def ingest():
+def policy_area(doc_id: str) -> str:
     """
-    Load markdown files, split into chunks, compute embeddings,
-    and store them in ChromaDB.
+    Policy area of a document: its top-level folder under DOCS_PATH, e.g.
+    "time-off-and-absence/parental-leave.md" -> "time-off-and-absence".
+    Files directly in DOCS_PATH belong to ROOT_AREA.
     """
-    collection = get_chroma_collection()
-    docs = load_markdown_files(DOCS_PATH)
+    parts = Path(doc_id).parts
+    return parts[0] if len(parts) > 1 else ROOT_AREA
 
-    if not docs:
-        print(f"No .md files found in {DOCS_PATH}")
-        return
 
-    ids, contents, metadatas = [], [], []
-    print(f"Found {len(docs)} markdown document(s). Chunking and embedding...")
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
-    counter = 0
-    for doc_id, text, base_meta in docs:
-        chunks = simple_markdown_split(text)
-        for i, chunk in enumerate(chunks):
-            chunk_id = f"{doc_id}::chunk-{i}"
-            ids.append(chunk_id)
-            contents.append(chunk)
-            metadatas.append({**base_meta, "chunk_index": i})
-            counter += 1
 
-    print(f"Total chunks created: {counter}")
+def load_manifest(path: Path = MANIFEST_PATH) -> dict:
+    """
+    Load the manifest written by the previous ingest run.
+
+    Layout:
+    {
+      "version": 1,
+      "files": {
+        "<doc_id>": {"hash": "<sha256 of file>", "chunks": {"<chunk_id>": "<sha256>", ...}},
+        ...
+      }
+    }
+    A missing or unreadable manifest is treated as empty (full ingest).
+    """
+    if not path.exists():
+        return {"version": MANIFEST_VERSION, "files": {}}
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        print(f"Manifest {path} is unreadable, doing a full ingest.")
+        return {"version": MANIFEST_VERSION, "files": {}}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "files": {}}
+    return manifest
+
+
+def save_manifest(manifest: dict, path: Path = MANIFEST_PATH):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=1, sort_keys=True), encoding="utf-8")
+    tmp_path.replace(path)  # atomic, so a crash never leaves half a manifest
+
+
+def chunk_options(size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP, unit: str = CHUNK_UNIT) -> dict:
+    """
+    Chunker settings. They are stored in the manifest, because changing them
+    changes every chunk even when no file changed.
+    """
+    return {"chunk_size": size, "overlap": overlap, "unit": unit}
 
-    if not contents:
-        print("No chunks generated. Nothing to ingest.")
+
+def chunk_document(doc_id: str, text: str, base_meta: dict, options: dict = None):
+    """
+    Split one document and return (chunk_id, content, metadata, chunk_hash) tuples.
+    """
+    records = []
+    for i, chunk in enumerate(split_markdown(text, **(options or chunk_options()))):
+        chunk_id = f"{doc_id}::chunk-{i}"
+        metadata = {**base_meta, "chunk_index": i, "headings": chunk["breadcrumb"],
+                    "overlap_chars": chunk["overlap_chars"]}
+        chunk = chunk["text"]
+        # metadata is part of the hash so a metadata-only change is re-upserted
+        chunk_hash = content_hash(chunk + "\0" + json.dumps(metadata, sort_keys=True))
+        records.append((chunk_id, chunk, metadata, chunk_hash))
+    return records
+
+
+def iter_markdown_paths(docs_path: Path):
+    """
+    Yield every .md file under docs_path, in a stable order.
+    """
+    if not docs_path.exists():
+        raise FileNotFoundError(f"Docs folder not found: {docs_path}")
+    yield from sorted(docs_path.rglob("*.md"))
+
+
+def read_and_chunk(path_str: str, docs_path_str: str, old_hash=None, options: dict = None):
+    """
+    Worker: read one file, hash it and split it into chunks.
+
+    Returns (doc_id, file_hash, records). records is None when the file hash
+    equals old_hash (unchanged since the last run) and [] for an empty file.
+    Runs in a worker process, so it only takes and returns plain data.
+    """
+    path = Path(path_str)
+    doc_id = str(path.relative_to(docs_path_str))
+    text = path.read_text(encoding="utf-8")
+    file_hash = content_hash(text)
+
+    if file_hash == old_hash:
+        return doc_id, file_hash, None
+    if not text.strip():
+        return doc_id, file_hash, []
+    base_meta = {"source": path.name, "area": policy_area(doc_id)}
+    return doc_id, file_hash, chunk_document(doc_id, text, base_meta, options)
+
+
+def iter_chunked_documents(docs_path: Path, old_files: dict, workers: int = WORKERS, options: dict = None):
+    """
+    Generator over read_and_chunk() results for every file under docs_path.
+
+    With workers > 1 the files are chunked in a process pool. At most
+    2 * workers files are in flight at once, so memory stays bounded no
+    matter how many files there are. Results come back in completion order.
+    """
+    def old_hash(path):
+        entry = old_files.get(str(path.relative_to(docs_path)))
+        return entry.get("hash") if entry else None
+
+    paths = iter_markdown_paths(docs_path)
+
+    if workers <= 1:
+        for path in paths:
+            yield read_and_chunk(str(path), str(docs_path), old_hash(path), options)
         return
 
-    print("Computing embeddings...")
-    embeddings = embedding_model.encode(contents, show_progress_bar=True).tolist()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for path in paths:
+            pending.add(pool.submit(read_and_chunk, str(path), str(docs_path), old_hash(path), options))
+            if len(pending) < 2 * workers:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+        for future in pending:
+            yield future.result()
+
+
+def diff_document(doc_id: str, file_hash: str, records, old_entry, stats: dict):
+    """
+    Compare one document against its manifest entry.
+
+    Returns (to_upsert, to_delete, new_entry):
+    - to_upsert: (chunk_id, content, metadata, chunk_hash) tuples that are new or changed
+    - to_delete: chunk IDs of this document that no longer exist
+    - new_entry: manifest entry for the document, or None if it has no chunks
+    stats (added / changed / removed / skipped) is updated in place.
+    """
+    old_chunks = old_entry.get("chunks", {}) if old_entry else {}
+
+    # unchanged file: read_and_chunk did not even chunk it
+    if records is None:
+        stats["skipped"] += len(old_chunks)
+        return [], [], old_entry
+
+    to_upsert, new_chunks = [], {}
+    for record in records:
+        chunk_id, chunk_hash = record[0], record[3]
+        new_chunks[chunk_id] = chunk_hash
+        if chunk_id not in old_chunks:
+            stats["added"] += 1
+            to_upsert.append(record)
+        elif old_chunks[chunk_id] != chunk_hash:
+            stats["changed"] += 1
+            to_upsert.append(record)
+        else:
+            stats["skipped"] += 1
+
+    # chunks left over when a file got shorter
+    to_delete = [chunk_id for chunk_id in old_chunks if chunk_id not in new_chunks]
+    stats["removed"] += len(to_delete)
+
+    new_entry = {"hash": file_hash, "chunks": new_chunks} if new_chunks else None
+    return to_upsert, to_delete, new_entry
+
+
+class _BatchWriter:
+    """
+    Embeds pending chunks in fixed-size batches and upserts them into Chroma
+    in bounded batches. Upserts run on a background thread so the next batch
+    is embedded while the previous one is written; at most one upsert is
+    outstanding, which keeps memory bounded.
+    """
+
+    def __init__(self, collection, embed_batch_size: int, upsert_batch_size: int):
+        self.collection = collection
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = max(upsert_batch_size, embed_batch_size)
+        self._pending = []       # records waiting to be embedded
+        self._ready = ([], [], [], [])  # ids, documents, embeddings, metadatas
+        self._upserter = ThreadPoolExecutor(max_workers=1)
+        self._inflight = None
+        self.written = 0
+
+    def add(self, records):
+        self._pending.extend(records)
+        while len(self._pending) >= self.embed_batch_size:
+            batch = self._pending[:self.embed_batch_size]
+            del self._pending[:self.embed_batch_size]
+            self._embed(batch)
+
+    def _embed(self, batch):
+        contents = [r[1] for r in batch]
+        embeddings = get_embedding_model().encode(contents, batch_size=self.embed_batch_size).tolist()
+
+        ids, documents, vectors, metadatas = self._ready
+        ids.extend(r[0] for r in batch)
+        documents.extend(contents)
+        vectors.extend(embeddings)
+        metadatas.extend(r[2] for r in batch)
+
+        if len(ids) >= self.upsert_batch_size:
+            self._flush_ready()
+
+    def _flush_ready(self):
+        ids, documents, vectors, metadatas = self._ready
+        if not ids:
+            return
+        self._ready = ([], [], [], [])
+        self._wait_inflight()
+        self._inflight = self._upserter.submit(
+            self.collection.upsert,
+            ids=ids, documents=documents, embeddings=vectors, metadatas=metadatas,
+        )
+        self.written += len(ids)
+        print(f"  upserting batch ({self.written} chunk(s) so far)")
+
+    def _wait_inflight(self):
+        if self._inflight is not None:
+            self._inflight.result()  # re-raises upsert errors
+            self._inflight = None
+
+    def close(self):
+        if self._pending:
+            batch, self._pending = self._pending, []
+            self._embed(batch)
+        self._flush_ready()
+        self._wait_inflight()
+        self._upserter.shutdown()
+
+
+def build_lexical_index(collection, path: Path = BM25_INDEX_PATH):
+    """
+    Rebuild the BM25 index over every chunk in the collection and save it
+    next to the Chroma index. Building is cheap compared to embedding, so
+    it is always rebuilt from scratch.
+    """
+    start = time.perf_counter()
+    index = BM25Index.from_collection(collection)
+    index.save(path)
+    print(
+        f"BM25 index: {len(index)} chunks, {len(index.terms)} terms, "
+        f"{path.stat().st_size / 1024:.0f} KiB, built in {time.perf_counter() - start:.2f}s"
+    )
 
-    print("Upserting data into Chroma...")
-    collection.upsert(ids=ids, documents=contents, embeddings=embeddings, metadatas=metadatas)
 
+def build_area_router(collection, path: Path = AREA_ROUTER_PATH):
+    """
+    Rebuild the policy area centroids used to route queries to partitions
+    (see area_router.py).
+    """
+    router = AreaRouter.from_collection(collection)
+    router.save(path)
+    print(f"Area router: {len(router)} area(s): "
+          + ", ".join(f"{area} ({count})" for area, count in router.stats().items()))
+
+
+def build_chunk_store(collection, path: Path = CHUNK_STORE_PATH, dtype: str = CHUNK_STORE_DTYPE):
+    """
+    Export the collection into the memory-mapped chunk store read by the
+    "quantized" vector backend. Like the BM25 index it is rebuilt from scratch.
+    """
+    start = time.perf_counter()
+    store = ChunkStore.from_collection(collection, path, dtype)
+    size = sum(store.stats()["bytes"].values())
+    print(
+        f"Chunk store: {store.count()} chunks as {dtype}, {size / 1024:.0f} KiB, "
+        f"written in {time.perf_counter() - start:.2f}s"
+    )
+
+
+def chunk_store_outdated(path: Path, dtype: str) -> bool:
+    header_path = path / "store.json"
+    if not header_path.exists():
+        return True
+    return json.loads(header_path.read_text(encoding="utf-8")).get("dtype") != dtype
+
+
+def ingest(
+    full: bool = False,
+    workers: int = WORKERS,
+    embed_batch_size: int = EMBED_BATCH_SIZE,
+    upsert_batch_size: int = UPSERT_BATCH_SIZE,
+    options: dict = None,
+    store_dtype: str = CHUNK_STORE_DTYPE,
+    collection=None,
+    manifest_path: Path = MANIFEST_PATH,
+    lexical_path: Path = BM25_INDEX_PATH,
+    store_path: Path = CHUNK_STORE_PATH,
+    router_path: Path = AREA_ROUTER_PATH,
+):
+    """
+    Load markdown files, split into chunks, compute embeddings,
+    and store them in ChromaDB.
+
+    The run is a streaming pipeline: files are read and chunked in a process
+    pool (workers), chunks are embedded in fixed-size batches
+    (embed_batch_size) and upserted in bounded batches (upsert_batch_size).
+    Memory depends on the batch sizes, not on the size of the corpus.
+
+    Only chunks whose content hash differs from the manifest of the previous
+    run are embedded and upserted; chunks that disappeared are deleted.
+    Pass full=True to ignore the manifest and re-embed everything.
+    options are the chunker settings, see chunk_options(). store_dtype is
+    the vector type of the chunk store ("none" skips writing it).
+
+    This updates collection (default: the unversioned "hr-policies") in
+    place; build_index_version() wraps it to build a new version instead.
+    """
+    collection = collection or get_chroma_collection()
+    options = options or chunk_options()
+
+    manifest = load_manifest(manifest_path)
+    if manifest["files"] and manifest.get("chunker") != options:
+        print("Chunker settings changed since the last run, re-chunking every file.")
+        full = True
+    elif manifest["files"] and manifest.get("metadata", 1) != METADATA_VERSION:
+        print("Chunk metadata changed since the last run, re-chunking every file.")
+        full = True
+    if full or (manifest["files"] and collection.count() == 0):
+        # forced, or the index was wiped while the manifest survived.
+        # Keep the old chunk IDs (without hashes) so every chunk is re-embedded
+        # and chunks that no longer exist are still deleted.
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "files": {doc_id: {"hash": None, "chunks": dict.fromkeys(entry.get("chunks", {}))}
+                      for doc_id, entry in manifest["files"].items()},
+        }
+    old_files = manifest["files"]
+
+    print(f"Chunking with {workers} worker(s), embedding in batches of {embed_batch_size}...")
+    stats = {"added": 0, "changed": 0, "removed": 0, "skipped": 0}
+    new_files, seen_docs, to_delete = {}, set(), []
+
+    writer = _BatchWriter(collection, embed_batch_size, upsert_batch_size)
+    try:
+        for doc_id, file_hash, records in iter_chunked_documents(DOCS_PATH, old_files, workers, options):
+            seen_docs.add(doc_id)
+            upserts, deletes, entry = diff_document(doc_id, file_hash, records, old_files.get(doc_id), stats)
+            to_delete.extend(deletes)
+            if entry is not None:
+                new_files[doc_id] = entry
+            writer.add(upserts)
+    finally:
+        writer.close()
+
+    # files that were deleted since the last run
+    for doc_id, old_entry in old_files.items():
+        if doc_id not in seen_docs:
+            stale = list(old_entry.get("chunks", {}))
+            to_delete.extend(stale)
+            stats["removed"] += len(stale)
+
+    if to_delete:
+        print(f"Deleting {len(to_delete)} stale chunk(s) from Chroma...")
+        for start in range(0, len(to_delete), upsert_batch_size):
+            collection.delete(ids=to_delete[start:start + upsert_batch_size])
+
+    save_manifest({"version": MANIFEST_VERSION, "chunker": options, "metadata": METADATA_VERSION,
+                   "files": new_files}, manifest_path)
+    changed = stats["added"] or stats["changed"] or stats["removed"]
+    if changed or not lexical_path.exists():
+        build_lexical_index(collection, lexical_path)
+    if changed or not router_path.exists():
+        build_area_router(collection, router_path)
+    if store_dtype != "none" and (changed or chunk_store_outdated(store_path, store_dtype)):
+        build_chunk_store(collection, store_path, store_dtype)
+
+    print(f"Processed {len(seen_docs)} markdown document(s).")
+    print(
+        f"Chunks added: {stats['added']}, changed: {stats['changed']}, "
+        f"removed: {stats['removed']}, skipped: {stats['skipped']}"
+    )
     print("Ingestion completed successfully.")
+    return stats
+
+
+def copy_collection(source, target, page_size: int = UPSERT_BATCH_SIZE):
+    """
+    Copy every chunk with its embedding from source to target, so a new
+    version only has to embed what changed.
+    """
+    total = source.count()
+    for offset in range(0, total, page_size):
+        page = source.get(limit=page_size, offset=offset, include=["embeddings", "documents", "metadatas"])
+        if page["ids"]:
+            target.upsert(ids=page["ids"], embeddings=page["embeddings"], documents=page["documents"],
+                          metadatas=page["metadatas"])
+
+
+def build_index_version(full: bool = False, keep: int = INDEX_VERSIONS_KEEP, **ingest_options):
+    """
+    Build the index into a new versioned collection and publish it.
+
+    The running API keeps reading the current version while this runs:
+    the new collection "hr-policies-v<N>" starts as a copy of the current
+    one (or of the unversioned collection of older runs), ingest() applies
+    the document changes to it, and only then is it published by replacing
+    the pointer file (see index_versions.py). If nothing changed, the new
+    version is dropped. Afterwards all but the newest keep versions are
+    deleted. Builds from several processes are serialized by a lock file.
+    Returns the ingest stats, with the published "version".
+    """
+    CHROMA_PATH.mkdir(parents=True, exist_ok=True)
+    with open(BUILD_LOCK_PATH, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)  # wait for a build started by another process
+        client = get_chroma_client()
+        current = index_versions.read_current(CHROMA_PATH)
+        number = index_versions.next_version(CHROMA_PATH)
+        name = index_versions.collection_name(COLLECTION_NAME, number)
+        paths = index_versions.version_paths(CHROMA_PATH, number)
+        paths["dir"].mkdir(parents=True, exist_ok=True)
+
+        if current is not None:
+            source_name = current["collection"]
+            source_manifest = index_versions.version_paths(CHROMA_PATH, current["version"])["manifest"]
+        else:
+            source_name, source_manifest = COLLECTION_NAME, MANIFEST_PATH
+        collection = get_chroma_collection(name, client)
+        existing = {c.name if hasattr(c, "name") else c for c in client.list_collections()}
+        if not full and source_name in existing and source_manifest.exists():
+            print(f"Building index version {number} from {source_name}...")
+            copy_collection(client.get_collection(source_name), collection)
+            save_manifest(load_manifest(source_manifest), paths["manifest"])
+        else:
+            print(f"Building index version {number} from scratch...")
+
+        stats = ingest(full=full, collection=collection, manifest_path=paths["manifest"],
+                       lexical_path=paths["lexical"], store_path=paths["store"], router_path=paths["router"],
+                       **ingest_options)
+
+        if current is not None and not (stats["added"] or stats["changed"] or stats["removed"]):
+            print(f"No changes, keeping index version {current['version']}.")
+            client.delete_collection(name)
+            shutil.rmtree(paths["dir"], ignore_errors=True)
+            return {**stats, "version": current["version"]}
+
+        index_versions.publish(CHROMA_PATH, number, name, stats)
+        print(f"Published index version {number} ({collection.count()} chunks).")
+        removed = index_versions.garbage_collect(client, CHROMA_PATH, COLLECTION_NAME, keep)
+        if removed:
+            print(f"Removed old index version(s): {', '.join(map(str, removed))}")
+        return {**stats, "version": number}
 
 
 if __name__ == "__main__":
-    collection = get_chroma_collection()
+    parser = argparse.ArgumentParser(description="Ingest HR Markdown policies into ChromaDB.")
+    parser.add_argument("--full", action="store_true", help="ignore the manifest and re-embed every chunk")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="chunking processes (1 = no pool)")
+    parser.add_argument("--embed-batch-size", type=int, default=EMBED_BATCH_SIZE, help="chunks per embedding call")
+    parser.add_argument("--upsert-batch-size", type=int, default=UPSERT_BATCH_SIZE, help="chunks per Chroma upsert")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="maximum chunk size")
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP, help="overlap between consecutive chunks")
+    parser.add_argument("--chunk-unit", choices=["chars", "tokens"], default=CHUNK_UNIT, help="unit of size and overlap")
+    parser.add_argument("--in-place", action="store_true",
+                        help="update the unversioned collection directly instead of building a new version")
+    parser.add_argument("--keep", type=int, default=INDEX_VERSIONS_KEEP, help="index versions kept on disk")
+    parser.add_argument("--store-dtype", choices=[*STORE_DTYPES, "none"], default=CHUNK_STORE_DTYPE,
+                        help="vector type of the memory-mapped chunk store (none = do not write it)")
+    args = parser.parse_args()
+
     print(f"Looking for markdown files in: {DOCS_PATH.resolve()}")
-    ingest()
+    ingest_options = dict(
+        full=args.full,
+        workers=args.workers,
+        embed_batch_size=args.embed_batch_size,
+        upsert_batch_size=args.upsert_batch_size,
+        options=chunk_options(args.chunk_size, args.chunk_overlap, args.chunk_unit),
+        store_dtype=args.store_dtype,
+    )
+    if args.in_place:
+        ingest(**ingest_options)
+    else:
+        build_index_version(keep=args.keep, **ingest_options)
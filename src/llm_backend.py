@@ -0,0 +1,239 @@
+import asyncio
+import time
+
+
+class NoHealthyHostError(Exception):
+    """
+    Raised when every Ollama host failed for a request.
+    """
+
+
+class OllamaHost:
+    """
+    One Ollama endpoint, its model name and its routing state.
+    """
+
+    def __init__(self, url: str, model: str):
+        self.url = url
+        self.model = model
+        self._client = None
+        self.outstanding = 0   # requests currently sent to this host
+        self.requests = 0
+        self.failures = 0
+        self.healthy = True    # optimistic until the first check or error says otherwise
+        self.last_error = None
+        self.last_check = None
+        self.warmup_seconds = None
+
+    @property
+    def client(self):
+        # ollama (httpx + pydantic models) is imported on first use, not at server import
+        if self._client is None:
+            import ollama
+            self._client = ollama.AsyncClient(host=self.url)
+        return self._client
+
+    def mark_ok(self):
+        self.healthy = True
+
+    def mark_failed(self, exc: BaseException):
+        self.healthy = False
+        self.failures += 1
+        self.last_error = f"{exc.__class__.__name__}: {exc}"
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "model": self.model,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "warmup_s": self.warmup_seconds,
+        }
+
+
+def parse_hosts(spec: str, default_model: str) -> list[OllamaHost]:
+    """
+    Parse "http://gpu1:11434=llama3:8b,http://gpu2:11434" into hosts;
+    a host without "=model" uses default_model.
+    """
+    hosts = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        url, _, model = item.partition("=")
+        hosts.append(OllamaHost(url.strip().rstrip("/"), model.strip() or default_model))
+    if not hosts:
+        raise ValueError("No Ollama host configured")
+    return hosts
+
+
+class LLMBackend:
+    """
+    Sends chat requests to a pool of Ollama hosts.
+
+    - routing: the healthy host with the fewest outstanding requests (ties
+      go to the host that served fewer requests so far)
+    - failover: a host that errors is marked unhealthy and the request is
+      retried on the next one; a stream only fails over before its first
+      token, after that the error is raised to the caller
+    - health checks: start() runs a background task that lists each host's
+      models every health_interval seconds and marks the host healthy only
+      if its model is pulled
+    - keep-alive: every request asks Ollama to keep the model loaded for
+      keep_alive (e.g. "30m"); warm_up() loads it on every host up front
+
+    chat() has the same call shape as ollama.AsyncClient.chat() without
+    the model argument, so the caller does not know which host answered.
+    All methods must be called from the event loop thread.
+    """
+
+    def __init__(self, hosts: list[OllamaHost], health_interval: float = 10.0, health_timeout: float = 2.0,
+                 keep_alive: str = None):
+        self.hosts = hosts
+        self.keep_alive = keep_alive
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.failovers = 0
+        self._health_task = None
+
+    @classmethod
+    def from_spec(cls, spec: str, default_model: str, **kwargs):
+        return cls(parse_hosts(spec, default_model), **kwargs)
+
+    # ---------- routing ----------
+    def pick(self, exclude=()) -> OllamaHost:
+        candidates = [h for h in self.hosts if h not in exclude]
+        if not candidates:
+            raise NoHealthyHostError(f"All {len(self.hosts)} Ollama hosts failed")
+        # with no healthy host left, still try the others rather than fail right away
+        healthy = [h for h in candidates if h.healthy] or candidates
+        return min(healthy, key=lambda h: (h.outstanding, h.requests))
+
+    async def chat(self, messages, stream: bool = False, **options):
+        """
+        ollama.AsyncClient.chat() on the least busy host. With stream=True
+        returns an async iterator of response chunks (call aclose() on it to
+        abort the generation).
+        """
+        if self.keep_alive is not None:
+            options.setdefault("keep_alive", self.keep_alive)
+        if stream:
+            return self._stream(messages, options)
+
+        tried = []
+        while True:
+            host = self.pick(tried)
+            tried.append(host)
+            host.outstanding += 1
+            host.requests += 1
+            try:
+                response = await host.client.chat(model=host.model, messages=messages, **options)
+                host.mark_ok()
+                return response
+            except Exception as exc:
+                self._failed(host, exc)
+            finally:
+                host.outstanding -= 1
+
+    async def _stream(self, messages, options):
+        tried = []
+        while True:
+            host = self.pick(tried)
+            tried.append(host)
+            host.outstanding += 1
+            host.requests += 1
+            started = False
+            try:
+                upstream = await host.client.chat(model=host.model, messages=messages, stream=True, **options)
+                try:
+                    async for chunk in upstream:
+                        started = True
+                        yield chunk
+                finally:
+                    # closing the response makes Ollama stop generating
+                    aclose = getattr(upstream, "aclose", None)
+                    if aclose is not None:
+                        await aclose()
+                host.mark_ok()
+                return
+            except Exception as exc:
+                if started:
+                    host.mark_failed(exc)
+                    raise
+                self._failed(host, exc)
+            finally:
+                host.outstanding -= 1
+
+    def _failed(self, host: OllamaHost, exc: Exception):
+        host.mark_failed(exc)
+        self.failovers += 1
+        print(f"Ollama host {host.url} failed ({host.last_error}), trying the next one.")
+
+    # ---------- warm-up ----------
+    async def warm_up(self, timeout: float = 120.0) -> dict:
+        """
+        Load the model on every host with an empty generate request (Ollama
+        loads the model and returns without generating). A host that fails
+        is marked unhealthy; returns {url: seconds or error}.
+        """
+        async def load(host: OllamaHost):
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(
+                    host.client.generate(model=host.model, prompt="", keep_alive=self.keep_alive), timeout
+                )
+            except Exception as exc:
+                host.mark_failed(exc)
+                return host.url, host.last_error
+            host.warmup_seconds = round(time.perf_counter() - start, 3)
+            host.mark_ok()
+            return host.url, host.warmup_seconds
+
+        return dict(await asyncio.gather(*(load(h) for h in self.hosts)))
+
+    # ---------- health checks ----------
+    async def check_host(self, host: OllamaHost):
+        host.last_check = time.time()
+        try:
+            listing = await asyncio.wait_for(host.client.list(), self.health_timeout)
+        except Exception as exc:
+            if host.healthy:
+                print(f"Ollama host {host.url} is unhealthy: {exc.__class__.__name__}: {exc}")
+            host.healthy = False
+            host.last_error = f"{exc.__class__.__name__}: {exc}"
+            return
+        names = {m.get("model") or m.get("name") for m in listing.get("models") or []}
+        # "phi3:mini" is listed as is, "phi3" as "phi3:latest"
+        if host.model in names or f"{host.model}:latest" in names:
+            host.healthy = True
+        else:
+            host.healthy = False
+            host.last_error = f"model {host.model} is not pulled on this host"
+
+    async def check_all(self):
+        await asyncio.gather(*(self.check_host(h) for h in self.hosts))
+
+    async def _health_loop(self):
+        while True:
+            await self.check_all()
+            await asyncio.sleep(self.health_interval)
+
+    def start(self):
+        if self._health_task is None and self.health_interval > 0:
+            self._health_task = asyncio.ensure_future(self._health_loop())
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+
+    def stats(self) -> dict:
+        return {
+            "hosts": [h.stats() for h in self.hosts],
+            "healthy_hosts": sum(h.healthy for h in self.hosts),
+            "failovers": self.failovers,
+        }
@@ -0,0 +1,124 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+class QueueFullError(Exception):
+    """
+    Raised when all generation slots are busy and the wait queue is full.
+    """
+
+
+class Ticket:
+    """
+    A place in the generation queue. `granted` resolves once a slot is free.
+    """
+
+    def __init__(self, limiter, granted):
+        self._limiter = limiter
+        self.granted = granted
+        self._closed = False
+
+    def position(self) -> int:
+        """
+        1-based position in the wait queue, 0 once the slot is granted.
+        """
+        return self._limiter._position(self)
+
+    def cancel(self):
+        """
+        Leave the queue, or give the slot back if it was already granted.
+        Safe to call more than once.
+        """
+        if not self._closed:
+            self._closed = True
+            self._limiter._cancel(self)
+
+
+class GenerationLimiter:
+    """
+    Caps the number of concurrent LLM generations.
+
+    At most max_concurrent generations run at once; up to max_queue more
+    requests wait in FIFO order. Beyond that enqueue() raises
+    QueueFullError so the endpoint can answer 429 instead of letting the
+    latency of every request grow without limit.
+
+    All methods must be called from the event loop thread.
+    """
+
+    def __init__(self, max_concurrent: int = 2, max_queue: int = 16):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.active = 0
+        self.rejected = 0
+        self._waiters = deque()  # Tickets not yet granted
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def enqueue(self) -> Ticket:
+        loop = asyncio.get_running_loop()
+        ticket = Ticket(self, loop.create_future())
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            ticket.granted.set_result(True)
+            return ticket
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(f"{self.active} generations running, {len(self._waiters)} waiting")
+        self._waiters.append(ticket)
+        return ticket
+
+    def release(self):
+        self.active -= 1
+        while self._waiters and self.active < self.max_concurrent:
+            ticket = self._waiters.popleft()
+            if not ticket.granted.done():
+                self.active += 1
+                ticket.granted.set_result(True)
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Wait for a generation slot (raises QueueFullError when the queue is full).
+        """
+        ticket = self.enqueue()
+        try:
+            await ticket.granted
+        except BaseException:
+            ticket.cancel()
+            raise
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _position(self, ticket: Ticket) -> int:
+        if ticket.granted.done():
+            return 0
+        try:
+            return self._waiters.index(ticket) + 1
+        except ValueError:
+            return 0
+
+    def _cancel(self, ticket: Ticket):
+        if ticket.granted.done() and not ticket.granted.cancelled():
+            self.release()
+            return
+        # still waiting (or the await on it was cancelled): leave the queue
+        ticket.granted.cancel()
+        try:
+            self._waiters.remove(ticket)
+        except ValueError:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": len(self._waiters),
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,316 @@
+import re
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+TABLE_SEPARATOR_RE = re.compile(r"^\s*\|?\s*:?-{3,}")
+WHITESPACE_RE = re.compile(r"\s+")
+BLOCK_SEPARATOR = "\n\n"
+BREADCRUMB_SEPARATOR = " > "
+
+_token_encoding = None
+
+
+def get_token_encoding():
+    global _token_encoding
+    if _token_encoding is None:
+        import tiktoken
+        _token_encoding = tiktoken.get_encoding("cl100k_base")
+    return _token_encoding
+
+
+def get_length_function(unit: str = "chars"):
+    """
+    Return a function measuring text size in characters or tiktoken tokens.
+    """
+    if unit == "chars":
+        return len
+    if unit == "tokens":
+        encoding = get_token_encoding()
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    raise ValueError(f"Unknown chunk size unit: {unit!r} (expected 'chars' or 'tokens')")
+
+
+def _tail(text: str, size: int, unit: str) -> str:
+    """
+    Last `size` chars/tokens of text, starting at a word boundary for chars.
+    """
+    if size <= 0:
+        return ""
+    if unit == "tokens":
+        encoding = get_token_encoding()
+        tokens = encoding.encode(text, disallowed_special=())
+        return encoding.decode(tokens[-size:]).lstrip()
+    if len(text) <= size:
+        return text
+    # drop the partial word at the start; no whitespace at all means no useful overlap
+    match = WHITESPACE_RE.search(text, len(text) - size)
+    return text[match.end():] if match else ""
+
+
+def iter_blocks(lines):
+    """
+    Group Markdown lines into blocks in one pass.
+
+    Yields (kind, lines) with kind one of "frontmatter", "heading", "code",
+    "table" or "text". Headings inside code fences are not treated as
+    headings, and code blocks and tables are never split here.
+    """
+    buffer, kind = [], None
+    fence = None
+
+    start = 0
+    if lines and lines[0].strip() == "---":
+        # YAML front matter (Hugo handbook pages)
+        for end in range(1, len(lines)):
+            if lines[end].strip() == "---":
+                yield "frontmatter", lines[:end + 1]
+                start = end + 1
+                break
+
+    for line in lines[start:]:
+        if fence is not None:
+            buffer.append(line)
+            if line.strip().startswith(fence):
+                yield "code", buffer
+                buffer, kind, fence = [], None, None
+            continue
+
+        # cheap prefix checks first, the regexes only run on candidate lines
+        stripped = line.lstrip()
+        if stripped[:3] in ("```", "~~~"):
+            if buffer:
+                yield kind, buffer
+            buffer, kind, fence = [line], "code", stripped[:3]
+            continue
+
+        if line[:1] == "#" and HEADING_RE.match(line):
+            if buffer:
+                yield kind, buffer
+            buffer, kind = [], None
+            yield "heading", [line]
+            continue
+
+        if not stripped:
+            if buffer:
+                yield kind, buffer
+            buffer, kind = [], None
+            continue
+
+        line_kind = "table" if stripped[:1] == "|" else "text"
+        if buffer and kind != line_kind:
+            yield kind, buffer
+            buffer = []
+        buffer.append(line)
+        kind = line_kind
+
+    if buffer:
+        # an unclosed code fence still ends up here as one "code" block
+        yield kind, buffer
+
+
+def _frontmatter_title(lines):
+    for line in lines:
+        if line.startswith("title:"):
+            return line[len("title:"):].strip().strip("'\"") or None
+    return None
+
+
+class _Packer:
+    """
+    Packs blocks into chunks of at most chunk_size. Every block length is
+    measured once, so packing is linear in the size of the document.
+    """
+
+    def __init__(self, chunk_size: int, overlap: int, unit: str):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        if not 0 <= overlap < chunk_size:
+            raise ValueError("overlap must be >= 0 and smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.unit = unit
+        self.length = get_length_function(unit)
+        self.sep_len = self.length(BLOCK_SEPARATOR)
+
+        self.headings = []   # [(level, title)], level 0 = front matter title
+        self.buffer = []     # [(text, length, carryable)]
+        self.buffer_len = 0
+        self.carried = 0     # leading buffer entries carried over from the previous chunk
+        self.has_content = False  # buffer holds more than carried overlap
+        self.chunks = []
+
+    @property
+    def breadcrumb(self):
+        return [title for _, title in self.headings]
+
+    def set_heading(self, level: int, title: str, line: str):
+        self.flush(carry=False)
+        while self.headings and self.headings[-1][0] >= level:
+            self.headings.pop()
+        if not (self.headings and self.headings[-1][0] == 0 and self.headings[-1][1] == title):
+            self.headings.append((level, title))
+        self.add(line)
+        self.has_content = False  # a heading alone never becomes a chunk
+
+    def add(self, text: str, length: int = None, carryable: bool = True):
+        n = self.length(text) if length is None else length
+        extra = n + (self.sep_len if self.buffer else 0)
+        if self.buffer_len + extra > self.chunk_size and self.has_content:
+            self.flush(carry=True)
+            extra = n + (self.sep_len if self.buffer else 0)
+        if self.buffer_len + extra > self.chunk_size:
+            # carried overlap (or a lone heading) does not leave room for this block
+            self.buffer, self.buffer_len, self.carried = [], 0, 0
+            extra = n
+        self.buffer.append((text, n, carryable))
+        self.buffer_len += extra
+        self.has_content = True
+
+    def add_lines(self, lines, kind: str):
+        # only prose is repeated as overlap; a slice of a table or code block is noise
+        carryable = kind not in ("code", "table")
+        text = "\n".join(lines)
+        n = self.length(text)
+        if n <= self.chunk_size:
+            self.add(text, n, carryable)
+            return
+        for piece in self._split_oversized(lines, kind):
+            self.add(piece, carryable=carryable)
+
+    def _split_oversized(self, lines, kind: str):
+        """
+        Split a block larger than chunk_size at line boundaries. Code pieces
+        are re-fenced and table pieces repeat the header row, so every piece
+        is still valid Markdown on its own.
+        """
+        prefix, suffix, body = [], [], lines
+        if kind == "code" and len(lines) >= 2:
+            prefix, body = [lines[0]], lines[1:]
+            if FENCE_RE.match(body[-1]):
+                suffix, body = [body[-1]], body[:-1]
+            elif FENCE_RE.match(lines[0]):
+                suffix = [lines[0].strip()[:3]]
+        elif kind == "table" and len(lines) >= 2 and TABLE_SEPARATOR_RE.match(lines[1]):
+            prefix, body = lines[:2], lines[2:]
+
+        frame_len = sum(self.length(l) + 1 for l in prefix + suffix)
+        budget = self.chunk_size - frame_len
+        if budget <= self.chunk_size // 4:
+            # header/fence too large to repeat, split the raw lines instead
+            prefix, suffix, body, budget = [], [], lines, self.chunk_size
+
+        piece, piece_len = [], 0
+        for line in body:
+            for part in self._split_line(line, budget):
+                part_len = self.length(part) + 1
+                if piece and piece_len + part_len > budget:
+                    yield "\n".join(prefix + piece + suffix)
+                    piece, piece_len = [], 0
+                piece.append(part)
+                piece_len += part_len
+        if piece:
+            yield "\n".join(prefix + piece + suffix)
+
+    def _split_line(self, line: str, budget: int):
+        if self.length(line) < budget:
+            yield line
+            return
+        # a single huge line: wrap at word boundaries
+        part, part_len = [], 0
+        for word in line.split(" "):
+            for piece in self._split_word(word, budget - 1):
+                piece_len = self.length(piece) + 1
+                if part and part_len + piece_len > budget:
+                    yield " ".join(part)
+                    part, part_len = [], 0
+                part.append(piece)
+                part_len += piece_len
+        if part:
+            yield " ".join(part)
+
+    def _split_word(self, word: str, size: int):
+        """
+        Cut a word longer than size (a long URL, a base64 blob) into pieces
+        that fit; a token can span several characters, so in "tokens" mode
+        a piece that is still too long is halved again.
+        """
+        size = max(1, size)
+        if self.length(word) <= size:
+            yield word
+            return
+        for start in range(0, len(word), size):
+            piece = word[start:start + size]
+            if len(piece) > 1 and self.length(piece) > size:
+                half = len(piece) // 2
+                yield from self._split_word(piece[:half], size)
+                yield from self._split_word(piece[half:], size)
+            else:
+                yield piece
+
+    def flush(self, carry: bool):
+        if self.has_content:
+            joined = BLOCK_SEPARATOR.join(entry[0] for entry in self.buffer)
+            text = joined.strip()
+            if text:
+                # characters at the start of text repeated from the previous chunk
+                carried = BLOCK_SEPARATOR.join(entry[0] for entry in self.buffer[:self.carried])
+                leading = len(joined) - len(joined.lstrip())
+                breadcrumb = self.breadcrumb
+                self.chunks.append({
+                    "text": text,
+                    "headings": breadcrumb,
+                    "breadcrumb": BREADCRUMB_SEPARATOR.join(breadcrumb),
+                    "overlap_chars": min(len(text), max(0, len(carried.rstrip()) - leading)),
+                })
+
+        kept, kept_len = [], 0
+        if carry and self.overlap and self.buffer:
+            # keep trailing blocks that fit into the overlap window
+            for text, n, carryable in reversed(self.buffer):
+                if not carryable or kept_len + n + (self.sep_len if kept else 0) > self.overlap:
+                    break
+                kept.insert(0, (text, n, carryable))
+                kept_len += n + (self.sep_len if len(kept) > 1 else 0)
+            last_text, _, last_carryable = self.buffer[-1]
+            if not kept and last_carryable:
+                tail = _tail(last_text, self.overlap, self.unit)
+                if tail:
+                    kept, kept_len = [(tail, self.length(tail), True)], self.length(tail)
+
+        self.buffer, self.buffer_len, self.carried = kept, kept_len, len(kept)
+        self.has_content = False
+
+
+def split_markdown(text: str, chunk_size: int = 800, overlap: int = 0, unit: str = "chars"):
+    """
+    Heading-aware Markdown chunker.
+
+    - one linear pass over the text
+    - a new chunk starts at every heading; each chunk carries the heading
+      breadcrumb of its section (front matter title, #, ##, ...)
+    - code blocks and tables are kept whole when they fit, otherwise split
+      at line boundaries with the fence / header row repeated
+    - chunk_size and overlap are measured in "chars" or "tokens" (tiktoken)
+
+    Returns a list of dicts:
+    [{"text": "...", "headings": ["Title", "Section"], "breadcrumb": "Title > Section",
+      "overlap_chars": 0}, ...]
+    where overlap_chars is the length of the text repeated from the end of
+    the previous chunk.
+    """
+    packer = _Packer(chunk_size, overlap, unit)
+
+    for kind, lines in iter_blocks(text.splitlines()):
+        if kind == "heading":
+            match = HEADING_RE.match(lines[0])
+            packer.set_heading(len(match.group(1)), match.group(2), lines[0])
+        elif kind == "frontmatter":
+            title = _frontmatter_title(lines)
+            if title:
+                packer.headings = [(0, title)]
+            packer.add_lines(lines, kind)
+        else:
+            packer.add_lines(lines, kind)
+
+    packer.flush(carry=False)
+    return packer.chunks
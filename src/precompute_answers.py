@@ -0,0 +1,291 @@
+"""
+Offline answer precomputation for frequent questions.
+
+A large share of the traffic is a few hundred recurring HR questions. This
+job runs retrieval and generation for a question list ahead of time and
+writes the answers next to the index version they were computed against
+(versions/vNNNN/precomputed_answers.json, see index_versions.py). The API
+serves a question from that store, before embedding or retrieval, when the
+published index version has one; answers of older versions are never
+served. The index watcher in the API reruns this job after every swap.
+
+Questions come from a file (one per line, # starts a comment) and/or the
+most frequent questions in the question log the API writes when
+QUESTION_LOG_PATH is set.
+
+Usage (from the project root):
+    python src/precompute_answers.py --questions data/frequent_questions.txt
+    python src/precompute_answers.py --from-log data/question_log.jsonl --top 300 --concurrency 4
+"""
+import os
+os.environ["ANONYMIZED_TELEMETRY"] = "false"
+
+import argparse
+import asyncio
+import fcntl
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from embedding_cache import normalize_question
+import index_versions
+
+# ---------- config ----------
+BASE_DIR = Path(__file__).resolve().parent.parent
+CHROMA_PATH = Path(os.getenv("CHROMA_PATH", BASE_DIR / "data" / "chroma"))
+FORMAT_VERSION = 1
+# question sources: a question file, and the API's question log (JSON lines, off unless set)
+PRECOMPUTE_QUESTIONS = Path(os.getenv("PRECOMPUTE_QUESTIONS", BASE_DIR / "data" / "frequent_questions.txt"))
+QUESTION_LOG_PATH = os.getenv("QUESTION_LOG_PATH") or None
+PRECOMPUTE_TOP = int(os.getenv("PRECOMPUTE_TOP", "300"))              # most frequent logged questions used
+PRECOMPUTE_MIN_COUNT = int(os.getenv("PRECOMPUTE_MIN_COUNT", "2"))    # times a logged question must occur
+PRECOMPUTE_CONCURRENCY = int(os.getenv("PRECOMPUTE_CONCURRENCY", "2"))  # generations at once
+LOCK_PATH = CHROMA_PATH / "precompute.lock"  # one job at a time (the API's job and manual runs)
+
+
+# ---------- question sources ----------
+def load_questions(path: Path) -> list[str]:
+    lines = (line.strip() for line in Path(path).read_text(encoding="utf-8").splitlines())
+    return [line for line in lines if line and not line.startswith("#")]
+
+
+class QuestionLog:
+    """
+    Append-only JSON-lines log of the questions the API receives, the
+    input for --from-log. Lines are short and written with O_APPEND, so
+    several workers can share one file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.written = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def record(self, question: str, area: str = None):
+        line = json.dumps({"t": round(time.time(), 3), "question": question, "area": area}, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+            self._file.write(line + "\n")
+            self.written += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def frequent_questions(path: Path, top: int = PRECOMPUTE_TOP, min_count: int = PRECOMPUTE_MIN_COUNT) -> list[str]:
+    """
+    The top most frequent logged questions (by normalized text) that were
+    asked at least min_count times, each in its most common spelling.
+    Questions asked with an explicit area are skipped: precomputed answers
+    are only served to requests without one.
+    """
+    counts, spellings = Counter(), {}
+    with open(path, encoding="utf-8") as log:
+        for line in log:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+            if entry.get("area") or not entry.get("question"):
+                continue
+            key = normalize_question(entry["question"])
+            counts[key] += 1
+            spellings.setdefault(key, Counter())[entry["question"].strip()] += 1
+    return [spellings[key].most_common(1)[0][0] for key, n in counts.most_common(top) if n >= min_count]
+
+
+# ---------- store ----------
+class PrecomputedAnswers:
+    """
+    Read side of the answer store, used by the API.
+
+    lookup() returns the entry for a question if the published index version
+    has an answer for its normalized text. A new version (or a finished job)
+    is picked up without a restart, and answers computed against an older
+    version stop being served as soon as a new one is published: the
+    pointer file is stat()ed on every lookup, the store file only every
+    check_interval seconds.
+    """
+
+    def __init__(self, chroma_path: Path = CHROMA_PATH, check_interval: float = 2.0):
+        self.chroma_path = Path(chroma_path)
+        self.check_interval = check_interval
+        self.version = None
+        self._answers = {}
+        self._stamp = None
+        self._pointer_stamp = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._answers)
+
+    def refresh(self):
+        now = time.monotonic()
+        pointer_stamp = index_versions.pointer_stamp(self.chroma_path)
+        if pointer_stamp == self._pointer_stamp and now - self._checked_at < self.check_interval:
+            return
+        self._pointer_stamp, self._checked_at = pointer_stamp, now
+        current = index_versions.read_current(self.chroma_path)
+        if current is None:
+            self.version, self._answers, self._stamp = None, {}, None
+            return
+        path = index_versions.version_paths(self.chroma_path, current["version"])["answers"]
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            self.version, self._answers, self._stamp = current["version"], {}, None
+            return
+        stamp = (current["version"], stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp:
+            return
+        self.version, self._answers, self._stamp = current["version"], {}, stamp
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            print(f"Could not read precomputed answers {path}: {exc!r}")
+            return
+        if data.get("format") != FORMAT_VERSION or data.get("index_version") != current["version"]:
+            print(f"Ignoring precomputed answers {path}: written for another format or index version.")
+            return
+        self.version, self._answers, self._stamp = current["version"], data["answers"], stamp
+        print(f"Loaded {len(self._answers)} precomputed answer(s) for index version {self.version}.")
+
+    def lookup(self, question: str):
+        """
+        The {"question", "answer", "sources", ...} entry or None.
+        """
+        self.refresh()
+        if not self._answers:
+            return None
+        entry = self._answers.get(normalize_question(question))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def stats(self) -> dict:
+        self.refresh()
+        lookups = self.hits + self.misses
+        return {
+            "index_version": self.version,
+            "answers": len(self._answers),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def write_answers(path: Path, version: int, answers: dict, stats: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {
+        "format": FORMAT_VERSION,
+        "index_version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "stats": stats,
+        "answers": answers,
+    }
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(data, indent=1, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, path)  # the API never reads a half-written store
+
+
+# ---------- job ----------
+async def precompute(questions: list[str], concurrency: int = PRECOMPUTE_CONCURRENCY):
+    """
+    Answer every question exactly as /chat would (same relevance gate,
+    context packing and prompt), through api_server.answer_batch: one
+    batched retrieval, at most concurrency generations at once. Returns
+    (index version, answers keyed by normalized question, stats).
+    """
+    import api_server as api
+
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, api.engine.warm_up)
+    version = (await loop.run_in_executor(None, api.engine.health)).get("index_version")
+
+    stats = {"questions": len(questions), "answered": 0, "off_topic": 0, "failed": 0, "generation_s": 0.0}
+    answers = {}
+    async for item in api.answer_batch(questions, concurrency=concurrency):
+        if "error" in item:
+            stats["failed"] += 1
+            print(f"  failed: {item['question']!r}: {item['error']}")
+            continue
+        if not item["sources"]:
+            stats["off_topic"] += 1  # answered without the LLM anyway
+            continue
+        stats["answered"] += 1
+        stats["generation_s"] += item["seconds"]
+        answers[normalize_question(item["question"])] = {
+            "question": item["question"],
+            "answer": item["answer"],
+            "sources": item["sources"],
+            "generation_s": item["seconds"],
+        }
+        print(f"  [{stats['answered'] + stats['failed']}/{len(questions)}] {item['question']} ({item['seconds']:.1f}s)")
+    stats["generation_s"] = round(stats["generation_s"], 3)
+    return version, answers, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=Path, default=PRECOMPUTE_QUESTIONS, help="question file")
+    parser.add_argument("--from-log", type=Path, default=QUESTION_LOG_PATH, help="question log of the API")
+    parser.add_argument("--top", type=int, default=PRECOMPUTE_TOP, help="most frequent logged questions")
+    parser.add_argument("--min-count", type=int, default=PRECOMPUTE_MIN_COUNT, help="min. occurrences in the log")
+    parser.add_argument("--concurrency", type=int, default=PRECOMPUTE_CONCURRENCY, help="generations at once")
+    parser.add_argument("--force", action="store_true", help="recompute even if the current version has answers")
+    args = parser.parse_args()
+
+    questions = []
+    if args.questions and args.questions.exists():
+        questions += load_questions(args.questions)
+    if args.from_log and Path(args.from_log).exists():
+        questions += frequent_questions(args.from_log, args.top, args.min_count)
+    unique = {}
+    for question in questions:
+        unique.setdefault(normalize_question(question), question)
+    questions = list(unique.values())
+    if not questions:
+        print("No questions to precompute (see --questions and --from-log).")
+        return
+
+    CHROMA_PATH.mkdir(parents=True, exist_ok=True)
+    with open(LOCK_PATH, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)  # another worker's job for the same version may be running
+        current = index_versions.read_current(CHROMA_PATH)
+        if current is None:
+            sys.exit("Precomputed answers need a versioned index, run src/ingest_md.py first.")
+        path = index_versions.version_paths(CHROMA_PATH, current["version"])["answers"]
+        if path.exists() and not args.force:
+            print(f"Index version {current['version']} already has precomputed answers ({path}).")
+            return
+
+        print(f"Precomputing {len(questions)} answer(s) for index version {current['version']} "
+              f"with concurrency {args.concurrency}...")
+        start = time.perf_counter()
+        version, answers, stats = asyncio.run(precompute(questions, args.concurrency))
+        if version != current["version"]:
+            # a new version was published while the engine opened; its own job will run
+            sys.exit(f"Index version changed to {version} during the job, answers discarded.")
+        stats["seconds"] = round(time.perf_counter() - start, 3)
+        write_answers(path, version, answers, stats)
+        print(f"Wrote {len(answers)} answer(s) to {path}: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,70 +1,31 @@
-import os
-from pathlib import Path
-
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
-import ollama
+from retrieval_engine import get_engine
 
 # ----- Config -----
-BASE_DIR = Path(__file__).resolve().parent.parent   # .../hr_rag_chatbot
-CHROMA_PATH = BASE_DIR / "data" / "chroma"
-
-EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 LLM_MODEL_NAME = "phi3:mini"   # your Ollama model
 
 
-# ----- Embedding model (same as ingest) -----
-embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
-
-
-def get_chroma_collection():
+def get_retrieval_engine():
     """
-    Load the existing Chroma collection with the embedded HR chunks.
+    Open the shared retrieval engine (Chroma collection + embedding model).
     """
-    client = chromadb.PersistentClient(
-        path=str(CHROMA_PATH),
-        settings=Settings(allow_reset=True),
-    )
-
-    collection = client.get_or_create_collection(
-        name="hr-policies",
-        metadata={"description": "GitLab Handbook HR section (markdown chunks)"}
-    )
+    return get_engine().open()
 
-    return collection
 
-
-def retrieve_chunks(collection, question: str, top_k: int = 3):
+def retrieve_chunks(engine, question: str, top_k: int = 3):
     """
     Turn the question into an embedding and retrieve the top_k most similar chunks.
     Returns a list of dicts with id, source, chunk_index, content.
     """
-    # 1) Embed question
-    query_embedding = embedding_model.encode([question]).tolist()
-
-    # 2) Query Chroma using embeddings
-    results = collection.query(
-        query_embeddings=query_embedding,
-        n_results=top_k,
-        include=["documents", "metadatas"],  # <- IMPORTANT: no "ids" here
-    )
-
-    # If nothing found
-    if not results.get("documents") or not results["documents"]:
-        return []
-
-    docs = results["documents"][0]      # list of texts
-    metas = results["metadatas"][0]     # list of metadata dicts
-    ids = results["ids"][0]             # ids are always returned, no need to "include" them
+    hits = engine.query(question, top_k=top_k)
 
     chunks = []
-    for doc_id, doc_text, meta in zip(ids, docs, metas):
+    for hit in hits:
+        meta = hit["metadata"]
         chunks.append({
-            "id": doc_id,
+            "id": hit["id"],
             "source": meta.get("source", ""),
             "chunk_index": meta.get("chunk_index"),
-            "content": doc_text,
+            "content": hit["content"],
         })
 
     return chunks
@@ -106,6 +67,9 @@ def generate_answer_with_ollama(question: str, chunks) -> str:
         f"Context from HR policies:\n{context_text}"
     )
 
+    # imported on first use, so the chat starts without loading the ollama client
+    import ollama
+
     response = ollama.chat(
         model=LLM_MODEL_NAME,
         messages=[
@@ -118,7 +82,7 @@ def generate_answer_with_ollama(question: str, chunks) -> str:
 
 
 def main():
-    collection = get_chroma_collection()
+    engine = get_retrieval_engine()
     print("HR RAG chat with Ollama (local LLM). Type 'exit' or 'quit' to stop.\n")
 
     while True:
@@ -131,7 +95,7 @@ def main():
             break
 
         # 1) Retrieve chunks from Chroma
-        chunks = retrieve_chunks(collection, question, top_k=3)
+        chunks = retrieve_chunks(engine, question, top_k=3)
 
         # 2) Generate answer with local LLM
         answer = generate_answer_with_ollama(question, chunks)
@@ -145,6 +109,9 @@ def main():
                 print(f"- {ch['source']} (chunk {ch['chunk_index']})")
         print("-" * 60)
 
+    # persists the query-embedding cache if EMBED_CACHE_PATH is set
+    engine.close()
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,107 @@
+import json
+import sys
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+
+
+class SlowRequestProfiler:
+    """
+    Low-overhead sampling profiler for slow requests.
+
+    While at least one request is in flight, a daemon thread samples the
+    stacks of all threads every interval_ms (sys._current_frames) into a
+    bounded ring buffer. When a request finishes slower than threshold_ms,
+    the samples taken during that request are folded into collapsed stacks
+    ("frame;frame;frame count", the flamegraph.pl / speedscope input format)
+    and written to dump_dir together with the request's stage timings.
+
+    Samples cover every thread, so a dump also shows what the embedding
+    executor and the event loop were doing while the request was slow.
+    """
+
+    def __init__(self, threshold_ms: float, dump_dir: Path, interval_ms: float = 10.0,
+                 max_samples: int = 20000, max_dumps: int = 200):
+        self.threshold = threshold_ms / 1000
+        self.dump_dir = Path(dump_dir)
+        self.interval = interval_ms / 1000
+        self.max_dumps = max_dumps
+
+        self._samples = deque(maxlen=max_samples)  # (timestamp, [stack tuple per thread])
+        self._active = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.dumps = 0
+
+    # ---------- request lifecycle ----------
+    def begin(self):
+        with self._lock:
+            self._active += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def end(self, started_wall: float, duration: float, info: dict):
+        """
+        Finish one request; dumps a profile if it was slower than the threshold.
+        Returns the dump path or None.
+        """
+        with self._lock:
+            self._active = max(0, self._active - 1)
+            if self._active == 0:
+                self._wake.clear()
+        if duration < self.threshold or self.dumps >= self.max_dumps:
+            return None
+        return self._dump(started_wall, started_wall + duration, duration, info)
+
+    # ---------- sampling ----------
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            self._wake.wait()
+            frames = sys._current_frames()
+            stacks = [self._collapse(frame) for ident, frame in frames.items() if ident != own_id]
+            self._samples.append((time.time(), stacks))
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _collapse(frame) -> tuple:
+        """
+        Stack of frame as ((filename, lineno, function), ...), outermost
+        first. Only reads frame attributes; formatting waits for _dump().
+        """
+        entries = []
+        while frame is not None:
+            code = frame.f_code
+            entries.append((code.co_filename, frame.f_lineno, code.co_name))
+            frame = frame.f_back
+        entries.reverse()
+        return tuple(entries)
+
+    @staticmethod
+    def _format(stack: tuple) -> str:
+        return ";".join(f"{Path(filename).name}:{name}:{lineno}" for filename, lineno, name in stack)
+
+    def _dump(self, start: float, end: float, duration: float, info: dict):
+        stacks = Counter()
+        samples = 0
+        for ts, sample in list(self._samples):
+            if start <= ts <= end:
+                samples += 1
+                stacks.update(sample)
+
+        self.dump_dir.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(start))
+        path = self.dump_dir / f"slow-{stamp}-{int(duration * 1000)}ms-{self.dumps}.json"
+        path.write_text(json.dumps({
+            **info,
+            "duration_ms": round(duration * 1000, 1),
+            "interval_ms": self.interval * 1000,
+            "samples": samples,
+            "collapsed_stacks": [f"{self._format(stack)} {count}" for stack, count in stacks.most_common()],
+        }, indent=2), encoding="utf-8")
+        self.dumps += 1
+        return path
@@ -0,0 +1,469 @@
+import os
+os.environ["ANONYMIZED_TELEMETRY"] = "false"
+
+import threading
+import time
+from pathlib import Path
+
+# chromadb and sentence_transformers (torch) are imported in open(): importing
+# them takes seconds, and scripts that only need the config should not pay for it
+from area_router import AreaRouter
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from embedding_cache import CachedEncoder, EmbeddingCache
+import index_versions
+from vector_store import create_vector_store
+
+# ---------- config ----------
+BASE_DIR = Path(__file__).resolve().parent.parent
+CHROMA_PATH = Path(os.getenv("CHROMA_PATH", BASE_DIR / "data" / "chroma"))
+COLLECTION_NAME = "hr-policies"
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+WARMUP_TEXT = "How many vacation days do I have?"  # encoded once by warm_up()
+
+# "chroma" queries the collection directly, "numpy" loads it into memory for exact search,
+# "quantized" memory-maps the chunk store written by ingest_md.py (Chroma is not opened)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+# optional directory for a memory-mapped copy of the numpy index
+VECTOR_MMAP_DIR = os.getenv("VECTOR_MMAP_DIR") or None
+CHUNK_STORE_PATH = Path(os.getenv("CHUNK_STORE_PATH", CHROMA_PATH / "chunk_store"))
+
+# query-embedding cache: max entries, TTL in seconds (0 = none), optional JSON file
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "2048"))
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", "86400"))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH") or None
+
+# "hybrid" fuses the vector results with the BM25 index written by ingest_md.py
+# (reciprocal rank fusion), "vector" uses embeddings only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+BM25_INDEX_PATH = Path(os.getenv("BM25_INDEX_PATH", CHROMA_PATH / "bm25_index.npz"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "10"))  # candidates per retriever before fusion
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# query routing by policy area (area_router.py, written by ingest_md.py): search only the
+# AREA_ROUTE_TOP nearest areas (0 = search every area unless the request names one), and of
+# those only the ones whose centroid similarity is within AREA_ROUTE_MARGIN of the nearest.
+# Off by default; measure recall with benchmarks/bench_routing.py before turning it on
+AREA_ROUTER_PATH = Path(os.getenv("AREA_ROUTER_PATH", CHROMA_PATH / "area_router.npz"))
+AREA_ROUTE_TOP = int(os.getenv("AREA_ROUTE_TOP", "0"))
+AREA_ROUTE_MARGIN = float(os.getenv("AREA_ROUTE_MARGIN", "0.05"))
+
+
+class IndexSnapshot:
+    """
+    One index version as the engine serves it: the collection handle, the
+    vector store, the BM25 index and the area router. Never modified after
+    creation; a reload builds a new snapshot and swaps the engine's
+    reference, so a query that already holds the old snapshot finishes on it.
+    """
+
+    def __init__(self, version, collection, store, lexical, router=None):
+        self.version = version  # None for the unversioned layout of older ingest runs
+        self.collection = collection
+        self.store = store
+        self.lexical = lexical
+        self.router = router  # None if the index has no policy areas
+        self.opened_at = time.time()
+
+
+class RetrievalEngine:
+    """
+    Long-lived retrieval engine shared by the API server and the CLI scripts.
+
+    The Chroma client, the collection handle, the vector store (see
+    vector_store.py, selected with VECTOR_BACKEND) and the embedding model
+    are created once in open() and reused for every query. The "quantized"
+    backend reads only the chunk store (chunk_store.py), so the Chroma
+    client is not created at all. In "hybrid" mode
+    the BM25 index (bm25_index.py) is loaded as well and its ranking is fused
+    with the vector ranking.
+
+    Chunks are partitioned by policy area. A query either names its area
+    or is routed to the nearest AREA_ROUTE_TOP areas by the area router
+    (area_router.py), and only those partitions are searched.
+
+    The engine serves the index version published by ingest_md.py (see
+    index_versions.py). reload() opens a newly published version next to
+    the current one and swaps it in with a single reference assignment.
+    open()/close()/reload() are guarded by a lock; queries run without
+    locking because the Chroma client and SentenceTransformer.encode are
+    safe to call from several threads at once.
+    """
+
+    def __init__(
+        self,
+        chroma_path: Path = CHROMA_PATH,
+        collection_name: str = COLLECTION_NAME,
+        model_name: str = EMBEDDING_MODEL_NAME,
+        backend: str = VECTOR_BACKEND,
+        mmap_dir: Path = VECTOR_MMAP_DIR,
+        mode: str = RETRIEVAL_MODE,
+        lexical_path: Path = BM25_INDEX_PATH,
+        store_path: Path = CHUNK_STORE_PATH,
+        router_path: Path = AREA_ROUTER_PATH,
+        route_top: int = AREA_ROUTE_TOP,
+        route_margin: float = AREA_ROUTE_MARGIN,
+    ):
+        self.chroma_path = Path(chroma_path)
+        self.collection_name = collection_name
+        self.model_name = model_name
+        self.backend = backend
+        self.mmap_dir = Path(mmap_dir) if mmap_dir else None
+        self.mode = mode
+        self.lexical_path = Path(lexical_path)
+        self.store_path = Path(store_path)
+        self.router_path = Path(router_path)
+        self.route_top = route_top
+        self.route_margin = route_margin
+        self.embedding_cache = EmbeddingCache(EMBED_CACHE_SIZE, EMBED_CACHE_TTL, EMBED_CACHE_PATH)
+
+        self._lock = threading.Lock()
+        self._client = None
+        self._index = None
+        self._pointer_stamp = None
+        self._model = None
+        self._encoder = None
+        self._opened_at = None
+        self._last_error = None
+        self.swaps = 0
+        # queries by area selection, and chunks searched vs. chunks in the index
+        self.routing = {"explicit": 0, "routed": 0, "unrouted": 0, "searched_chunks": 0, "total_chunks": 0}
+        self.warmup_seconds = None  # set by warm_up()
+
+    # ---------- lifecycle ----------
+    def open(self):
+        """
+        Open the Chroma client, the current index version and the embedding
+        model. Calling open() on an engine that is already open is a no-op.
+        """
+        with self._lock:
+            if self._index is not None:
+                return self
+            try:
+                from sentence_transformers import SentenceTransformer
+
+                if self.backend != "quantized":
+                    import chromadb
+                    from chromadb.config import Settings
+
+                    self.chroma_path.mkdir(parents=True, exist_ok=True)
+                    self._client = self._client or chromadb.PersistentClient(
+                        path=str(self.chroma_path),
+                        settings=Settings(allow_reset=True),
+                    )
+                self._pointer_stamp = index_versions.pointer_stamp(self.chroma_path)
+                index = self._open_index(index_versions.read_current(self.chroma_path))
+                model = self._model or SentenceTransformer(self.model_name)
+            except Exception as exc:
+                self._last_error = repr(exc)
+                raise
+
+            self._index = index
+            if self._encoder is None:
+                self.embedding_cache.load(self.model_name)
+            self._model = model
+            self._encoder = CachedEncoder(model, self.embedding_cache)
+            self._opened_at = time.time()
+            self._last_error = None
+        return self
+
+    def _open_index(self, current) -> IndexSnapshot:
+        """
+        Open the version described by the pointer (see
+        index_versions.read_current), or the unversioned collection and files
+        when there is none.
+        """
+        if current is None:
+            version, name = None, self.collection_name
+            lexical_path, store_path, mmap_dir = self.lexical_path, self.store_path, self.mmap_dir
+            router_path = self.router_path
+        else:
+            version, name = current["version"], current["collection"]
+            paths = index_versions.version_paths(self.chroma_path, version)
+            lexical_path, store_path, router_path = paths["lexical"], paths["store"], paths["router"]
+            mmap_dir = self.mmap_dir / f"v{version}" if self.mmap_dir else None
+        collection = None if self._client is None else self._client.get_or_create_collection(name=name)
+        store = create_vector_store(self.backend, collection, mmap_dir, store_path)
+        router = AreaRouter.load(router_path) if router_path.exists() else None
+        return IndexSnapshot(version, collection, store, self._load_lexical(lexical_path), router)
+
+    def reload(self) -> bool:
+        """
+        Swap in the index version published since the last open()/reload().
+        The new version is opened and warmed up while queries keep using the
+        current one; on failure the current one stays. Returns True if the
+        engine now serves a new version. Cheap when nothing was published.
+        """
+        if self._index is None:
+            self.open()
+            return True
+        stamp = index_versions.pointer_stamp(self.chroma_path)
+        if stamp == self._pointer_stamp:
+            return False
+        with self._lock:
+            if stamp == self._pointer_stamp or self._index is None:
+                return False
+            current = index_versions.read_current(self.chroma_path)
+            old = self._index
+            if current is not None and current["version"] == old.version:
+                self._pointer_stamp = stamp
+                return False
+            try:
+                index = self._open_index(current)
+                if index.store.count():
+                    embedding = self._model.encode([WARMUP_TEXT], show_progress_bar=False)[0]
+                    index.store.query([list(map(float, embedding))], top_k=1)
+            except Exception as exc:
+                self._last_error = repr(exc)
+                print(f"Could not open index version {current and current['version']}: {exc!r}, "
+                      f"still serving version {old.version}.")
+                return False
+            self._index = index  # queries that started before keep their reference to old
+            self._pointer_stamp = stamp
+            self.swaps += 1
+            self._last_error = None
+        print(f"Retrieval engine switched from index version {old.version} to {index.version} "
+              f"({index.store.count()} chunks).")
+        return True
+
+    def warm_up(self):
+        """
+        Open the engine if needed, then run one dummy encode and one store
+        query, so the first real request does not pay for lazy
+        initialization (weights paged in, kernels and the HNSW index loaded).
+        The dummy encode bypasses the embedding cache.
+        """
+        start = time.perf_counter()
+        self.open()
+        try:
+            embedding = self._model.encode([WARMUP_TEXT], show_progress_bar=False)[0]
+            if self._index.store.count():
+                self._index.store.query([list(map(float, embedding))], top_k=1)
+        except Exception as exc:
+            self._last_error = repr(exc)
+            raise
+        self.warmup_seconds = round(time.perf_counter() - start, 3)
+        return self
+
+    def close(self):
+        """
+        Drop the index and client handles and persist the embedding cache.
+        The embedding model is kept so a later open() does not have to load
+        it again.
+        """
+        self.embedding_cache.save(self.model_name)
+        with self._lock:
+            self._index = None
+            self._client = None
+            self._opened_at = None
+
+    def _load_lexical(self, path: Path):
+        if self.mode == "vector":
+            return None
+        if self.mode != "hybrid":
+            raise ValueError(f"Unknown retrieval mode: {self.mode!r} (expected 'hybrid' or 'vector')")
+        if not path.exists():
+            print(f"No BM25 index at {path}, using vector retrieval only (run ingest_md.py).")
+            return None
+        return BM25Index.load(path)
+
+    @property
+    def is_ready(self) -> bool:
+        return self._index is not None and self._model is not None
+
+    @property
+    def index(self) -> IndexSnapshot:
+        if self._index is None:
+            self.open()
+        return self._index
+
+    @property
+    def collection(self):
+        # None with the "quantized" backend
+        return self.index.collection
+
+    @property
+    def store(self):
+        return self.index.store
+
+    @property
+    def embedding_model(self):
+        if self._model is None:
+            self.open()
+        return self._model
+
+    @property
+    def encoder(self) -> CachedEncoder:
+        if self._encoder is None:
+            self.open()
+        return self._encoder
+
+    # ---------- health ----------
+    def health(self) -> dict:
+        """
+        Liveness information. Never raises, so it can back a /health endpoint.
+        """
+        index = self._index
+        return {
+            "status": "ok" if self._last_error is None else "error",
+            "ready": self.is_ready,
+            "collection": self.collection_name,
+            "backend": self.backend,
+            "retrieval": "hybrid" if index is not None and index.lexical is not None else "vector",
+            "index_version": index.version if index is not None else None,
+            "index_swaps": self.swaps,
+            "areas": index.router.stats() if index is not None and index.router is not None else {},
+            "routing": self.routing_stats(),
+            "embedding_cache": self.embedding_cache.stats(),
+            "uptime_s": round(time.time() - self._opened_at, 1) if self._opened_at else 0.0,
+            "warmup_s": self.warmup_seconds,
+            "last_error": self._last_error,
+        }
+
+    def readiness(self) -> dict:
+        """
+        Readiness information: the engine is open and the collection can be
+        read. The chunk count is included so an empty index is visible.
+        """
+        if not self.is_ready:
+            return {"ready": False, "reason": "engine not opened", "chunks": 0}
+        try:
+            count = self._index.store.count()
+        except Exception as exc:
+            self._last_error = repr(exc)
+            return {"ready": False, "reason": repr(exc), "chunks": 0}
+        return {"ready": True, "reason": None, "chunks": count}
+
+    def routing_stats(self) -> dict:
+        total = self.routing["total_chunks"]
+        return {
+            "route_top": self.route_top,
+            "route_margin": self.route_margin,
+            **self.routing,
+            "searched_fraction": round(self.routing["searched_chunks"] / total, 4) if total else None,
+        }
+
+    # ---------- areas ----------
+    def areas(self) -> list[str]:
+        """
+        Policy areas of the current index version ([] if it has none).
+        """
+        router = self.index.router
+        return list(router.areas) if router is not None else []
+
+    def route(self, index: IndexSnapshot, query_embedding, area: str = None):
+        """
+        The areas to search for one query: [area] if the caller named one,
+        else the router's choice, else None (every area).
+        """
+        router = index.router
+        if area is not None:
+            areas, kind = [area], "explicit"
+        elif router is not None and self.route_top > 0:
+            areas = router.route(query_embedding, self.route_top, self.route_margin)
+            kind = "routed" if areas is not None else "unrouted"
+        else:
+            areas, kind = None, "unrouted"
+        self.routing[kind] += 1
+        if router is not None:
+            counts = router.stats()
+            total = sum(counts.values())
+            self.routing["total_chunks"] += total
+            self.routing["searched_chunks"] += total if areas is None else sum(counts.get(a, 0) for a in areas)
+        return areas
+
+    # ---------- queries ----------
+    def embed(self, text: str) -> list[float]:
+        """
+        Turn a single question into one embedding vector. Repeated questions
+        (up to case, whitespace and trailing punctuation) come from the cache.
+        """
+        return self.encoder.encode_one(text)
+
+    def query(self, question: str, top_k: int = 3, area: str = None):
+        """
+        Embed the question and return the top_k most similar chunks, from
+        the given policy area or the areas the router picks.
+
+        Returns a list of dicts:
+        [{"id": "...::chunk-0", "content": "...", "metadata": {...}}, ...]
+        """
+        return self.query_embedding(self.embed(question), top_k=top_k, question=question, area=area)
+
+    def query_embedding(self, query_embedding: list[float], top_k: int = 3, question: str = None,
+                        area: str = None):
+        """
+        Same as query(), for callers that already have the question embedding.
+        Without the question text only the vector ranking is used.
+        """
+        index = self.index  # one version for the whole query, even if a swap happens meanwhile
+        areas = self.route(index, query_embedding, area)
+        if question is None or index.lexical is None:
+            return index.store.query([query_embedding], top_k=top_k, areas=areas)[0]
+        vector_hits = index.store.query([query_embedding], top_k=max(top_k, HYBRID_CANDIDATES), areas=areas)[0]
+        return self._fuse(index, question, vector_hits, top_k, areas)
+
+    def query_batch(self, questions: list[str], top_k: int = 3, area: str = None):
+        """
+        Embed several questions in one encode() call and search them with
+        query_embeddings(). Returns one hit list per question.
+        """
+        if not questions:
+            return []
+        return self.query_embeddings(self.encoder.encode_many(questions), top_k, questions, area)
+
+    def query_embeddings(self, embeddings, top_k: int = 3, questions: list[str] = None, area: str = None):
+        """
+        query_embedding() for several questions at once: one store query
+        (for "chroma" a single multi-query collection.query) per distinct
+        area selection. Returns one hit list per embedding.
+        """
+        if not embeddings:
+            return []
+        index = self.index
+        groups = {}  # area selection -> positions of its questions
+        for i, embedding in enumerate(embeddings):
+            areas = self.route(index, embedding, area)
+            groups.setdefault(tuple(areas) if areas is not None else None, []).append(i)
+
+        results = [None] * len(embeddings)
+        hybrid = questions is not None and index.lexical is not None
+        candidates = max(top_k, HYBRID_CANDIDATES) if hybrid else top_k
+        for areas, positions in groups.items():
+            areas = list(areas) if areas is not None else None
+            hit_lists = index.store.query([embeddings[i] for i in positions], top_k=candidates, areas=areas)
+            for i, hits in zip(positions, hit_lists):
+                results[i] = self._fuse(index, questions[i], hits, top_k, areas) if hybrid else hits
+        return results
+
+    @staticmethod
+    def _fuse(index: IndexSnapshot, question: str, vector_hits, top_k: int, areas=None):
+        """
+        Reciprocal rank fusion of the vector hits and the BM25 ranking.
+        Chunks found only by BM25 are fetched from the store.
+        """
+        lexical = index.lexical.search(question, HYBRID_CANDIDATES, areas)
+        lexical_ids = [chunk_id for chunk_id, _ in lexical]
+        fused = reciprocal_rank_fusion([[hit["id"] for hit in vector_hits], lexical_ids], RRF_K)[:top_k]
+        by_id = {hit["id"]: hit for hit in vector_hits}
+        missing = [chunk_id for chunk_id in fused if chunk_id not in by_id]
+        # a BM25 index without areas cannot filter, so check the fetched chunks
+        by_id.update((hit["id"], hit) for hit in index.store.get(missing)
+                     if areas is None or hit["metadata"].get("area") in areas)
+        return [by_id[chunk_id] for chunk_id in fused if chunk_id in by_id]
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> RetrievalEngine:
+    """
+    Return the process-wide RetrievalEngine, creating it on first use.
+    The engine is not opened here; call open() (or just query it).
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = RetrievalEngine()
+    return _engine
@@ -0,0 +1,342 @@
+"""
+Embedding and retrieval sidecar shared by several API worker processes.
+
+One process holds the embedding model, the embedding cache and the index,
+and serves requests from all uvicorn workers over a local Unix socket.
+Question embeddings from all workers are micro-batched together. The
+workers then never import torch or chromadb, so they start in well under a
+second, and memory no longer grows by one model per worker.
+
+Start it before the API (from the project root):
+    python src/retrieval_sidecar.py [--socket data/retrieval.sock]
+    RETRIEVAL_SOCKET=data/retrieval.sock uvicorn --app-dir src api_server:app --workers 4
+
+Protocol: each message is a 4-byte big-endian length followed by a UTF-8
+JSON object. A request has an "op" field and gets exactly one response,
+{"result": ...} or {"error": "..."}.
+"""
+import os
+os.environ["ANONYMIZED_TELEMETRY"] = "false"
+
+import argparse
+import asyncio
+import json
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from embedding_batcher import EmbeddingBatcher
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SOCKET_PATH = Path(os.getenv("RETRIEVAL_SOCKET", BASE_DIR / "data" / "retrieval.sock"))
+SIDECAR_WORKERS = int(os.getenv("SIDECAR_WORKERS", "4"))  # threads for encode() and index queries
+SIDECAR_CONNECT_TIMEOUT = float(os.getenv("SIDECAR_CONNECT_TIMEOUT", "120"))  # seconds to wait for the sidecar
+
+_HEADER = struct.Struct(">I")
+
+
+class SidecarError(Exception):
+    """
+    Raised by the client when the sidecar answers a request with an error.
+    """
+
+
+# ---------- framing ----------
+def encode_message(obj) -> bytes:
+    payload = json.dumps(obj, separators=(",", ":")).encode("utf-8")
+    return _HEADER.pack(len(payload)) + payload
+
+
+async def read_message(reader: asyncio.StreamReader):
+    header = await reader.readexactly(_HEADER.size)
+    (size,) = _HEADER.unpack(header)
+    return json.loads(await reader.readexactly(size))
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks, remaining = [], size
+    while remaining:
+        chunk = sock.recv(min(remaining, 1 << 20))
+        if not chunk:
+            raise ConnectionError("retrieval sidecar closed the connection")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+# ---------- server ----------
+class SidecarServer:
+    """
+    Serves one RetrievalEngine over a Unix socket. Embeddings go through an
+    EmbeddingBatcher, so concurrent questions from all workers share
+    encode() calls; index queries run on a thread pool.
+    """
+
+    def __init__(self, engine, socket_path: Path = SOCKET_PATH, workers: int = SIDECAR_WORKERS,
+                 window_ms: float = 5.0, max_batch: int = 32):
+        self.engine = engine
+        self.socket_path = Path(socket_path)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sidecar")
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self.batcher = None
+        self.connections = 0
+        self.requests = 0
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.engine.warm_up)
+        self.batcher = EmbeddingBatcher(self.engine.encoder, self.executor, self.window_ms, self.max_batch)
+
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.socket_path.exists():
+            self.socket_path.unlink()  # left over from a previous run
+        server = await asyncio.start_unix_server(self._handle, path=str(self.socket_path))
+        print(f"Retrieval sidecar listening on {self.socket_path} (warm-up {self.engine.warmup_seconds:.2f}s)")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    request = await read_message(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                self.requests += 1
+                try:
+                    response = {"result": await self._dispatch(request)}
+                except Exception as exc:
+                    response = {"error": f"{exc.__class__.__name__}: {exc}"}
+                writer.write(encode_message(response))
+                await writer.drain()
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _dispatch(self, request):
+        op = request.get("op")
+        loop = asyncio.get_running_loop()
+        if op == "embed":
+            return await asyncio.gather(*(self.batcher.embed(text) for text in request["texts"]))
+        if op == "query":
+            return await loop.run_in_executor(
+                self.executor,
+                lambda: self.engine.query_embedding(request["embedding"], request.get("top_k", 3),
+                                                    request.get("question"), request.get("area")),
+            )
+        if op == "query_batch":
+            return await loop.run_in_executor(
+                self.executor,
+                lambda: self.engine.query_embeddings(request["embeddings"], request.get("top_k", 3),
+                                                     request.get("questions"), request.get("area")),
+            )
+        if op == "areas":
+            return self.engine.areas()
+        if op == "health":
+            return {**self.engine.health(), "sidecar": self.stats()}
+        if op == "readiness":
+            return self.engine.readiness()
+        if op == "reload":
+            return await loop.run_in_executor(self.executor, self.engine.reload)
+        if op == "cache_stats":
+            return self.engine.embedding_cache.stats()
+        raise ValueError(f"unknown op {op!r}")
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "socket": str(self.socket_path),
+            "connections": self.connections,
+            "requests": self.requests,
+            "embedding_batcher": self.batcher.stats() if self.batcher else None,
+        }
+
+
+# ---------- client ----------
+class SidecarEngine:
+    """
+    Stand-in for RetrievalEngine in the API workers: the same methods the
+    API server uses, each forwarded to the sidecar.
+
+    Calls are blocking and each thread has its own connection, matching
+    how the API server already runs embedding and retrieval on its
+    executor threads.
+    """
+
+    def __init__(self, socket_path: Path = SOCKET_PATH, connect_timeout: float = SIDECAR_CONNECT_TIMEOUT):
+        self.socket_path = Path(socket_path)
+        self.connect_timeout = connect_timeout
+        self.encoder = _SidecarEncoder(self)
+        self.embedding_cache = _SidecarCacheStats(self)
+        self.warmup_seconds = None
+        self._local = threading.local()
+        self._last_error = None
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(str(self.socket_path))
+            self._local.sock = sock
+        return sock
+
+    def _drop_connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def call(self, op: str, **params):
+        message = encode_message({"op": op, **params})
+        for attempt in (1, 2):
+            try:
+                sock = self._connection()
+                sock.sendall(message)
+                (size,) = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+                response = json.loads(_recv_exactly(sock, size))
+                break
+            except OSError as exc:
+                # the sidecar restarted: reconnect once
+                self._drop_connection()
+                if attempt == 2:
+                    self._last_error = repr(exc)
+                    raise
+        if "error" in response:
+            raise SidecarError(response["error"])
+        return response["result"]
+
+    # ---------- lifecycle ----------
+    def warm_up(self):
+        """
+        Wait until the sidecar accepts connections (it warms up its own
+        engine before listening).
+        """
+        start = time.perf_counter()
+        while True:
+            try:
+                self.call("readiness")
+                break
+            except OSError:
+                if time.perf_counter() - start > self.connect_timeout:
+                    raise
+                time.sleep(0.2)
+        self.warmup_seconds = round(time.perf_counter() - start, 3)
+        self._last_error = None
+        return self
+
+    def open(self):
+        return self.warm_up()
+
+    def reload(self) -> bool:
+        # the sidecar swaps index versions for all workers at once
+        return self.call("reload")
+
+    def close(self):
+        self._drop_connection()
+
+    @property
+    def is_ready(self) -> bool:
+        return self.warmup_seconds is not None
+
+    # ---------- health ----------
+    def health(self) -> dict:
+        try:
+            return self.call("health")
+        except Exception as exc:
+            return {"status": "error", "ready": False, "sidecar": str(self.socket_path), "last_error": repr(exc)}
+
+    def readiness(self) -> dict:
+        try:
+            return self.call("readiness")
+        except Exception as exc:
+            return {"ready": False, "reason": f"sidecar unavailable: {exc!r}", "chunks": 0}
+
+    # ---------- queries ----------
+    def embed(self, text: str) -> list[float]:
+        return self.encoder.encode_one(text)
+
+    def areas(self) -> list[str]:
+        return self.call("areas")
+
+    def query_embedding(self, query_embedding: list[float], top_k: int = 3, question: str = None,
+                        area: str = None):
+        return self.call("query", embedding=list(map(float, query_embedding)), top_k=top_k, question=question,
+                         area=area)
+
+    def query(self, question: str, top_k: int = 3, area: str = None):
+        return self.query_embedding(self.embed(question), top_k=top_k, question=question, area=area)
+
+    def query_embeddings(self, embeddings, top_k: int = 3, questions: list[str] = None, area: str = None):
+        return self.call("query_batch", embeddings=[list(map(float, e)) for e in embeddings], top_k=top_k,
+                         questions=questions, area=area)
+
+    def query_batch(self, questions: list[str], top_k: int = 3, area: str = None):
+        if not questions:
+            return []
+        return self.query_embeddings(self.encoder.encode_many(questions), top_k, questions, area)
+
+
+class _SidecarEncoder:
+    """
+    CachedEncoder interface over the sidecar; caching happens there, so
+    lookup() always misses and the question is sent on.
+    """
+
+    def __init__(self, engine: SidecarEngine):
+        self._engine = engine
+
+    def lookup(self, text: str):
+        return None
+
+    def encode_misses(self, texts: list[str]) -> list[list[float]]:
+        return self._engine.call("embed", texts=list(texts))
+
+    def encode_many(self, texts: list[str]) -> list[list[float]]:
+        return self.encode_misses(texts)
+
+    def encode_one(self, text: str) -> list[float]:
+        return self.encode_misses([text])[0]
+
+
+class _SidecarCacheStats:
+    def __init__(self, engine: SidecarEngine):
+        self._engine = engine
+
+    def stats(self) -> dict:
+        return self._engine.call("cache_stats")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", type=Path, default=SOCKET_PATH)
+    parser.add_argument("--workers", type=int, default=SIDECAR_WORKERS, help="encode/query threads")
+    parser.add_argument("--batch-window-ms", type=float, default=float(os.getenv("EMBED_BATCH_WINDOW_MS", "5")))
+    parser.add_argument("--batch-max", type=int, default=int(os.getenv("EMBED_BATCH_MAX", "32")))
+    args = parser.parse_args()
+
+    from retrieval_engine import get_engine
+
+    server = SidecarServer(get_engine(), args.socket, args.workers, args.batch_window_ms, args.batch_max)
+    # stop on SIGTERM like on Ctrl+C, so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        get_engine().close()
+        if args.socket.exists():
+            args.socket.unlink()
+
+
+if __name__ == "__main__":
+    main()
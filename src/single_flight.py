@@ -0,0 +1,151 @@
+import asyncio
+import time
+
+
+class Flight:
+    """
+    One shared generation. Parts are kept as they arrive, so every
+    subscriber, including late joiners, first replays what was produced so
+    far and then follows the live stream.
+    """
+
+    def __init__(self, key, ticket):
+        self.key = key
+        self.ticket = ticket      # generation slot (llm_limiter.Ticket)
+        self.task = None
+        self.parts = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.generation_started = None  # perf_counter() once the slot was granted
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def append(self, part: str):
+        self.parts.append(part)
+        self._notify()
+
+    def finish(self, error: BaseException = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def join(self):
+        self.subscribers += 1
+
+    def leave(self) -> bool:
+        """
+        Drop one subscriber; the generation is cancelled when nobody is left.
+        Returns True if this cancelled it.
+        """
+        self.subscribers -= 1
+        if self.subscribers <= 0 and not self.done and self.task is not None:
+            self.task.cancel()
+            return True
+        return False
+
+    async def stream(self):
+        """
+        Replay the parts produced so far, then yield new ones as they come.
+        Raises the generation's error, if it failed.
+        """
+        i = 0
+        while True:
+            while i < len(self.parts):
+                yield self.parts[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+    async def result(self) -> str:
+        return "".join([part async for part in self.stream()])
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent work.
+
+    - run(key, fn): concurrent callers with the same key await one call of
+      the coroutine function fn (used for embedding + retrieval)
+    - start(key, ticket, parts) / get(key): a streaming generation shared
+      by all requests with the same key; each request join()s the Flight
+      and leave()s it when done, and the generation is cancelled once the
+      last subscriber has left
+
+    Keys are only shared while the work is in progress; finished results
+    are not kept (that is what the answer cache is for).
+    All methods must be called from the event loop thread.
+    """
+
+    def __init__(self):
+        self._calls = {}    # key -> Task
+        self._flights = {}  # key -> Flight
+        self.calls_shared = 0
+        self.flights_started = 0
+        self.flights_joined = 0
+
+    async def run(self, key, fn):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.calls_shared += 1
+        # shield: one caller going away must not cancel the work of the others
+        return await asyncio.shield(task)
+
+    def get(self, key):
+        """
+        Joined in-progress Flight for key, or None.
+        """
+        flight = self._flights.get(key)
+        if flight is None or flight.done:
+            return None
+        flight.join()
+        self.flights_joined += 1
+        return flight
+
+    def start(self, key, ticket, parts) -> Flight:
+        """
+        Start a Flight that waits for ticket, then pulls the async iterator
+        parts. The caller is already joined.
+        """
+        flight = Flight(key, ticket)
+        flight.join()
+        flight.task = asyncio.ensure_future(self._produce(flight, parts))
+        self._flights[key] = flight
+        self.flights_started += 1
+        return flight
+
+    async def _produce(self, flight: Flight, parts):
+        try:
+            # asyncio.wait does not cancel the future when this task is cancelled
+            await asyncio.wait({flight.ticket.granted})
+            flight.generation_started = time.perf_counter()
+            async for part in parts:
+                flight.append(part)
+            flight.finish()
+        except asyncio.CancelledError as exc:
+            flight.finish(exc)
+            raise
+        except Exception as exc:
+            flight.finish(exc)
+        finally:
+            flight.ticket.cancel()
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "flights_started": self.flights_started,
+            "flights_joined": self.flights_joined,
+            "retrievals_shared": self.calls_shared,
+        }
@@ -0,0 +1,149 @@
+import asyncio
+
+HEARTBEAT = ": ping\n\n"  # SSE comment, ignored by EventSource parsers
+_END = object()
+
+
+class GenerationCancelled(Exception):
+    """
+    The upstream stream was cancelled before it was complete (e.g. a shared
+    generation whose owner went away), so the parts are only part of an
+    answer.
+    """
+
+
+def sse_event(text: str, event: str = None) -> str:
+    """
+    One SSE event. Every line of text gets its own 'data:' field, so
+    newlines inside a token survive the round trip.
+    """
+    head = f"event: {event}\n" if event else ""
+    return head + "".join(f"data: {line}\n" for line in text.split("\n")) + "\n"
+
+
+class DisconnectWatcher:
+    """
+    Waits for the ASGI 'http.disconnect' message on a background task.
+
+    Starlette only notices a closed connection on its own for ASGI servers
+    older than spec 2.4; uvicorn silently drops writes to a closed socket,
+    so without this a stream runs until the LLM is done.
+    """
+
+    def __init__(self, receive):
+        self.task = asyncio.ensure_future(self._watch(receive))
+
+    @staticmethod
+    async def _watch(receive):
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+
+    @property
+    def disconnected(self) -> bool:
+        return self.task.done() and not self.task.cancelled()
+
+    def close(self):
+        self.task.cancel()
+
+
+class TokenRelay:
+    """
+    Relays text parts from an async iterator to the client as SSE frames.
+
+    - the parts are pulled on a producer task; when the client disconnects
+      the task is cancelled, which closes the upstream (Ollama) stream and
+      stops the generation
+    - parts are buffered until coalesce_chars characters are collected or
+      coalesce_ms have passed since the first buffered part, so fast models
+      do not send one SSE frame per token
+    - a heartbeat comment is sent after heartbeat_s without data, so proxies
+      keep the connection open during long prefills
+
+    After frames() ends, parts holds everything received, and completed /
+    cancelled / failed tell how the stream ended. An error of the source,
+    including GenerationCancelled when it was cancelled, is raised from
+    frames().
+    """
+
+    def __init__(self, parts, watcher: DisconnectWatcher, coalesce_ms: float = 30.0,
+                 coalesce_chars: int = 24, heartbeat_s: float = 15.0):
+        self.source = parts
+        self.watcher = watcher
+        self.coalesce = coalesce_ms / 1000
+        self.coalesce_chars = coalesce_chars
+        self.heartbeat = heartbeat_s
+
+        self.parts = []
+        self.frames_sent = 0
+        self.completed = False
+        self.cancelled = False
+        self.failed = False
+
+    async def _produce(self, queue: asyncio.Queue):
+        try:
+            async for part in self.source:
+                queue.put_nowait(part)
+        except asyncio.CancelledError:
+            # a truncated answer must not look like a complete one to frames()
+            queue.put_nowait(GenerationCancelled("The answer was cancelled before it was complete."))
+            raise
+        except Exception as exc:
+            queue.put_nowait(exc)
+        else:
+            queue.put_nowait(_END)
+
+    def _flush(self, buffer):
+        text = "".join(buffer)
+        buffer.clear()
+        self.frames_sent += 1
+        return sse_event(text)
+
+    async def frames(self):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        producer = asyncio.ensure_future(self._produce(queue))
+        buffer, buffered_chars, first_at, last_sent = [], 0, 0.0, loop.time()
+        try:
+            while True:
+                now = loop.time()
+                if buffer:
+                    timeout = max(0.0, first_at + self.coalesce - now)
+                else:
+                    timeout = max(0.0, last_sent + self.heartbeat - now)
+
+                get = asyncio.ensure_future(queue.get())
+                await asyncio.wait({get, self.watcher.task}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not get.done():
+                    get.cancel()  # the item, if any, stays in the queue
+                    if self.watcher.disconnected:
+                        return
+                    yield self._flush(buffer) if buffer else HEARTBEAT
+                    buffered_chars, last_sent = 0, loop.time()
+                    continue
+
+                item = get.result()
+                if self.watcher.disconnected:
+                    return
+                if item is _END:
+                    if buffer:
+                        yield self._flush(buffer)
+                    self.completed = True
+                    return
+                if isinstance(item, Exception):
+                    self.failed = True
+                    raise item
+
+                self.parts.append(item)
+                if not buffer:
+                    first_at = loop.time()
+                buffer.append(item)
+                buffered_chars += len(item)
+                if buffered_chars >= self.coalesce_chars or self.coalesce <= 0:
+                    yield self._flush(buffer)
+                    buffered_chars, last_sent = 0, loop.time()
+        finally:
+            if not self.completed and not self.failed:
+                self.cancelled = True
+            producer.cancel()
@@ -0,0 +1,277 @@
+import json
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from area_router import AREA_KEY
+from chunk_store import ChunkStore
+
+# Chroma collection.get() page size when exporting into NumPy
+EXPORT_PAGE_SIZE = 1000
+
+# chromadb 0.5 batches its product telemetry events in a dict that is not
+# thread-safe; concurrent get()/query() calls from executor threads can fail
+# with a KeyError inside chromadb, so calls into the client are serialized
+_CHROMA_LOCK = threading.Lock()
+
+
+class ChromaVectorStore:
+    """
+    Vector store backed by the Chroma collection (HNSW + SQLite).
+
+    Searches restricted to policy areas do not go through HNSW: a filtered
+    HNSW search fails when few chunks pass the filter. Instead every area
+    is loaded once into its own NumpyVectorStore partition and searched
+    exactly, which is cheap because a partition is a fraction of the index.
+    """
+
+    name = "chroma"
+
+    def __init__(self, collection):
+        self.collection = collection
+        # distance function of the HNSW index, used to turn distances into cosine similarities
+        self.space = (collection.metadata or {}).get("hnsw:space", "l2")
+        self._partitions = {}  # area -> NumpyVectorStore of its chunks, loaded on first use
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def query(self, query_embeddings, top_k: int = 3, areas=None):
+        """
+        Top-k search for one or more query vectors.
+        Returns one list of {"id", "content", "metadata", "score"} hits per
+        query; score is the cosine similarity to the query. With areas, only
+        chunks whose "area" metadata is one of them are searched.
+        """
+        if areas is not None:
+            per_area = [self.partition(area).query(query_embeddings, top_k) for area in areas]
+            return [
+                sorted((hit for hits in area_hits for hit in hits), key=lambda hit: hit["score"], reverse=True)[:top_k]
+                for area_hits in zip(*per_area)
+            ] if per_area else [[] for _ in query_embeddings]
+
+        with _CHROMA_LOCK:
+            results = self.collection.query(
+                query_embeddings=[list(map(float, q)) for q in query_embeddings],
+                n_results=top_k,
+                include=["documents", "metadatas", "distances"],
+            )
+
+        ids_list = results.get("ids") or []
+        docs_list = results.get("documents") or []
+        metas_list = results.get("metadatas") or []
+        dists_list = results.get("distances") or []
+
+        all_hits = []
+        for row in range(len(query_embeddings)):
+            ids = ids_list[row] if row < len(ids_list) else []
+            docs = docs_list[row] if row < len(docs_list) else []
+            metas = metas_list[row] if row < len(metas_list) else [{}] * len(docs)
+            dists = dists_list[row] if row < len(dists_list) else [None] * len(docs)
+            all_hits.append([
+                {"id": doc_id, "content": doc, "metadata": meta or {}, "score": self._similarity(dist)}
+                for doc_id, doc, meta, dist in zip(ids, docs, metas, dists)
+            ])
+        return all_hits
+
+    def partition(self, area: str):
+        """
+        The chunks of one policy area as an in-memory NumpyVectorStore.
+        """
+        store = self._partitions.get(area)
+        if store is None:
+            with _CHROMA_LOCK:
+                store = NumpyVectorStore.from_collection(self.collection, where={AREA_KEY: area})
+            self._partitions[area] = store
+        return store
+
+    def _similarity(self, distance):
+        if distance is None:
+            return None
+        if self.space == "l2":
+            # squared L2 between normalized vectors is 2 - 2 * cosine
+            return round(1.0 - distance / 2, 6)
+        return round(1.0 - distance, 6)  # "cosine" and "ip" distances are 1 - similarity
+
+    def get(self, ids):
+        """
+        Chunks by ID as {"id", "content", "metadata"} hits (score None), in
+        the order of ids; unknown IDs are skipped.
+        """
+        if not ids:
+            return []
+        with _CHROMA_LOCK:
+            result = self.collection.get(ids=list(ids), include=["documents", "metadatas"])
+        found = {
+            doc_id: {"id": doc_id, "content": doc, "metadata": meta or {}, "score": None}
+            for doc_id, doc, meta in zip(result["ids"], result["documents"], result["metadatas"])
+        }
+        return [found[doc_id] for doc_id in ids if doc_id in found]
+
+
+class NumpyVectorStore:
+    """
+    Exact in-memory search over all chunk embeddings.
+
+    Embeddings are stored as one contiguous, L2-normalized float32 matrix,
+    so a query is a single matrix product plus argpartition. For a few
+    thousand 384-dimensional MiniLM vectors this is faster than a round
+    trip through Chroma. MiniLM vectors are normalized, so cosine ranking
+    here matches Chroma's default L2 ranking.
+    """
+
+    name = "numpy"
+
+    def __init__(self, ids, documents, metadatas, embeddings):
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.metadatas = list(metadatas)
+        self.embeddings = embeddings  # (n, dim) float32, rows normalized, may be a np.memmap
+        self._positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self._area_rows = None  # area -> row numbers, built on the first filtered search
+
+    # ---------- construction ----------
+    @classmethod
+    def from_collection(cls, collection, mmap_dir: Path = None, where: dict = None):
+        """
+        Load every chunk of the Chroma collection (or the chunks matching the
+        metadata filter where) into NumPy arrays.
+
+        With mmap_dir the matrix is written to <mmap_dir>/embeddings.npy and
+        opened memory-mapped, so several processes share it through the page
+        cache instead of each holding a private copy.
+        """
+        ids, documents, metadatas, vectors = [], [], [], []
+        total = collection.count()
+        for offset in range(0, total, EXPORT_PAGE_SIZE):
+            page = collection.get(
+                limit=EXPORT_PAGE_SIZE,
+                offset=offset,
+                where=where,
+                include=["embeddings", "documents", "metadatas"],
+            )
+            if not page["ids"]:
+                break
+            ids.extend(page["ids"])
+            documents.extend(page["documents"])
+            metadatas.extend(m or {} for m in page["metadatas"])
+            vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+
+        if vectors:
+            embeddings = _normalize(np.concatenate(vectors))
+        else:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+
+        if mmap_dir is not None:
+            cls._save(Path(mmap_dir), ids, documents, metadatas, embeddings)
+            return cls.load(mmap_dir)
+        return cls(ids, documents, metadatas, embeddings)
+
+    @staticmethod
+    def _save(mmap_dir: Path, ids, documents, metadatas, embeddings):
+        mmap_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = mmap_dir / "embeddings.tmp.npy"
+        np.save(tmp_path, embeddings)
+        tmp_path.replace(mmap_dir / "embeddings.npy")
+        records = {"ids": ids, "documents": documents, "metadatas": metadatas}
+        tmp_path = mmap_dir / "records.tmp.json"
+        tmp_path.write_text(json.dumps(records), encoding="utf-8")
+        tmp_path.replace(mmap_dir / "records.json")
+
+    @classmethod
+    def load(cls, mmap_dir: Path):
+        """
+        Open a store previously written with from_collection(..., mmap_dir).
+        """
+        mmap_dir = Path(mmap_dir)
+        embeddings = np.load(mmap_dir / "embeddings.npy", mmap_mode="r")
+        records = json.loads((mmap_dir / "records.json").read_text(encoding="utf-8"))
+        return cls(records["ids"], records["documents"], records["metadatas"], embeddings)
+
+    # ---------- queries ----------
+    def count(self) -> int:
+        return len(self.ids)
+
+    def rows_in(self, areas):
+        """
+        Row numbers of the chunks in the given areas.
+        """
+        if self._area_rows is None:
+            groups = {}
+            for i, meta in enumerate(self.metadatas):
+                groups.setdefault(meta.get(AREA_KEY), []).append(i)
+            self._area_rows = {area: np.array(rows, dtype=np.int64) for area, rows in groups.items()}
+        rows = [self._area_rows[area] for area in areas if area in self._area_rows]
+        return np.sort(np.concatenate(rows)) if rows else np.zeros(0, dtype=np.int64)
+
+    def search(self, query_embeddings, top_k: int = 3, areas=None):
+        """
+        Return (indices, scores), both of shape (n_queries, k), best first.
+        scores are cosine similarities. With areas, only the rows of those
+        areas are scored.
+        """
+        rows = None if areas is None else self.rows_in(areas)
+        n = len(self.ids) if rows is None else len(rows)
+        queries = _normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        k = min(top_k, n)
+        if k == 0:
+            empty = np.zeros((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+
+        matrix = self.embeddings if rows is None else self.embeddings[rows]
+        scores = queries @ matrix.T  # (n_queries, n)
+        if k < n:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(n), (len(queries), n))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        return (top if rows is None else rows[top]), np.take_along_axis(top_scores, order, axis=1)
+
+    def query(self, query_embeddings, top_k: int = 3, areas=None):
+        """
+        Same contract as ChromaVectorStore.query().
+        """
+        indices, scores = self.search(query_embeddings, top_k, areas)
+        return [
+            [
+                {"id": self.ids[i], "content": self.documents[i], "metadata": self.metadatas[i],
+                 "score": round(score, 6)}
+                for i, score in zip(row, score_row)
+            ]
+            for row, score_row in zip(indices.tolist(), scores.tolist())
+        ]
+
+    def get(self, ids):
+        """
+        Same contract as ChromaVectorStore.get().
+        """
+        positions = [self._positions.get(doc_id) for doc_id in ids]
+        return [
+            {"id": self.ids[i], "content": self.documents[i], "metadata": self.metadatas[i], "score": None}
+            for i in positions
+            if i is not None
+        ]
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+def create_vector_store(backend: str, collection, mmap_dir: Path = None, store_path: Path = None):
+    """
+    Build the vector store selected by config ("chroma", "numpy" or
+    "quantized"). "quantized" opens the chunk store written by ingest_md.py
+    at store_path and does not need the collection.
+    """
+    if backend == "chroma":
+        return ChromaVectorStore(collection)
+    if backend == "numpy":
+        return NumpyVectorStore.from_collection(collection, mmap_dir=mmap_dir)
+    if backend == "quantized":
+        return ChunkStore.open(store_path)
+    raise ValueError(f"Unknown vector store backend: {backend!r} (expected 'chroma', 'numpy' or 'quantized')")